@@ -141,17 +141,22 @@ class ImageService {
         $existing = [];
         $pending = [];
         $errors = [];
+        $requests = [];
         
         foreach ($entities as $entity) {
             if (!method_exists($entity, 'getUrlImg') || !method_exists($entity, 'getId'))
                 continue;
 
-            $urlImg = $entity->getUrlImg();
-            $id = $entity->getId();
-            $name = method_exists($entity, 'getName') ? $entity->getName() : null;
+            $requests[$entity->getId()] = [
+                'urlImg' => $entity->getUrlImg(),
+                'width' => $width,
+                'height' => $height,
+                'displayName' => method_exists($entity, 'getName') ? $entity->getName() : null
+            ];
+        }
 
-            $info = ThumbnailManager::getOrQueueThumbnail($urlImg, $width, $height, $name);
-            
+        // Un seul appel au serveur Python pour tous les thumbnails manquants de la page
+        foreach (ThumbnailManager::getOrQueueThumbnails($requests) as $id => $info) {
             if ($info['jobId'] !== null) {
                 if ($info['thumbExists'])
                     $existing[$id] = $info;
@@ -11,14 +11,22 @@ use Helpers\FileSystem;
  */
 class ThumbnailManager {
     private const DEFAULT_BASE_URL = 'http://127.0.0.1:5001';
-    private const DEFAULT_ENQUEUE = '/enqueue';
-    private const DEFAULT_HEALTH = '/health';
+    private const DEFAULT_ENQUEUE_BATCH = '/enqueue_batch';
+    private const DEFAULT_STATUS = '/status';
     private const DEFAULT_EXT = '.webp';
+    private const DEFAULT_STATUS_WAIT = 20.0;
 
-    private static ?string $thumbBaseUrl     = null;
-    private static ?string $enqueueEndpoint  = null;
-    private static ?string $healthEndpoint   = null;
-    private static ?string $thumbExtension   = null;
+    // Timeout d'un enqueue groupé : base + marge par job (on ne veut PAS bloquer le rendu longtemps)
+    private const ENQUEUE_TIMEOUT_MS = 200;
+    private const ENQUEUE_TIMEOUT_PER_JOB_MS = 1;
+    // Nombre max de jobs par requête (le serveur en accepte 1000)
+    private const ENQUEUE_BATCH_SIZE = 500;
+
+    private static ?string $thumbBaseUrl         = null;
+    private static ?string $enqueueBatchEndpoint = null;
+    private static ?string $statusEndpoint       = null;
+    private static ?string $thumbExtension       = null;
+    private static ?float  $statusWait           = null;
 
     private static ?bool $isServerReachable = null;
 
@@ -31,19 +39,19 @@ class ThumbnailManager {
     }
 
     /**
-     * Accès config : endpoint d'enqueue (commence toujours par '/', lazy cache).
+     * Accès config : endpoint d'enqueue groupé (commence toujours par '/', lazy cache).
      */
-    private static function enqueueEndpoint(): string {
-        return self::$enqueueEndpoint ??=
-            '/' . ltrim(Config::get('enqueue_endpoint', self::DEFAULT_ENQUEUE), '/');
+    private static function enqueueBatchEndpoint(): string {
+        return self::$enqueueBatchEndpoint ??=
+            '/' . ltrim(Config::get('enqueue_batch_endpoint', self::DEFAULT_ENQUEUE_BATCH), '/');
     }
 
     /**
-     * Accès config : endpoint de healthcheck (commence toujours par '/', lazy cache).
+     * Accès config : endpoint d'état des jobs (commence toujours par '/', lazy cache).
      */
-    private static function healthEndpoint(): string {
-        return self::$healthEndpoint ??=
-            '/' . ltrim(Config::get('health_endpoint', self::DEFAULT_HEALTH), '/');
+    private static function statusEndpoint(): string {
+        return self::$statusEndpoint ??=
+            '/' . ltrim(Config::get('status_endpoint', self::DEFAULT_STATUS), '/');
     }
 
     /**
@@ -54,41 +62,21 @@ class ThumbnailManager {
                 '.' . ltrim(Config::get('thumb_extension', self::DEFAULT_EXT), '.');
     }
 
-    private static function isServerReachable(): bool {
-        if (self::$isServerReachable !== null)
-            return self::$isServerReachable;
+    /**
+     * Accès config : durée max (s) d'un long-poll de thumb_status.php (lazy cache).
+     * Forcée à 0 (polling classique) avec le serveur de dev `php -S` mono-worker :
+     * une requête en attente y bloquerait toutes les autres.
+     */
+    public static function statusWait(): float {
+        if (self::$statusWait !== null)
+            return self::$statusWait;
 
-        $ch = curl_init(self::thumbBaseUrl() . self::healthEndpoint());
-        if ($ch === false) {
-            trigger_error('Failed to init cURL for check if thumbnail server is reachable', E_USER_WARNING);
-            return self::$isServerReachable = false;
-        }
+        if (PHP_SAPI === 'cli-server' && (int) getenv('PHP_CLI_SERVER_WORKERS') < 2)
+            return self::$statusWait = 0.0;
 
-        $opts = [
-            CURLOPT_RETURNTRANSFER => true,
-            CURLOPT_TIMEOUT => 0.5
-        ];
-        $cafile = Paths::caBundle();
-        if ($cafile !== false)
-            $opts[CURLOPT_CAINFO] = $cafile;
-        
-        curl_setopt_array($ch, $opts);
-
-        $response = curl_exec($ch);
-        if ($response === false) {
-            $errno = curl_errno($ch);
-            if ($errno !== CURLE_COULDNT_CONNECT) {
-                trigger_error('Thumbnail server is unreachable: '. curl_strerror($errno)
-                    . '(' . $errno . ') - ' . curl_error($ch), E_USER_WARNING);
-            }
-            
-            curl_close($ch);
-            return self::$isServerReachable = false;
-        }
-        return self::$isServerReachable = true;
+        return self::$statusWait = max(0.0, (float) Config::get('status_wait', self::DEFAULT_STATUS_WAIT));
     }
 
-
     /**
      * Construit un ID unique de thumbnail basé sur :
      * - chemin système
@@ -102,62 +90,145 @@ class ThumbnailManager {
     }
 
     /**
-     * Envoie un job au serveur Python.
+     * Envoie plusieurs jobs au serveur Python en une seule requête (/enqueue_batch), sans healthcheck
+     * préalable : un refus de connexion suffit à savoir que le serveur est arrêté.
      * Ne lève pas d'exception : en cas d'erreur, log soft et continue.
+     *
+     * @param list<array{job_id: string, src: string, dst: string, width: int, height: int}> $jobs
+     * @return array<string, true> jobIds acceptés (enfilés, ou déjà en file)
      */
-    private static function enqueueJob(string $jobId, string $srcSys, string $dstSys, int $width, int $height): bool {
-        if (!self::isServerReachable())
-            return false;
+    private static function enqueueJobs(array $jobs): array {
+        $accepted = [];
+
+        foreach (array_chunk($jobs, self::ENQUEUE_BATCH_SIZE) as $chunk) {
+            // Serveur injoignable lors d'un appel précédent : inutile de réessayer pendant ce rendu
+            if (self::$isServerReachable === false)
+                break;
+
+            $payload = json_encode(['jobs' => $chunk], JSON_UNESCAPED_UNICODE);
+            if ($payload === false) {
+                trigger_error('Thumbnail enqueue JSON error: ' . json_last_error_msg(), E_USER_WARNING);
+                continue;
+            }
 
-        $payload = json_encode([
-            'job_id' => $jobId,
-            'src' => $srcSys,
-            'dst' => $dstSys,
-            'width' => $width,
-            'height' => $height
-        ], JSON_UNESCAPED_UNICODE);
+            $ch = curl_init(self::thumbBaseUrl() . self::enqueueBatchEndpoint());
+            if ($ch === false) {
+                trigger_error('Failed to init cURL for thumbnail enqueue', E_USER_WARNING);
+                break;
+            }
+
+            $opts = [
+                CURLOPT_POST => true,
+                CURLOPT_RETURNTRANSFER => true,
+                CURLOPT_HTTPHEADER => ['Content-Type: application/json'],
+                // CURLOPT_TIMEOUT n'accepte que des secondes entières (0.2 -> 0 = pas de timeout)
+                CURLOPT_TIMEOUT_MS => self::ENQUEUE_TIMEOUT_MS + self::ENQUEUE_TIMEOUT_PER_JOB_MS * count($chunk),
+                CURLOPT_POSTFIELDS => $payload
+            ];
+            $cafile = Paths::caBundle();
+            if ($cafile !== false)
+                $opts[CURLOPT_CAINFO] = $cafile;
+
+            curl_setopt_array($ch, $opts);
+
+            $response = curl_exec($ch);
+            if ($response === false) {
+                $errno = curl_errno($ch);
+                if ($errno !== CURLE_COULDNT_CONNECT) {
+                    trigger_error('Thumbnail enqueue cURL error: ' . curl_strerror($errno)
+                        . '(' . $errno . ') - ' . curl_error($ch), E_USER_WARNING);
+                }
+                curl_close($ch);
+                self::$isServerReachable = false;
+                break;
+            }
+            self::$isServerReachable = true;
+
+            $code = curl_getinfo($ch, CURLINFO_RESPONSE_CODE);
+            curl_close($ch);
+            if ($code < 200 || $code >= 300) {
+                trigger_error("Thumbnail enqueue HTTP error: {$code} - {$response}", E_USER_WARNING);
+                continue;
+            }
+
+            $data = json_decode($response, true);
+            if (!is_array($data) || !isset($data['jobs']) || !is_array($data['jobs'])) {
+                trigger_error('Thumbnail enqueue: invalid response', E_USER_WARNING);
+                continue;
+            }
+
+            foreach ($data['jobs'] as $result) {
+                if (!is_array($result) || !isset($result['job_id']))
+                    continue;
+                if (!empty($result['ok']))
+                    $accepted[(string) $result['job_id']] = true;
+                else
+                    trigger_error("Thumbnail enqueue rejected job {$result['job_id']}: "
+                        . ($result['error'] ?? 'unknown error'), E_USER_WARNING);
+            }
+        }
+
+        return $accepted;
+    }
+
+    /**
+     * Demande au serveur Python l'état de plusieurs jobs en un seul appel.
+     * Ne lève pas d'exception : retourne null si le serveur ne répond pas (état inconnu).
+     *
+     * @param string[] $jobIds
+     * @param float    $wait   long-poll : le serveur ne répond qu'une fois un des jobs terminé,
+     *                         ou après $wait secondes (0 = réponse immédiate)
+     * @return array<string, array{status: string, error?: string}>|null
+     *         status : queued, processing, done, failed ou unknown (job oublié ou jamais reçu)
+     */
+    public static function fetchJobStatuses(array $jobIds, float $wait = 0.0): ?array {
+        if (empty($jobIds))
+            return [];
 
+        $payload = json_encode(['job_ids' => array_values($jobIds), 'wait' => $wait], JSON_UNESCAPED_UNICODE);
         if ($payload === false) {
-            trigger_error('Thumbnail enqueue JSON error: ' . json_last_error_msg(), E_USER_WARNING);
-            return false;
+            trigger_error('Thumbnail status JSON error: ' . json_last_error_msg(), E_USER_WARNING);
+            return null;
         }
 
-        $ch = curl_init(self::thumbBaseUrl() . self::enqueueEndpoint());
+        $ch = curl_init(self::thumbBaseUrl() . self::statusEndpoint());
         if ($ch === false) {
-            trigger_error('Failed to init cURL for thumbnail enqueue', E_USER_WARNING);
-            return false;
+            trigger_error('Failed to init cURL for thumbnail status', E_USER_WARNING);
+            return null;
         }
 
         $opts = [
             CURLOPT_POST => true,
             CURLOPT_RETURNTRANSFER => true,
             CURLOPT_HTTPHEADER => ['Content-Type: application/json'],
-            CURLOPT_TIMEOUT => 0.2, // on ne veut PAS bloquer longtemps
+            CURLOPT_TIMEOUT_MS => (int) (($wait + 0.5) * 1000), // CURLOPT_TIMEOUT n'accepte que des secondes entières
             CURLOPT_POSTFIELDS => $payload
         ];
         $cafile = Paths::caBundle();
         if ($cafile !== false)
             $opts[CURLOPT_CAINFO] = $cafile;
-        
+
         curl_setopt_array($ch, $opts);
 
         $response = curl_exec($ch);
-        if ($response === false) {
-            $errno = curl_errno($ch);
-            trigger_error('Thumbnail enqueue cURL error: ' . curl_strerror($errno)
-                . '(' . $errno . ') - ' . curl_error($ch), E_USER_WARNING);
-            curl_close($ch);
-            return false;
-        } else {
-            $code = curl_getinfo($ch, CURLINFO_RESPONSE_CODE);
-            if ($code < 200 || $code >= 300) {
-                trigger_error("Thumbnail enqueue HTTP error: {$code} - {$response}", E_USER_WARNING);
-                curl_close($ch);
-                return false;
-            }
-        }
+        $code = curl_getinfo($ch, CURLINFO_RESPONSE_CODE);
         curl_close($ch);
-        return true;
+
+        // Serveur arrêté : pas de warning, comme pour le healthcheck
+        if ($response === false)
+            return null;
+
+        if ($code < 200 || $code >= 300) {
+            trigger_error("Thumbnail status HTTP error: {$code} - {$response}", E_USER_WARNING);
+            return null;
+        }
+
+        $data = json_decode($response, true);
+        if (!is_array($data) || !isset($data['jobs']) || !is_array($data['jobs'])) {
+            trigger_error('Thumbnail status: invalid response', E_USER_WARNING);
+            return null;
+        }
+        return $data['jobs'];
     }
 
     /**
@@ -192,6 +263,68 @@ class ThumbnailManager {
      * }
      */
     public static function getOrQueueThumbnail(string $urlImg, int $width, int $height, ?string $displayName = null): array {
+        return self::getOrQueueThumbnails([[
+            'urlImg' => $urlImg,
+            'width' => $width,
+            'height' => $height,
+            'displayName' => $displayName
+        ]])[0];
+    }
+
+    /**
+     * Version groupée de getOrQueueThumbnail() pour le rendu d’une page entière :
+     * tous les thumbnails manquants sont enfilés en une seule requête au serveur Python.
+     *
+     * @param array<array-key, array{urlImg: string, width: int, height: int, displayName?: ?string}> $requests
+     *
+     * @return array<array-key, array{
+     *     thumbExists: bool,
+     *     webUrl: string,
+     *     jobId: ?string,
+     *     linkWeb: ?string
+     * }> mêmes clés que $requests, même format que getOrQueueThumbnail()
+     */
+    public static function getOrQueueThumbnails(array $requests): array {
+        $results = [];
+        $jobs = [];
+
+        foreach ($requests as $key => $req) {
+            $job = null;
+            $results[$key] = self::resolveThumbnail(
+                $req['urlImg'], $req['width'], $req['height'], $req['displayName'] ?? null, $job
+            );
+            // Même image + même taille pour deux entités -> un seul job
+            if ($job !== null)
+                $jobs[$job['job_id']] = $job;
+        }
+
+        if (empty($jobs))
+            return $results;
+
+        $accepted = self::enqueueJobs(array_values($jobs));
+
+        // Jobs non enfilés : on renvoie l'original sans jobId -> pas de polling (fallback simple)
+        foreach ($results as $key => $info) {
+            if (!$info['thumbExists'] && $info['jobId'] !== null && !isset($accepted[$info['jobId']]))
+                $results[$key] = [
+                    'thumbExists' => false,
+                    'webUrl' => $info['webUrl'],
+                    'jobId' => null,
+                    'linkWeb' => null
+                ];
+        }
+
+        return $results;
+    }
+
+    /**
+     * Résout l’état du thumbnail d’une image (cf. getOrQueueThumbnail) sans rien envoyer au serveur :
+     * si le thumbnail doit être généré, $job reçoit le job à enfiler et le résultat suppose qu’il le sera.
+     *
+     * @param-out ?array{job_id: string, src: string, dst: string, width: int, height: int} $job
+     */
+    private static function resolveThumbnail(string $urlImg, int $width, int $height, ?string $displayName, ?array &$job): array {
+        $job = null;
         $imgSys = FileSystem::webToSysPath($urlImg);
 
         // Si on ne sait pas convertir -> on renvoie l'original
@@ -246,14 +379,14 @@ class ThumbnailManager {
             ];
         }
 
-        // Thumbnail non présent -> on envoie le job au serveur Python
-        if (!self::enqueueJob($jobId,$imgSys, $thumbSys, $width, $height))
-            return [
-                'thumbExists' => false,
-                'webUrl' => $urlImg,
-                'jobId' => null,
-                'linkWeb' => null
-            ];
+        // Thumbnail non présent -> job à envoyer au serveur Python
+        $job = [
+            'job_id' => $jobId,
+            'src' => $imgSys,
+            'dst' => $thumbSys,
+            'width' => $width,
+            'height' => $height
+        ];
 
         return [
             'thumbExists' => false,
@@ -26,6 +26,29 @@ function json_response(int $statusCode, array $data): void {
     exit;
 }
 
+/**
+ * Entrée "ready" pour un thumbnail présent sur disque (symlink lisible optionnel).
+ */
+function ready_item(string $jobId, ?string $stem, string $thumbSys, string $thumbDirUrl,
+                    string $linksDirSys, string $linksDirUrl, string $thumbExt): array {
+    $webUrl = $thumbDirUrl . '/' . $jobId . $thumbExt;
+
+    if ($stem !== null) {
+        FileSystem::ensureDir($linksDirSys);
+
+        $linkSys = $linksDirSys . '/' . $stem . $thumbExt;
+        $linkUrl = $linksDirUrl . '/' . $stem . $thumbExt;
+
+        if (FileSystem::createSymlink($thumbSys, $linkSys))
+            $webUrl = $linkUrl;
+    }
+
+    return [
+        'status' => 'ready',
+        'webUrl' => $webUrl,
+    ];
+}
+
 if ($_SERVER['REQUEST_METHOD'] !== 'POST') {
     json_response(405, [
         'error' => 'Method Not Allowed. Use POST with JSON body.',
@@ -66,6 +89,7 @@ $linksDirSys  = Paths::imgSysAbs() . '/thumbs';
 $linksDirUrl  = Paths::imgUrl() . '/thumbs';
 
 $items = [];
+$waiting = [];
 
 foreach ($data['jobs'] as $job) {
     // Chaque job doit au minimum contenir un jobId
@@ -78,21 +102,47 @@ foreach ($data['jobs'] as $job) {
     $thumbSys = $thumbDirSys . '/' . $jobId . $thumbExt;
 
     if (is_file($thumbSys)) {
-        $webUrl = $thumbDirUrl . '/' . $jobId . $thumbExt;
+        $items[$jobId] = ready_item($jobId, $stem, $thumbSys, $thumbDirUrl, $linksDirSys, $linksDirUrl, $thumbExt);
+        continue;
+    }
+
+    $waiting[$jobId] = [$stem, $thumbSys];
+}
 
-        if ($stem !== null) {
-            FileSystem::ensureDir($linksDirSys);
+// Long-poll demandé par le client ({"wait": true}) : si aucun thumbnail n'est déjà prêt, le serveur Python
+// ne répond qu'à la fin d'un des jobs (ou après statusWait() secondes) -> pas de polling à vide.
+$wait = 0.0;
+if (!empty($data['wait']) && empty($items))
+    $wait = ThumbnailManager::statusWait();
 
-            $linkSys = $linksDirSys . '/' . $stem . $thumbExt;
-            $linkUrl = $linksDirUrl . '/' . $stem . $thumbExt;
+// Jobs sans thumbnail : un seul appel au serveur Python pour toute la page.
+// Serveur injoignable -> tout reste "pending" (le client réessaiera).
+$statuses = ThumbnailManager::fetchJobStatuses(array_map('strval', array_keys($waiting)), $wait);
 
-            if (FileSystem::createSymlink($thumbSys, $linkSys))
-                $webUrl = $linkUrl;
-        }
+// Le client peut relancer immédiatement une requête si le long-poll est actif et que le serveur
+// a répondu (sinon il garde son intervalle de polling, pour ne pas boucler sur un serveur arrêté)
+$longPoll = ThumbnailManager::statusWait() > 0 && ($statuses !== null || !empty($items));
+$statuses ??= [];
+
+foreach ($waiting as $jobId => [$stem, $thumbSys]) {
+    $jobId = (string) $jobId;
+    $status = $statuses[$jobId]['status'] ?? null;
+
+    // Thumbnail écrit entre le is_file() ci-dessus et la réponse du serveur
+    if ($status === 'done' && is_file($thumbSys)) {
+        $items[$jobId] = ready_item($jobId, $stem, $thumbSys, $thumbDirUrl, $linksDirSys, $linksDirUrl, $thumbExt);
+        continue;
+    }
 
+    if ($status === 'failed' || $status === 'unknown' || $status === 'done') {
+        // - failed : erreur côté serveur (source illisible, exception...) ;
+        // - unknown : job perdu (serveur redémarré sans file persistante) ;
+        // - done sans fichier : thumbnail supprimé depuis.
+        // Dans tous les cas, inutile de continuer à poller.
         $items[$jobId] = [
-            'status' => 'ready',
-            'webUrl' => $webUrl,
+            'status' => 'failed',
+            'webUrl' => null,
+            'error' => $statuses[$jobId]['error'] ?? ($status === 'done' ? 'Thumbnail missing' : 'Unknown job'),
         ];
         continue;
     }
@@ -105,4 +155,5 @@ foreach ($data['jobs'] as $job) {
 
 json_response(200, [
     'items' => $items,
+    'longPoll' => $longPoll,
 ]);
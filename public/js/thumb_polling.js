@@ -14,9 +14,16 @@ document.addEventListener('DOMContentLoaded', () => {
     dbg('Images avec thumbnails en attente :', pendingImgs.length);
 
     if (pendingImgs.length !== 0) {
+        // Intervalle de polling si le long-poll n'est pas disponible (serveur PHP mono-worker,
+        // serveur de thumbnails injoignable, erreur réseau). Sinon, chaque réponse arrive dès
+        // qu'un thumbnail est prêt (ou après ~20 s) et la requête suivante part aussitôt.
         const pollDelay = 3000;
         let pollTimer = null;
 
+        function scheduleNext(delay) {
+            pollTimer = setTimeout(pollThumbnails, delay);
+        }
+
         function buildJobsPayload() {
             const jobs = [];
 
@@ -39,10 +46,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
             if (jobs.length === 0) {
                 dbg('Plus aucun job avec data-thumb-job, arrêt du polling.');
-                if (pollTimer !== null) {
-                    clearInterval(pollTimer);
-                    pollTimer = null;
-                }
+                pollTimer = null;
                 return;
             }
 
@@ -52,7 +56,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 cache: 'no-store',
-                body: JSON.stringify({ jobs })
+                body: JSON.stringify({ jobs, wait: true })
             })
             .then(resp => {
                 dbg('Réponse HTTP reçue :', resp.status);
@@ -65,6 +69,7 @@ document.addEventListener('DOMContentLoaded', () => {
             .then(data => {
                 if (!data) {
                     dbg('Aucune donnée JSON (data=null).');
+                    scheduleNext(pollDelay);
                     return;
                 }
 
@@ -72,6 +77,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
                 if (!data.items) {
                     dbg('Champ "items" manquant dans la réponse.');
+                    scheduleNext(pollDelay);
                     return;
                 }
 
@@ -94,27 +100,35 @@ document.addEventListener('DOMContentLoaded', () => {
                         img.src = info.webUrl;
                         img.removeAttribute('data-thumb-job');
                         img.removeAttribute('data-thumb-stem');
+                    } else if (info.status === 'failed') {
+                        // Échec définitif côté serveur : on garde l'image originale et on arrête de poller ce job
+                        dbg('Thumbnail en échec pour job', jobId, ':', info.error);
+                        img.removeAttribute('data-thumb-job');
+                        img.removeAttribute('data-thumb-stem');
                     }
                 });
 
                 const stillPending = pendingImgs.some(img => img.dataset.thumbJob);
                 dbg('Reste-t-il des thumbnails en attente ?', stillPending);
 
-                if (!stillPending && pollTimer !== null) {
+                if (!stillPending) {
                     dbg('Plus aucun thumbnail en attente, arrêt définitif du polling.');
-                    clearInterval(pollTimer);
                     pollTimer = null;
+                    return;
                 }
+
+                dbg('Long-poll actif ?', data.longPoll === true);
+                scheduleNext(data.longPoll === true ? 0 : pollDelay);
             })
             .catch(err => {
                 dbg('Erreur réseau ou fetch thumb_status.php :', err);
+                scheduleNext(pollDelay);
             });
         }
 
-        dbg('Démarrage du polling thumbnails (interval =', pollDelay, 'ms)');
+        dbg('Démarrage du suivi des thumbnails (long-poll, repli polling =', pollDelay, 'ms)');
         pollThumbnails();
-        pollTimer = setInterval(pollThumbnails, pollDelay);
     } else {
         dbg('Aucun thumbnail à surveiller, arrêt.');
     }
-});
\ No newline at end of file
+});
\ No newline at end of file
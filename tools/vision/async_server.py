@@ -0,0 +1,167 @@
+"""
+async_server.py
+Front HTTP asyncio (aiohttp) pour thumb_server : /enqueue, /enqueue_batch, /status, /health, /ready,
+/metrics, /cascade, /thumbnail.
+
+Activé par `python thumb_server.py --server aiohttp` (dépendance optionnelle : pip install aiohttp).
+
+Les handlers sont ceux de thumb_server (handle_enqueue, handle_enqueue_batch, parse_status_query,
+health_payload, ready_payload, metrics_text, cascade_payload, parse_inline_request...) : seul le transport
+change. Aucune requête n'occupe de thread : un long-poll /status (ou un POST /thumbnail) attend
+un asyncio.Event réveillé par thumb_server.record_completion (via call_soon_threadsafe), au lieu
+de bloquer un thread du serveur sur une Condition comme en mode Flask.
+
+L'inférence reste hors de la boucle (worker thread, ou process workers avec --workers N,
+ce qui libère complètement le GIL du process HTTP).
+"""
+
+import asyncio
+from types import ModuleType
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+
+class CompletionNotifier:
+    """
+    Réveille les long-polls à chaque sortie terminée.
+    Un nouvel Event par "génération" : un long-poll récupère l'Event courant *avant* de lire les états,
+    donc une fin de sortie survenue entre les deux le réveille quand même.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify_threadsafe(self) -> None:
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        self.event.set()
+        self.event = asyncio.Event()
+
+
+async def read_json(request: web.Request) -> Dict[str, Any]:
+    """Corps JSON de la requête, {} s'il est absent ou invalide (comme get_json(silent=True))."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def wait_output_statuses(
+    api: ModuleType,
+    notifier: CompletionNotifier,
+    output_ids: List[str],
+    timeout: float
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Équivalent asyncio de thumb_server.wait_output_statuses.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        event = notifier.event
+        statuses = {oid: api.output_status(oid) for oid in output_ids}
+        remaining = deadline - loop.time()
+        if remaining <= 0 or api.is_finished(statuses):
+            return statuses
+        try:
+            await asyncio.wait_for(event.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+
+
+def create_app(api: ModuleType) -> web.Application:
+    """
+    api : le module thumb_server en cours d'exécution (handlers + état des jobs).
+    """
+    # Corps de POST /thumbnail : l'image source (1 Mo par défaut dans aiohttp)
+    app = web.Application(client_max_size=api.INLINE_MAX_BYTES)
+
+    async def on_startup(app: web.Application) -> None:
+        notifier = CompletionNotifier(asyncio.get_running_loop())
+        app["notifier"] = notifier
+        api._completion_listeners.append(notifier.notify_threadsafe)
+
+    async def on_cleanup(app: web.Application) -> None:
+        api._completion_listeners.remove(app["notifier"].notify_threadsafe)
+
+    async def enqueue(request: web.Request) -> web.Response:
+        payload, code = api.check_path_jobs_client(request.remote) or api.handle_enqueue(await read_json(request))
+        return web.json_response(payload, status=code)
+
+    async def enqueue_batch(request: web.Request) -> web.Response:
+        payload, code = (api.check_path_jobs_client(request.remote)
+                         or api.handle_enqueue_batch(await read_json(request)))
+        return web.json_response(payload, status=code)
+
+    async def status(request: web.Request) -> web.Response:
+        if request.method == "POST":
+            data = await read_json(request)
+            ids, wait, error = api.parse_status_query(data.get("job_ids"), data.get("wait", 0))
+        else:
+            ids = [i for i in request.query.get("ids", "").split(",") if i]
+            ids, wait, error = api.parse_status_query(ids, request.query.get("wait", 0))
+
+        if error is not None:
+            return web.json_response({"ok": False, "error": error}, status=400)
+
+        if wait > 0 and ids:
+            jobs = await wait_output_statuses(api, request.app["notifier"], ids, wait)
+        else:
+            jobs = {oid: api.output_status(oid) for oid in ids}
+        return web.json_response({"ok": True, "jobs": jobs})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response(api.health_payload())
+
+    async def ready(request: web.Request) -> web.Response:
+        payload, code = api.ready_payload()
+        return web.json_response(payload, status=code)
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=api.metrics_text(), headers={"Content-Type": api.METRICS_CONTENT_TYPE})
+
+    async def cascade(request: web.Request) -> web.Response:
+        return web.json_response(api.cascade_payload())
+
+    async def thumbnail(request: web.Request) -> web.Response:
+        if (request.content_length or 0) > api.INLINE_MAX_BYTES:
+            return web.json_response({"ok": False, "error": f"Image too large (max {api.INLINE_MAX_BYTES} bytes)"},
+                                     status=413)
+        job, error = api.parse_inline_request(await request.read(), request.query)
+        if job is None:
+            payload, code = error
+            return web.json_response(payload, status=code)
+
+        oid = api.submit_inline_job(job)
+        try:
+            statuses = await wait_output_statuses(api, request.app["notifier"], [oid], api.INLINE_TIMEOUT)
+            data, extra, code = api.inline_response(job, statuses[oid])
+        finally:
+            # Handler annulé (client déconnecté) : ne pas garder la place du résultat
+            api.discard_inline_result(oid)
+        if data is None:
+            return web.json_response(extra, status=code)
+        return web.Response(body=data, status=code, headers=extra)
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/enqueue", enqueue)
+    app.router.add_post("/enqueue_batch", enqueue_batch)
+    app.router.add_get("/status", status)
+    app.router.add_post("/status", status)
+    app.router.add_get("/health", health)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/cascade", cascade)
+    app.router.add_post("/thumbnail", thumbnail)
+    return app
+
+
+def run(api: ModuleType, host: str, port: int) -> None:
+    print(f"[INFO] aiohttp server listening on http://{host}:{port}")
+    # Pas d'access log : une ligne par requête coûte plus cher que l'enqueue lui-même
+    web.run_app(create_app(api), host=host, port=port, access_log=None, print=None)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+bench_encode.py
+Taille et temps d'encodage des thumbnails par format et réglage, pour choisir --jpeg-quality /
+--webp-quality / --avif-quality (et thumb_extension côté PHP).
+
+Pour chaque image : crop de fallback (pas de détection) puis resize à la taille des thumbnails,
+comme thumb_server ; chaque variante est encodée --repeat fois. Référence de chaque format :
+cv2.imwrite sans paramètre (ce qu'écrivait thumb_server avant les réglages ; WebP sans perte).
+
+Colonnes : octets moyens, gain par rapport à la référence du format, encodage p50 / p95 (ms),
+PSNR (dB) par rapport au thumbnail non compressé. Formats que l'OpenCV local ne sait pas écrire
+(AVIF selon la compilation) : signalés puis ignorés.
+
+Usage:
+  python bench/bench_encode.py
+  python bench/bench_encode.py --images ../../public/img/personnages_cache --formats webp avif
+  python bench/bench_encode.py --formats jpg webp --qualities 70 80 90 --json encode.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from image_io import can_encode, encode_image, encoder_params  # noqa: E402
+from bench_pipeline import collect_images  # noqa: E402
+from bench_workers import make_images  # noqa: E402
+
+
+def variants(ext: str, qualities: List[int], progressive: bool) -> List[Tuple[str, List[int]]]:
+    """(réglage, paramètres imencode) : référence OpenCV, puis une variante par qualité."""
+    out = [("défaut OpenCV", [])]
+    for q in qualities or [thumb_server.THUMB_QUALITY.get(ext)]:
+        label = f"q={q}" + (" progressif" if progressive and ext in (".jpg", ".jpeg") else "")
+        out.append((label, encoder_params(ext, q, progressive)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taille et temps d'encodage des thumbnails par format.")
+    parser.add_argument("--images", nargs="+", default=None,
+                        help="Dossiers (ou fichiers) d'images ; défaut : jeu synthétique.")
+    parser.add_argument("--count", type=int, default=12, help="Jeu synthétique : nombre d'images.")
+    parser.add_argument("--size", default="1072x2000", help="Jeu synthétique : taille des images (LxH).")
+    parser.add_argument("--seed", type=int, default=0, help="Jeu synthétique : graine.")
+    parser.add_argument("--thumb", default="480x600", help="Taille des thumbnails (LxH).")
+    parser.add_argument("--formats", nargs="+", default=["jpg", "webp", "avif"], help="Extensions comparées.")
+    parser.add_argument("--qualities", nargs="*", type=int, default=[],
+                        help="Qualités essayées (défaut : celle de thumb_server pour chaque format).")
+    parser.add_argument("--no-progressive", action="store_true", help="JPEG baseline au lieu de progressif.")
+    parser.add_argument("--repeat", type=int, default=3, help="Encodages mesurés par image et variante.")
+    parser.add_argument("--json", type=Path, default=None, help="Fichier de sortie JSON.")
+    args = parser.parse_args()
+
+    tw, th = (int(v) for v in args.thumb.split("x"))
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = collect_images(args.images)
+        else:
+            w, h = (int(v) for v in args.size.split("x"))
+            paths = make_images(Path(tmp), args.count, w, h, args.seed)
+        imgs = [cv2.imread(str(p)) for p in paths]
+    imgs = [img for img in imgs if img is not None]
+    if not imgs:
+        sys.exit("[ERROR] No images found")
+
+    thumbs = []
+    for img in imgs:
+        x1, y1, x2, y2 = thumb_server.compute_thumbnail_crop(img, tw, th, None)
+        thumbs.append(cv2.resize(img[y1:y2, x1:x2], (tw, th), interpolation=cv2.INTER_AREA))
+
+    rows: List[Dict] = []
+    print(f"{len(thumbs)} thumbnails {args.thumb}, {args.repeat} encodages par variante")
+    print(f"{'format':>6} {'réglage':>16} {'octets':>9} {'gain':>7} {'p50 ms':>7} {'p95 ms':>7} {'PSNR':>6}")
+    for fmt in args.formats:
+        ext = "." + fmt.lstrip(".").lower()
+        if not can_encode(ext):
+            print(f"[WARN] This OpenCV build cannot write {ext}: skipped")
+            continue
+        base_bytes = None
+        for label, params in variants(ext, args.qualities, not args.no_progressive):
+            sizes, times, psnrs = [], [], []
+            for thumb in thumbs:
+                for _ in range(args.repeat):
+                    t = time.perf_counter()
+                    data = encode_image(thumb, ext, params)
+                    times.append((time.perf_counter() - t) * 1e3)
+                sizes.append(len(data))
+                decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                psnrs.append(min(cv2.PSNR(thumb, decoded), 100.0))
+            mean_bytes = float(np.mean(sizes))
+            base_bytes = base_bytes or mean_bytes
+            p50, p95 = np.percentile(times, [50, 95])
+            row = {"format": ext, "setting": label, "params": params, "bytes": mean_bytes,
+                   "saved": 1 - mean_bytes / base_bytes, "encode_p50_ms": p50, "encode_p95_ms": p95,
+                   "psnr_db": float(np.mean(psnrs))}
+            rows.append(row)
+            print(f"{ext:>6} {label:>16} {mean_bytes:>9.0f} {row['saved']:>7.1%} {p50:>7.2f} {p95:>7.2f} "
+                  f"{row['psnr_db']:>6.1f}")
+
+    if args.json is not None:
+        args.json.write_text(json.dumps({"thumb": args.thumb, "images": len(thumbs), "results": rows}, indent=2),
+                             encoding="utf-8")
+        print(f"[INFO] Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+bench_enqueue.py
+Mesure la latence d'enqueue avec la file persistante, à comparer au CURLOPT_TIMEOUT de 200 ms
+utilisé côté PHP (ThumbnailManager).
+
+Mesures :
+  - store : JobStore.add() seul (une transaction SQLite par job), dans un fichier temporaire ;
+  - flask / aiohttp : POST /enqueue sur un thumb_server lancé pour l'occasion avec --server correspondant
+            (file persistante dans un fichier temporaire, cache des détections désactivé : chaque job
+            refait la cascade ; statistiques de la cascade en mémoire, la production n'apprend rien
+            des images synthétiques), avec --concurrency clients. Les jobs sont traités pendant la
+            mesure ; à la fin de la mesure, les sorties sorties de la file (en cours, écrites ou en échec) sont affichées (colonnes
+            started / done / failed). La latence n'est mesurée *sous charge d'inférence* que si des
+            jobs ont démarré sans échouer : s'ils échouent tous (poids absents, pointeurs Git LFS non
+            récupérés), le serveur ne fait que les rejeter.
+
+Usage:
+  python bench/bench_enqueue.py [--jobs 2000] [--concurrency 4] [--servers flask aiohttp]
+                                [--sync NORMAL|FULL] [-- --workers 2]
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import threading
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from job_store import JobStore  # noqa: E402
+from bench_workers import VISION_DIR, free_port, http_json, make_images  # noqa: E402
+
+PHP_TIMEOUT_MS = 200.0
+
+
+def report(name: str, latencies_ms: list, elapsed: float, started: str = "", done: str = "",
+           failed: str = "") -> None:
+    lat = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+    over = int((lat >= PHP_TIMEOUT_MS).sum())
+    print(f"{name:>7} {len(lat) / elapsed:>9.0f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {lat.max():>8.2f} {over:>7} "
+          f"{started:>7} {done:>6} {failed:>6}")
+
+
+def count_finished(base: str, output_ids: list) -> dict:
+    """Sorties processing / done / failed à cet instant (POST /status par paquets de STATUS_MAX_IDS)."""
+    counts = {"processing": 0, "done": 0, "failed": 0}
+    for i in range(0, len(output_ids), 1000):
+        jobs = http_json(base + "/status", {"job_ids": output_ids[i:i + 1000]})["jobs"]
+        for status in jobs.values():
+            if status["status"] in counts:
+                counts[status["status"]] += 1
+    return counts
+
+
+def bench_store(tmp: Path, n: int, sync: str) -> None:
+    store = JobStore(tmp / "jobs.sqlite3", synchronous=sync)
+    latencies = []
+    t0 = time.perf_counter()
+    for i in range(n):
+        job = {"job_id": f"store-{i}", "src": "/tmp/src.jpg", "outputs": [
+            {"job_id": f"store-{i}", "width": 480, "height": 600, "dst": f"/tmp/store-{i}.webp"},
+        ]}
+        t = time.perf_counter()
+        store.add(job)
+        latencies.append((time.perf_counter() - t) * 1e3)
+    report("store", latencies, time.perf_counter() - t0)
+
+
+def bench_http(tmp: Path, server: str, n: int, concurrency: int, sync: str, extra: list) -> None:
+    src = make_images(tmp, 1, 1072, 2000, seed=0)[0]
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, str(VISION_DIR / "thumb_server.py"), "--port", str(port), "--server", server,
+           "--job-store", str(tmp / f"{server}_jobs.sqlite3"), "--job-store-sync", sync, "--no-face-cache",
+           "--no-cascade-stats", "--status-history", str(n), *extra]
+    # stderr aussi : le serveur Flask y écrit une ligne par requête
+    proc = subprocess.Popen(cmd, cwd=str(VISION_DIR), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 300
+        while True:
+            try:
+                # /ready (et non /health) : modèles chargés et chauffés, les jobs sont traités dès l'enqueue
+                http_json(base + "/ready", timeout=1.0)
+                break
+            except OSError:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"thumb_server failed to start: {' '.join(cmd)}")
+                time.sleep(0.2)
+
+        latencies = []
+        lock = threading.Lock()
+
+        def client(k: int) -> None:
+            local = []
+            for i in range(k, n, concurrency):
+                t = time.perf_counter()
+                http_json(base + "/enqueue", {
+                    "job_id": f"{server}-{i}",
+                    "src": str(src),
+                    "dst": str(tmp / f"{server}-{i}.jpg"),
+                    "width": 480,
+                    "height": 600,
+                })
+                local.append((time.perf_counter() - t) * 1e3)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=client, args=(k,)) for k in range(concurrency)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        counts = count_finished(base, [f"{server}-{i}" for i in range(n)])
+        started = sum(counts.values())
+        report(server, latencies, elapsed, str(started), str(counts["done"]), str(counts["failed"]))
+        if started == counts["failed"]:
+            print(f"[WARN] {server}: no job processed during the measurement "
+                  f"({counts['failed']} failed): enqueue latency measured without inference load")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence d'enqueue avec la file persistante.")
+    parser.add_argument("--jobs", type=int, default=2000, help="Nombre de jobs enfilés par mesure.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clients HTTP simultanés.")
+    parser.add_argument("--sync", choices=["NORMAL", "FULL"], default="NORMAL", help="PRAGMA synchronous de la file.")
+    parser.add_argument("--servers", nargs="*", choices=["flask", "aiohttp"], default=["flask", "aiohttp"],
+                        help="Fronts HTTP à mesurer (aucun = JobStore.add() seul).")
+    parser.add_argument("server_args", nargs=argparse.REMAINDER,
+                        help="Arguments supplémentaires passés à thumb_server.py (après --).")
+    args = parser.parse_args()
+    extra = [a for a in args.server_args if a != "--"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        print(f"{'':>7} {'jobs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'>200ms':>7} "
+              f"{'started':>7} {'done':>6} {'failed':>6}")
+        bench_store(tmp, args.jobs, args.sync)
+        for server in args.servers:
+            bench_http(tmp, server, args.jobs, args.concurrency, args.sync, extra)
+
+
+if __name__ == "__main__":
+    main()
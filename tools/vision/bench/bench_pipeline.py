@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""
+bench_pipeline.py
+Temps de chaque étape du pipeline de thumbnails, pour repérer une régression
+(mise à jour de torch / ultralytics / OpenCV, changement de code...).
+
+Étapes mesurées, image par image :
+  - decode : image_io.decode_image() sur les octets du fichier (lecture disque hors mesure) ;
+  - ssd    : SSDAnimeFaceDetector.detect_best_face() ;
+  - yolo   : YOLOAnimeFaceDetector.detect_best_face() (sur toutes les images, pas seulement en fallback) ;
+  - focus  : compute_thumbnail_crop() (point de focus + compute_focus_box) ;
+  - resize : cv2.resize() du crop vers la taille du thumbnail ;
+  - encode : thumb_server.encode_thumbnail() dans le format des thumbnails (réglages du serveur).
+Pour chaque étape : p50 / p95 / p99 / moyenne en ms ; images/s sur la somme des étapes.
+
+Images : --images (dossiers ou fichiers), sinon un jeu synthétique reproductible (--count, --size, --seed).
+
+Résultats écrits en JSON avec --json (versions des bibliothèques comprises) ; --baseline compare à un
+JSON précédent et signale les étapes dont le p50 ou le p95 a augmenté de plus de --threshold
+(code de sortie 1).
+
+Usage:
+  python bench/bench_pipeline.py --json baseline.json
+  python bench/bench_pipeline.py --baseline baseline.json [--json new.json] [--threshold 0.10]
+  python bench/bench_pipeline.py --images ../../public/img/personnages_cache --stages decode ssd
+  python bench/bench_pipeline.py --baseline eager.json --ssd-backend onnx
+  python bench/bench_pipeline.py --baseline eager.json --ssd-optimize fold_bn channels_last
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from image_io import decode_image  # noqa: E402
+from bench_workers import make_images  # noqa: E402
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+STAGES = ["decode", "ssd", "yolo", "focus", "resize", "encode"]
+PERCENTILES = [50, 95, 99]
+
+
+def library_versions() -> Dict[str, str]:
+    versions = {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+    try:
+        import ultralytics
+        versions["ultralytics"] = ultralytics.__version__
+    except ImportError:
+        pass
+    return versions
+
+
+def collect_images(entries: List[str]) -> List[Path]:
+    paths = []
+    for entry in entries:
+        p = Path(entry)
+        if p.is_dir():
+            paths += sorted(f for f in p.iterdir() if f.suffix.lower() in IMAGE_EXTS)
+        elif p.is_file():
+            paths.append(p)
+    return paths
+
+
+def run_pipeline(
+    data: bytes,
+    stages: List[str],
+    width: int,
+    height: int,
+    ext: str,
+    timings: Dict[str, List[float]]
+) -> None:
+    """Une image à travers toutes les étapes ; ajoute la durée (ms) de chaque étape demandée à timings."""
+    def timed(stage, fn, *args):
+        t = time.perf_counter()
+        out = fn(*args)
+        if stage in stages:
+            timings[stage].append((time.perf_counter() - t) * 1e3)
+        return out
+
+    img = timed("decode", decode_image, data)
+    if img is None:
+        raise ValueError("decode failed")
+    # Détecteurs non demandés : ni chargés, ni exécutés, ni chronométrés (crop sur le point de fallback)
+    box = timed("ssd", thumb_server.load_detector("ssd").detect_best_face, img) if "ssd" in stages else None
+    yolo_box = timed("yolo", thumb_server.load_detector("yolo").detect_best_face, img) if "yolo" in stages else None
+    box = box or yolo_box
+    x1, y1, x2, y2 = timed("focus", thumb_server.compute_thumbnail_crop, img, width, height, box)
+    thumb = timed("resize", cv2.resize, img[y1:y2, x1:x2], (width, height), None, 0, 0, cv2.INTER_AREA)
+    timed("encode", thumb_server.encode_thumbnail, thumb, ext)
+
+
+def summarize(timings: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for stage, values in timings.items():
+        lat = np.asarray(values)
+        p50, p95, p99 = np.percentile(lat, PERCENTILES)
+        summary[stage] = {"p50": p50, "p95": p95, "p99": p99, "mean": lat.mean(), "count": len(lat)}
+    return summary
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """Étapes en régression : p50 ou p95 > baseline * (1 + threshold), et d'au moins min_delta_ms."""
+    if results["config"] != baseline.get("config"):
+        print("[WARN] Baseline was measured with a different configuration: comparison is indicative only")
+    for lib, version in results["versions"].items():
+        old = baseline.get("versions", {}).get(lib)
+        if old is not None and old != version:
+            print(f"[INFO] {lib}: {old} -> {version}")
+
+    print(f"{'étape':>8} {'p50 base':>9} {'p50':>9} {'Δ p50':>8} {'p95 base':>9} {'p95':>9} {'Δ p95':>8}")
+    regressions = []
+    for stage, row in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base is None:
+            continue
+        flags = []
+        deltas = []
+        for key in ("p50", "p95"):
+            delta = row[key] / base[key] - 1 if base[key] > 0 else 0.0
+            deltas.append(delta)
+            if delta > threshold and row[key] - base[key] >= min_delta_ms:
+                flags.append(key)
+        mark = "  <- " + "/".join(flags) if flags else ""
+        print(f"{stage:>8} {base['p50']:>9.2f} {row['p50']:>9.2f} {deltas[0]:>+8.1%} "
+              f"{base['p95']:>9.2f} {row['p95']:>9.2f} {deltas[1]:>+8.1%}{mark}")
+        if flags:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps par étape du pipeline de thumbnails.")
+    parser.add_argument("--images", nargs="+", default=None,
+                        help="Dossiers (ou fichiers) d'images ; défaut : jeu synthétique.")
+    parser.add_argument("--count", type=int, default=24, help="Jeu synthétique : nombre d'images.")
+    parser.add_argument("--size", default="1072x2000", help="Jeu synthétique : taille des images (LxH).")
+    parser.add_argument("--seed", type=int, default=0, help="Jeu synthétique : graine.")
+    parser.add_argument("--thumb", default="480x600", help="Taille des thumbnails (LxH).")
+    parser.add_argument("--ext", default=".webp", help="Format d'encodage des thumbnails.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Étapes mesurées.")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes mesurées sur le jeu d'images.")
+    parser.add_argument("--warmup", type=int, default=2, help="Images de chauffe (non mesurées).")
+    parser.add_argument("--threads", type=int, default=0, help="torch.set_num_threads (0 = défaut torch).")
+    parser.add_argument("--ssd-backend", choices=thumb_server.SSD_BACKENDS, default=thumb_server.SSD_BACKEND,
+                        help="Moteur d'inférence du SSD (cf. export_ssd.py).")
+    parser.add_argument("--ssd-optimize", nargs="*", choices=thumb_server.SSD_OPTIMIZATIONS, default=[],
+                        help="Optimisations du réseau SSD fp32 (fold_bn, channels_last).")
+    parser.add_argument("--json", type=Path, default=None, help="Fichier de sortie JSON.")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON de référence à comparer.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Hausse relative du p50 / p95 considérée comme une régression.")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1,
+                        help="Hausse absolue minimale (ms) pour signaler une régression (bruit des étapes courtes).")
+    args = parser.parse_args()
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    tw, th = (int(v) for v in args.thumb.split("x"))
+    ext = "." + args.ext.lstrip(".")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = collect_images(args.images)
+            source = {"images": [str(p) for p in paths]}
+        else:
+            w, h = (int(v) for v in args.size.split("x"))
+            paths = make_images(Path(tmp), args.count, w, h, args.seed)
+            source = {"synthetic": {"count": args.count, "size": args.size, "seed": args.seed}}
+        if not paths:
+            sys.exit("[ERROR] No images found")
+        blobs = [p.read_bytes() for p in paths]
+
+    # Chargement des modèles + premiers forwards hors mesure
+    thumb_server.SSD_BACKEND = args.ssd_backend
+    thumb_server.SSD_OPTIMIZE = tuple(args.ssd_optimize)
+    # Seulement les détecteurs mesurés : --stages decode resize encode ne charge aucun modèle
+    detectors = {name: thumb_server.load_detector(name) for name in ("ssd", "yolo") if name in args.stages}
+    scratch = {stage: [] for stage in STAGES}
+    for data in blobs[:args.warmup]:
+        run_pipeline(data, args.stages, tw, th, ext, scratch)
+
+    timings = {stage: [] for stage in args.stages}
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for data in blobs:
+            run_pipeline(data, args.stages, tw, th, ext, timings)
+    wall = time.perf_counter() - t0
+
+    n = len(blobs) * args.repeat
+    stage_total = sum(sum(v) for v in timings.values()) / 1e3
+    results = {
+        "versions": library_versions(),
+        "machine": {"platform": platform.platform(), "cpu_count": os.cpu_count(),
+                    "torch_threads": torch.get_num_threads(), "cuda": torch.cuda.is_available()},
+        "config": {"source": source, "thumb": args.thumb, "ext": ext, "stages": args.stages,
+                   "repeat": args.repeat},
+        "stages": summarize(timings),
+        "images_per_s": n / stage_total if stage_total > 0 else None,
+        "wall_images_per_s": n / wall,
+    }
+    if "ssd" in detectors:
+        results["config"].update(ssd_backend=detectors["ssd"].backend_name,
+                                 ssd_optimize=list(detectors["ssd"].optimize))
+
+    print(f"{len(blobs)} images x {args.repeat} passes, thumbnails {args.thumb}{ext}")
+    print(f"{'étape':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'moy ms':>8}")
+    for stage, row in results["stages"].items():
+        print(f"{stage:>8} {row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f} {row['mean']:>8.2f}")
+    print(f"{results['images_per_s']:.2f} images/s (somme des étapes)")
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"[INFO] Wrote {args.json}")
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"[WARN] Regression (> {args.threshold:.0%}) on: {', '.join(regressions)}")
+            sys.exit(1)
+        print("[INFO] No regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
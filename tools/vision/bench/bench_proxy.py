@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+bench_proxy.py
+Mesure l'accord entre la détection en pleine résolution et la détection sur proxy réduit
+(thumb_server.DETECT_MAX_SIDE) sur un "golden set" d'images.
+
+Pour chaque image et chaque résolution testée :
+  - bbox : accord si les deux détections sont None, ou si leur IoU >= --iou ;
+  - crop : IoU entre le crop du thumbnail (compute_thumbnail_crop) calculé avec la bbox
+    pleine résolution et celui calculé avec la bbox du proxy ; c'est ce qui compte visuellement ;
+  - temps de détection moyen.
+
+La plus petite résolution dont l'accord des crops (IoU >= --crop-iou) atteint --min-agreement
+est proposée comme valeur de --detect-max-side pour thumb_server.py.
+
+Usage:
+  python bench/bench_proxy.py --images ../../public/img/personnages_cache
+                              [--max-side 480 640 800 1024] [--json results.json]
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def iou(a: Optional[Tuple[int, int, int, int]], b: Optional[Tuple[int, int, int, int]]) -> float:
+    if a is None or b is None:
+        return 1.0 if a is None and b is None else 0.0
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def detect(img, max_side: int) -> Tuple[Optional[Tuple[int, int, int, int]], float]:
+    thumb_server.DETECT_MAX_SIDE = max_side
+    t0 = time.perf_counter()
+    box = thumb_server.detect_best_face_box(img)
+    return box, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accord détection proxy vs pleine résolution.")
+    parser.add_argument("--images", nargs="+", required=True, help="Dossiers (ou fichiers) d'images du golden set.")
+    parser.add_argument("--max-side", type=int, nargs="+", default=[480, 640, 800, 1024],
+                        help="Résolutions de détection à tester (plus grand côté).")
+    parser.add_argument("--width", type=int, default=480, help="Largeur du thumbnail.")
+    parser.add_argument("--height", type=int, default=600, help="Hauteur du thumbnail.")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU min pour considérer deux bbox en accord.")
+    parser.add_argument("--crop-iou", type=float, default=0.9, help="IoU min pour considérer deux crops en accord.")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Taux d'accord des crops requis.")
+    parser.add_argument("--json", type=Path, default=None, help="Fichier de sortie JSON (optionnel).")
+    args = parser.parse_args()
+
+    paths = []
+    for entry in args.images:
+        p = Path(entry)
+        if p.is_dir():
+            paths += sorted(f for f in p.iterdir() if f.suffix.lower() in IMAGE_EXTS)
+        elif p.is_file():
+            paths.append(p)
+    if not paths:
+        sys.exit("[ERROR] No images found")
+
+    thumb_server.load_cascade_detectors()
+
+    stats = {side: {"box_agree": 0, "crop_agree": 0, "crop_iou_sum": 0.0, "time": 0.0} for side in args.max_side}
+    full_time = 0.0
+    n = 0
+
+    for path in paths:
+        img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"[WARN] Failed to read image: {path}")
+            continue
+        n += 1
+
+        ref_box, t = detect(img, 0)
+        full_time += t
+        ref_crop = thumb_server.compute_thumbnail_crop(img, args.width, args.height, ref_box)
+
+        for side in args.max_side:
+            box, t = detect(img, side)
+            crop = thumb_server.compute_thumbnail_crop(img, args.width, args.height, box)
+            crop_iou = iou(ref_crop, crop)
+
+            s = stats[side]
+            s["time"] += t
+            s["box_agree"] += iou(ref_box, box) >= args.iou
+            s["crop_agree"] += crop_iou >= args.crop_iou
+            s["crop_iou_sum"] += crop_iou
+
+    if n == 0:
+        sys.exit("[ERROR] No readable images")
+
+    print(f"{n} images, pleine résolution : {full_time / n * 1e3:.1f} ms/image")
+    print(f"{'max_side':>8} {'ms/image':>9} {'speedup':>8} {'accord bbox':>12} {'accord crop':>12} {'IoU crop moy':>13}")
+
+    results = {"images": n, "full_res_ms": full_time / n * 1e3, "proxy": {}}
+    recommended = None
+    for side in sorted(args.max_side):
+        s = stats[side]
+        row = {
+            "ms_per_image": s["time"] / n * 1e3,
+            "speedup": full_time / s["time"] if s["time"] > 0 else None,
+            "box_agreement": s["box_agree"] / n,
+            "crop_agreement": s["crop_agree"] / n,
+            "mean_crop_iou": s["crop_iou_sum"] / n,
+        }
+        results["proxy"][side] = row
+        if recommended is None and row["crop_agreement"] >= args.min_agreement:
+            recommended = side
+        print(f"{side:>8} {row['ms_per_image']:>9.1f} {row['speedup'] or 0:>7.2f}x "
+              f"{row['box_agreement']:>12.1%} {row['crop_agreement']:>12.1%} {row['mean_crop_iou']:>13.3f}")
+
+    results["recommended_max_side"] = recommended
+    if recommended is not None:
+        print(f"--detect-max-side {recommended} : accord des crops >= {args.min_agreement:.0%}")
+    else:
+        print(f"Aucune résolution testée n'atteint {args.min_agreement:.0%} d'accord des crops.")
+
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"[INFO] Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+bench_pyramid.py
+Temps gagné par le mode pyramide (thumb_server --pyramid / champ pyramid d'un job) pour un srcset
+1x / 2x / 3x, par rapport à des jobs indépendants.
+
+Trois façons de produire les mêmes tailles, image par image :
+  - independent : un job par taille (décodage + détection + crop / resize + encodage à chaque fois) ;
+  - multi       : un job multi-tailles (décodage et détection une fois, un resize du crop par taille) ;
+  - pyramid     : un job multi-tailles en mode pyramide (un crop, puis chaque taille réduite depuis la précédente).
+Par mode : ms par image (moyenne, p50), dont crop / resize, et gain par rapport à independent.
+Qualité : PSNR des thumbnails pyramide par rapport à un resize direct du crop.
+
+Détection : sans --detect, crop de fallback (on mesure le pipeline d'image seul) ; avec --detect,
+cascade de thumb_server (modèles chargés), payée à chaque taille en mode independent.
+
+Usage:
+  python bench/bench_pyramid.py [--thumb 480x600] [--scales 1 2 3]
+  python bench/bench_pyramid.py --images ../../public/img/personnages_cache --detect
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from image_io import decode_image  # noqa: E402
+from bench_pipeline import collect_images  # noqa: E402
+from bench_workers import make_images  # noqa: E402
+
+MODES = ["independent", "multi", "pyramid"]
+
+
+def run_mode(
+    mode: str,
+    data: bytes,
+    sizes: List[Tuple[int, int]],
+    ext: str,
+    detect: bool
+) -> Tuple[float, float, List[np.ndarray]]:
+    """Toutes les tailles d'une image dans un mode ; retourne (secondes, dont crop / resize, thumbnails)."""
+    resize_s = 0.0
+    thumbs = []
+    t0 = time.perf_counter()
+
+    def source() -> Tuple[np.ndarray, Optional[Tuple[int, int, int, int]]]:
+        img = decode_image(data)
+        return img, thumb_server.detect_best_face_box(img) if detect else None
+
+    if mode != "independent":
+        img, box = source()
+    larger = None
+    # Pyramide : de la plus grande à la plus petite (sizes est déjà dans cet ordre)
+    for width, height in sizes:
+        if mode == "independent":
+            img, box = source()
+        t = time.perf_counter()
+        thumb = thumb_server.render_thumbnail(img, width, height, box, larger if mode == "pyramid" else None)
+        resize_s += time.perf_counter() - t
+        larger = thumb
+        thumb_server.encode_thumbnail(thumb, ext)
+        thumbs.append(thumb)
+    return time.perf_counter() - t0, resize_s, thumbs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mode pyramide vs jobs indépendants pour un srcset.")
+    parser.add_argument("--images", nargs="+", default=None,
+                        help="Dossiers (ou fichiers) d'images ; défaut : jeu synthétique.")
+    parser.add_argument("--count", type=int, default=12, help="Jeu synthétique : nombre d'images.")
+    parser.add_argument("--size", default="1072x2000", help="Jeu synthétique : taille des images (LxH).")
+    parser.add_argument("--seed", type=int, default=0, help="Jeu synthétique : graine.")
+    parser.add_argument("--thumb", default="480x600", help="Taille 1x des thumbnails (LxH).")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 2, 3], help="Densités du srcset.")
+    parser.add_argument("--ext", default=".webp", help="Format d'encodage des thumbnails.")
+    parser.add_argument("--detect", action="store_true", help="Détection réelle (cascade de thumb_server).")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes mesurées sur le jeu d'images.")
+    args = parser.parse_args()
+
+    tw, th = (int(v) for v in args.thumb.split("x"))
+    sizes = [(tw * s, th * s) for s in sorted(set(args.scales), reverse=True)]
+    ext = "." + args.ext.lstrip(".")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = collect_images(args.images)
+        else:
+            w, h = (int(v) for v in args.size.split("x"))
+            paths = make_images(Path(tmp), args.count, w, h, args.seed)
+        blobs = [p.read_bytes() for p in paths]
+    if not blobs:
+        sys.exit("[ERROR] No images found")
+
+    # Chauffe (modèles, allocations OpenCV) hors mesure
+    for mode in MODES:
+        run_mode(mode, blobs[0], sizes, ext, args.detect)
+
+    totals: Dict[str, List[float]] = {mode: [] for mode in MODES}
+    resizes: Dict[str, List[float]] = {mode: [] for mode in MODES}
+    psnrs = []
+    for _ in range(args.repeat):
+        for data in blobs:
+            outputs = {}
+            for mode in MODES:
+                seconds, resize_s, outputs[mode] = run_mode(mode, data, sizes, ext, args.detect)
+                totals[mode].append(seconds * 1e3)
+                resizes[mode].append(resize_s * 1e3)
+            psnrs += [min(cv2.PSNR(a, b), 100.0) for a, b in zip(outputs["multi"][1:], outputs["pyramid"][1:])]
+
+    print(f"{len(blobs)} images x {args.repeat} passes, tailles "
+          f"{' '.join(f'{w}x{h}' for w, h in sizes)}{ext}, détection : {'cascade' if args.detect else 'aucune'}")
+    print(f"{'mode':>12} {'moy ms':>8} {'p50 ms':>8} {'resize ms':>10} {'gain':>7}")
+    base = float(np.mean(totals["independent"]))
+    for mode in MODES:
+        mean = float(np.mean(totals[mode]))
+        print(f"{mode:>12} {mean:>8.2f} {np.percentile(totals[mode], 50):>8.2f} "
+              f"{np.mean(resizes[mode]):>10.2f} {1 - mean / base:>7.1%}")
+    if psnrs:
+        print(f"PSNR pyramide / resize direct (tailles réduites en cascade) : "
+              f"moyenne {np.mean(psnrs):.1f} dB, min {np.min(psnrs):.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
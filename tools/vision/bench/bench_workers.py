@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+bench_workers.py
+Mesure le débit (jobs/s) de thumb_server.py selon le nombre de process workers.
+
+Pour chaque valeur de --workers : lance le serveur sur un port libre, envoie quelques jobs
+de chauffe, puis --jobs jobs sur des images synthétiques (toutes différentes, cache des détections
+désactivé) et attend que /health ne signale plus rien en attente ni en cours. Le serveur tourne sans
+file persistante ni statistiques de cascade sauvegardées : la mesure ne rejoue pas les jobs de
+cache/jobs.sqlite3 et n'apprend rien des images synthétiques à la cascade de production.
+
+Usage:
+  python bench/bench_workers.py [--workers 1 2 4 8] [--jobs 64] [--size 1072x2000]
+"""
+
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+VISION_DIR = Path(__file__).resolve().parents[1]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def http_json(url: str, payload=None, timeout: float = 5.0):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def make_images(folder: Path, n: int, w: int, h: int, seed: int) -> list:
+    """Images synthétiques (dégradé + formes) toutes différentes, pour éviter tout cache."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(n):
+        img = np.zeros((h, w, 3), dtype=np.uint8)
+        img[:] = rng.integers(0, 255, size=3)
+        for _ in range(12):
+            c = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+            cv2.circle(img, c, int(rng.integers(20, w // 4)), rng.integers(0, 255, size=3).tolist(), -1)
+        path = folder / f"src_{i:04d}.png"
+        cv2.imwrite(str(path), img)
+        paths.append(path)
+    return paths
+
+
+def wait_idle(base: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        h = http_json(base + "/health")
+        if h["pending"] == 0 and h["processing"] == 0 and h["queue_size"] == 0:
+            return
+        time.sleep(0.05)
+    raise TimeoutError("thumb_server did not drain its queue in time")
+
+
+def run(workers: int, images: list, out_dir: Path, width: int, height: int, extra: list) -> float:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, str(VISION_DIR / "thumb_server.py"), "--port", str(port),
+           "--workers", str(workers), "--no-face-cache", "--no-job-store", "--no-cascade-stats", *extra]
+    proc = subprocess.Popen(cmd, cwd=str(VISION_DIR), stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 300
+        while True:
+            try:
+                http_json(base + "/health", timeout=1.0)
+                break
+            except OSError:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"thumb_server failed to start: {' '.join(cmd)}")
+                time.sleep(0.2)
+
+        def enqueue(tag: str, paths: list) -> None:
+            for i, src in enumerate(paths):
+                http_json(base + "/enqueue", {
+                    "job_id": f"{tag}-{i}",
+                    "src": str(src),
+                    "dst": str(out_dir / f"{tag}-{workers}-{i}.jpg"),
+                    "width": width,
+                    "height": height,
+                })
+
+        # Chauffe : chargement paresseux, premier forward de chaque worker
+        enqueue("warmup", images[: max(2, 2 * workers)])
+        wait_idle(base, 600)
+
+        t0 = time.perf_counter()
+        enqueue("bench", images)
+        wait_idle(base, 3600)
+        return len(images) / (time.perf_counter() - t0)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de thumb_server selon --workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="Valeurs de --workers à tester.")
+    parser.add_argument("--jobs", type=int, default=64, help="Nombre de jobs mesurés par configuration.")
+    parser.add_argument("--size", default="1072x2000", help="Taille des images sources (LxH).")
+    parser.add_argument("--thumb", default="480x600", help="Taille des thumbnails (LxH).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("server_args", nargs=argparse.REMAINDER,
+                        help="Arguments supplémentaires passés à thumb_server.py (après --).")
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.size.split("x"))
+    tw, th = (int(v) for v in args.thumb.split("x"))
+    extra = [a for a in args.server_args if a != "--"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        images = make_images(tmp, args.jobs, w, h, args.seed)
+
+        print(f"{'workers':>8} {'jobs/s':>8} {'speedup':>8} {'efficacité':>11}")
+        base_rate = None
+        for n in args.workers:
+            rate = run(n, images, tmp, tw, th, extra)
+            base_rate = base_rate or rate / n
+            print(f"{n:>8} {rate:>8.2f} {rate / base_rate:>7.2f}x {rate / base_rate / n:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+cascade.py
+Cascade de détection de visage configurable pour thumb_server.
+
+Une cascade = une liste d'étapes (CascadeStage) essayées dans l'ordre sur chaque image jusqu'à
+la première détection ; au-delà, crop de fallback. Spécification en texte (--cascade) :
+
+    ssd,yolo                                   (défaut : SSD puis YOLO)
+    ssd:max_side=640,yolo:min_score=0.6:imgsz=960
+
+  - nom       : détecteur du registre (detectors.DETECTORS) ;
+  - min_score : score minimal pour accepter la détection (en plus du seuil propre au détecteur) ;
+  - max_side  : plus grand côté de l'image passée au détecteur (0 = pleine résolution ;
+                absent = --detect-max-side) ;
+  - autres    : options passées telles quelles au détecteur (ex. imgsz pour YOLO).
+
+CascadeStats mesure, par bucket de source (format x taille, cf. image_bucket) et par étape, le taux de
+succès et le coût moyen par image : une illustration plein cadre et un portrait serré ne ratent pas
+les mêmes détecteurs. plan() peut alors, bucket par bucket :
+  - réordonner les étapes par coût / taux de succès croissant : l'ordre qui minimise la latence
+    attendue si les étapes réussissent indépendamment les unes des autres (approximation : le taux
+    d'une étape est mesuré sur les images que les étapes précédentes ont manquées) ;
+  - sauter une étape dont le taux de succès est sous un seuil, sauf une fois sur probe_every
+    pour continuer à la mesurer. Si toutes les étapes d'un bucket sont sautées, ses images vont
+    directement au crop de fallback.
+Réordonner change le détecteur retenu quand plusieurs trouveraient un visage : désactivé par défaut.
+
+Les statistiques sont sauvegardées en JSON (save / load) pour survivre à un redémarrage. En mode
+multi-process, chaque worker envoie take() après chaque lot ; le process HTTP l'ajoute avec merge().
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+class CascadeStage(NamedTuple):
+    name: str
+    min_score: Optional[float] = None
+    max_side: Optional[int] = None
+    options: Tuple[Tuple[str, Any], ...] = ()
+
+    @property
+    def label(self) -> str:
+        """Nom de l'étape dans les statistiques / métriques (distingue ssd et ssd@640)."""
+        return self.name if self.max_side is None else f"{self.name}@{self.max_side}"
+
+    def spec(self) -> str:
+        parts = [self.name]
+        if self.min_score is not None:
+            parts.append(f"min_score={self.min_score:g}")
+        if self.max_side is not None:
+            parts.append(f"max_side={self.max_side}")
+        parts += [f"{key}={value}" for key, value in self.options]
+        return ":".join(parts)
+
+
+def _parse_value(value: str) -> Any:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_cascade(spec: str, known: Optional[List[str]] = None) -> List[CascadeStage]:
+    """
+    "ssd:max_side=640,yolo:min_score=0.6" -> [CascadeStage, ...].
+    known : noms de détecteurs acceptés. Lève ValueError si la spécification est invalide.
+    """
+    stages = []
+    for part in spec.split(","):
+        name, *params = part.strip().split(":")
+        if not name:
+            raise ValueError(f"Empty detector name in cascade {spec!r}")
+        if known is not None and name not in known:
+            raise ValueError(f"Unknown detector: {name} (expected one of {', '.join(known)})")
+
+        min_score = max_side = None
+        options = []
+        for param in params:
+            key, sep, value = param.partition("=")
+            if not sep:
+                raise ValueError(f"Invalid cascade option {param!r} (expected key=value)")
+            if key == "min_score":
+                min_score = float(value)
+            elif key == "max_side":
+                max_side = max(0, int(value))
+            else:
+                options.append((key, _parse_value(value)))
+        stages.append(CascadeStage(name, min_score, max_side, tuple(options)))
+
+    if len({stage.label for stage in stages}) != len(stages):
+        raise ValueError(f"Duplicate stage in cascade {spec!r}")
+    return stages
+
+
+def format_cascade(stages: List[CascadeStage]) -> str:
+    return ",".join(stage.spec() for stage in stages)
+
+
+# Buckets de source : format (largeur / hauteur) puis taille (plus grand côté, en pixels)
+ASPECT_BUCKETS = ((0.75, "tall"), (1.33, "square"), (float("inf"), "wide"))
+SIZE_BUCKETS = ((640, "s"), (1600, "m"), (float("inf"), "l"))
+
+
+def image_bucket(width: int, height: int) -> str:
+    """Bucket d'une image source, ex. "tall/m" (carte de personnage), "wide/l" (illustration)."""
+    aspect = width / height if height > 0 else 1.0
+    shape = next(name for bound, name in ASPECT_BUCKETS if aspect < bound)
+    size = next(name for bound, name in SIZE_BUCKETS if max(width, height) <= bound)
+    return f"{shape}/{size}"
+
+
+class CascadeStats:
+    """
+    Par bucket et par étape : images essayées, détections, secondes cumulées. Les compteurs sont
+    divisés par deux au-delà de window images essayées, pour suivre une évolution du catalogue.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        # bucket -> label -> [essais, succès, secondes]
+        self._stats: Dict[str, Dict[str, List[float]]] = {}
+        # Ajouts depuis le dernier take() (process worker)
+        self._delta: Dict[str, Dict[str, List[float]]] = {}
+        self._plans: Dict[str, int] = {}
+        self._dirty = False
+
+    def after_fork(self) -> None:
+        """Dans un process worker : nouveau verrou (celui copié au fork peut être pris), delta vide."""
+        self._lock = threading.Lock()
+        self._delta = {}
+
+    def _add(self, bucket: str, label: str, tried: float, hits: float, seconds: float) -> None:
+        s = self._stats.setdefault(bucket, {}).setdefault(label, [0.0, 0.0, 0.0])
+        s[0] += tried
+        s[1] += hits
+        s[2] += seconds
+        if s[0] > self.window:
+            s[:] = [v / 2 for v in s]
+        self._dirty = True
+
+    def record(self, bucket: str, label: str, tried: int, hits: int, seconds: float) -> None:
+        with self._lock:
+            self._add(bucket, label, tried, hits, seconds)
+            d = self._delta.setdefault(bucket, {}).setdefault(label, [0.0, 0.0, 0.0])
+            d[0] += tried
+            d[1] += hits
+            d[2] += seconds
+
+    def take(self) -> Optional[Dict[str, Dict[str, List[float]]]]:
+        """Retourne puis remet à zéro ce qui a été enregistré depuis le dernier appel (None si rien)."""
+        with self._lock:
+            if not self._delta:
+                return None
+            delta, self._delta = self._delta, {}
+        return delta
+
+    def merge(self, delta: Dict[str, Dict[str, List[float]]]) -> None:
+        with self._lock:
+            for bucket, stages in delta.items():
+                for label, (tried, hits, seconds) in stages.items():
+                    self._add(bucket, label, tried, hits, seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        with self._lock:
+            return {
+                bucket: {
+                    label: {"tried": tried, "hit_rate": hits / tried if tried else 0.0,
+                            "mean_ms": seconds / tried * 1e3 if tried else 0.0}
+                    for label, (tried, hits, seconds) in stages.items()
+                }
+                for bucket, stages in sorted(self._stats.items())
+            }
+
+    def plan(
+        self,
+        bucket: str,
+        stages: List[CascadeStage],
+        adaptive: bool = False,
+        skip_below: float = 0.0,
+        min_samples: int = 50,
+        probe_every: int = 20
+    ) -> Tuple[List[CascadeStage], List[CascadeStage]]:
+        """
+        Retourne (étapes à exécuter dans l'ordre, étapes sautées) pour une image du bucket. Tant qu'une
+        étape a moins de min_samples essais dans ce bucket, l'ordre configuré est conservé et rien
+        n'est sauté. probe_every = 0 : jamais de sonde (et pas de compteur avancé, ex. pour inspection).
+        """
+        if not adaptive and skip_below <= 0:
+            return stages, []
+
+        with self._lock:
+            probe = False
+            if probe_every > 0:
+                self._plans[bucket] = self._plans.get(bucket, 0) + 1
+                probe = self._plans[bucket] % probe_every == 0
+            stats = {label: list(s) for label, s in self._stats.get(bucket, {}).items()}
+
+        measured = {}
+        for stage in stages:
+            tried, hits, seconds = stats.get(stage.label, (0.0, 0.0, 0.0))
+            if tried < min_samples:
+                return stages, []
+            measured[stage.label] = (hits / tried, seconds / tried)
+
+        ordered = stages
+        if adaptive:
+            # Coût par visage trouvé : une étape qui ne trouve jamais rien passe en dernier
+            ordered = sorted(stages, key=lambda s: measured[s.label][1] / measured[s.label][0]
+                             if measured[s.label][0] > 0 else float("inf"))
+
+        skipped = []
+        if skip_below > 0 and not probe:
+            skipped = [s for s in ordered if measured[s.label][0] < skip_below]
+            ordered = [s for s in ordered if s not in skipped]
+        return ordered, skipped
+
+    def save(self, path: Path) -> bool:
+        """
+        Écrit les statistiques si elles ont changé depuis le dernier save / load (fichier temporaire
+        puis rename : un redémarrage ne lit jamais un fichier à moitié écrit). Retourne True si écrit.
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {"window": self.window, "buckets": {b: {k: list(v) for k, v in s.items()}
+                                                       for b, s in self._stats.items()}}
+            self._dirty = False
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+        return True
+
+    def load(self, path: Path) -> int:
+        """Recharge des statistiques sauvegardées (remplace les actuelles) ; retourne le nombre de buckets."""
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        stats = {
+            str(bucket): {str(label): [float(v) for v in values][:3] for label, values in stages.items()}
+            for bucket, stages in data.get("buckets", {}).items()
+        }
+        with self._lock:
+            self._stats = stats
+            self._dirty = False
+        return len(stats)
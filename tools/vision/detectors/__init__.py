@@ -1,9 +1,60 @@
 # detectors/__init__.py
+"""
+Détecteurs de visage. L'import du paquet reste léger : torch (SSD) et ultralytics (YOLO)
+ne sont importés qu'au premier chargement du détecteur correspondant.
+"""
+
+from typing import Any, Callable, Dict
+
+from .base import Box, FaceDetection
+
+# Backends / optimisations du SSD (cf. faceboxes_backends), définis ici pour les options en ligne
+# de commande sans importer torch
+SSD_BACKENDS = ("eager", "torchscript", "compile", "onnx", "int8")
+SSD_OPTIMIZATIONS = ("fold_bn", "channels_last")
+
+
+def get_ssd_detector(*args, **kwargs) -> Any:
+    from .anime_face_ssd import get_ssd_detector as factory  # import de torch différé
+
+    return factory(*args, **kwargs)
+
+
+def get_yolo_detector(*args, **kwargs) -> Any:
+    from .anime_face_yolo import get_yolo_detector as factory  # import d'ultralytics différé
+
+    return factory(*args, **kwargs)
+
+
+# Registre des détecteurs utilisables dans la cascade de thumb_server (--cascade) :
+# nom -> fabrique (singleton, modèle chargé au premier appel). Un détecteur expose
+# detect_best_faces_scored(imgs_bgr, **options) -> [(bbox, score) ou None, ...].
+DETECTORS: Dict[str, Callable[..., Any]] = {
+    "ssd": get_ssd_detector,
+    "yolo": get_yolo_detector,
+}
+
+
+def register_detector(name: str, factory: Callable[..., Any]) -> None:
+    DETECTORS[name] = factory
+
+
+def get_detector(name: str, **kwargs) -> Any:
+    """Détecteur du registre ; kwargs = options de chargement propres au détecteur."""
+    factory = DETECTORS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown detector: {name} (expected one of {', '.join(DETECTORS)})")
+    return factory(**kwargs)
 
-from .anime_face_ssd import get_ssd_detector
-from .anime_face_yolo import get_yolo_detector
 
 __all__ = [
+    "Box",
+    "FaceDetection",
+    "DETECTORS",
+    "register_detector",
+    "get_detector",
     "get_ssd_detector",
+    "SSD_BACKENDS",
+    "SSD_OPTIMIZATIONS",
     "get_yolo_detector",
-]
\ No newline at end of file
+]
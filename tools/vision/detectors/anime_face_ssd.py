@@ -1,13 +1,17 @@
+import threading
+from collections import OrderedDict
 from itertools import product
 from math import ceil
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
+from .faceboxes_backends import PARITY_ATOL, make_backend, max_output_diff
+
 # Désactivation globale du gradient (on ne fait que de l'inférence)
 torch.set_grad_enabled(False)
 
@@ -165,44 +169,43 @@ class PriorBox(object):
         ]
 
     def forward(self):
+        """
+        Génère les anchors (cx, cy, s_kx, s_ky) normalisés, dans le même ordre que la version
+        historique en boucles Python : feature map k, puis cellule (i, j) en row-major,
+        puis min_size, puis décalages denses (cy puis cx).
+        Tout est calculé par opérations sur tableaux (une grille par décalage).
+        """
+        im_height, im_width = self.image_size
         anchors = []
         for k, f in enumerate(self.feature_maps):
-            min_sizes = self.min_sizes[k]
-            for i, j in product(range(f[0]), range(f[1])):
-                for min_size in min_sizes:
-                    s_kx = min_size / self.image_size[1]
-                    s_ky = min_size / self.image_size[0]
-                    if min_size == 32:
-                        dense_cx = [
-                            x * self.steps[k] / self.image_size[1]
-                            for x in [j + 0, j + 0.25, j + 0.5, j + 0.75]
-                        ]
-                        dense_cy = [
-                            y * self.steps[k] / self.image_size[0]
-                            for y in [i + 0, i + 0.25, i + 0.5, i + 0.75]
-                        ]
-                        for cy, cx in product(dense_cy, dense_cx):
-                            anchors += [cx, cy, s_kx, s_ky]
-                    elif min_size == 64:
-                        dense_cx = [
-                            x * self.steps[k] / self.image_size[1]
-                            for x in [j + 0, j + 0.5]
-                        ]
-                        dense_cy = [
-                            y * self.steps[k] / self.image_size[0]
-                            for y in [i + 0, i + 0.5]
-                        ]
-                        for cy, cx in product(dense_cy, dense_cx):
-                            anchors += [cx, cy, s_kx, s_ky]
-                    else:
-                        cx = (j + 0.5) * self.steps[k] / self.image_size[1]
-                        cy = (i + 0.5) * self.steps[k] / self.image_size[0]
-                        anchors += [cx, cy, s_kx, s_ky]
-        output = torch.Tensor(anchors).view(-1, 4)
+            step = self.steps[k]
+            ii, jj = np.meshgrid(np.arange(f[0]), np.arange(f[1]), indexing='ij')
+
+            cell_anchors = []
+            for min_size in self.min_sizes[k]:
+                s_kx = np.full(ii.shape, min_size / im_width)
+                s_ky = np.full(ii.shape, min_size / im_height)
+                for dy, dx in product(self._dense_offsets(min_size), repeat=2):
+                    cx = (jj + dx) * step / im_width
+                    cy = (ii + dy) * step / im_height
+                    cell_anchors.append(np.stack([cx, cy, s_kx, s_ky], axis=-1))
+
+            # (fh, fw, nb_anchors_par_cellule, 4) -> (fh * fw * nb, 4)
+            anchors.append(np.stack(cell_anchors, axis=2).reshape(-1, 4))
+
+        output = torch.from_numpy(np.concatenate(anchors).astype(np.float32))
         if self.clip:
             output.clamp_(max=1, min=0)
         return output
 
+    @staticmethod
+    def _dense_offsets(min_size):
+        if min_size == 32:
+            return [0, 0.25, 0.5, 0.75]
+        if min_size == 64:
+            return [0, 0.5]
+        return [0.5]
+
 
 def mymax(a, b):
     return a if a >= b else b
@@ -250,10 +253,62 @@ def cpu_nms(dets, thresh):
     return keep
 
 
+def cpu_nms_vectorized(dets, thresh):
+    """
+    NMS glouton vectorisé : à chaque itération, le meilleur candidat restant est gardé et tous
+    ses recouvrements sont calculés d'un coup sur le reste de la liste.
+    Même ordre de parcours, mêmes calculs float32 et même critère (ovr >= thresh) que cpu_nms,
+    donc exactement les mêmes indices gardés, dans le même ordre.
+    """
+    x1 = dets[:, 0]
+    y1 = dets[:, 1]
+    x2 = dets[:, 2]
+    y2 = dets[:, 3]
+    scores = dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[rest] - inter)
+
+        # ~(ovr >= thresh) plutôt que ovr < thresh : un NaN ne supprime rien, comme dans cpu_nms
+        order = rest[~(ovr >= thresh)]
+    return keep
+
+
 def nms(dets, thresh, force_cpu=False):
     if dets.shape[0] == 0:
         return []
-    return cpu_nms(dets, thresh)
+    return cpu_nms_vectorized(dets, thresh)
+
+
+def top_k_desc(scores, k):
+    """
+    Indices des k meilleurs scores, triés par score décroissant : exactement
+    scores.argsort(kind="stable")[::-1][:k] (à score égal, l'indice le plus grand d'abord).
+    Au-delà de k candidats, on ne trie que les k retenus (argpartition) au lieu de tout trier,
+    sauf si des scores égaux au k-ième restent hors de la partition : lesquels garder dépend
+    alors de l'ordre du tri complet.
+    """
+    if scores.shape[0] > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        kth = scores[part].min()
+        if np.count_nonzero(scores == kth) == np.count_nonzero(scores[part] == kth):
+            # Indices croissants puis tri stable : même ordre des égalités que le tri complet
+            part.sort()
+            return part[scores[part].argsort(kind="stable")[::-1]]
+    return scores.argsort(kind="stable")[::-1][:k]
 
 
 def decode(loc, priors, variances):
@@ -284,11 +339,14 @@ def remove_prefix(state_dict, prefix):
 
 
 def load_model(model, pretrained_path, load_to_cpu):
+    # weights_only=False explicite : le checkpoint était chargé jusqu'ici avec le patch de torch.load
+    # d'anime_face_yolo (importé avant), qui ne l'est plus forcément (import différé)
     if load_to_cpu:
-        pretrained_dict = torch.load(pretrained_path, map_location='cpu')
+        pretrained_dict = torch.load(pretrained_path, map_location='cpu', weights_only=False)
     else:
         device = torch.cuda.current_device()
-        pretrained_dict = torch.load(pretrained_path, map_location=lambda storage, loc: storage.cuda(device))
+        pretrained_dict = torch.load(pretrained_path, map_location=lambda storage, loc: storage.cuda(device),
+                                     weights_only=False)
     if "state_dict" in pretrained_dict.keys():
         pretrained_dict = remove_prefix(pretrained_dict['state_dict'], 'module.')
     else:
@@ -301,9 +359,23 @@ def load_model(model, pretrained_path, load_to_cpu):
 class SSDAnimeFaceDetector:
     """
     Wrapper propre autour de FaceBoxes pour détecter le meilleur visage sur une image (np.array BGR).
+
+    backend : moteur d'inférence du réseau (cf. faceboxes_backends.BACKENDS). Un backend autre que
+    eager est comparé au modèle eager ; s'il échoue ou s'en écarte, on reste en eager.
+    optimize : optimisations du réseau fp32 (cf. faceboxes_backends.OPTIMIZATIONS), soumises au même
+    contrôle ; self.net reste le réseau d'origine (référence).
+    Le backend (traçage TorchScript, contrôle de parité : de l'inférence) n'est préparé qu'au premier
+    accès à self.backend, dans le process qui s'en sert : avec --workers, chaque worker après le fork,
+    et le process HTTP ne fait que charger les poids (pools de threads torch / ONNX Runtime non hérités).
     """
 
-    def __init__(self, model_path: str, device: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: str,
+        device: Optional[str] = None,
+        backend: str = "eager",
+        optimize: Sequence[str] = ()
+    ):
         self.model_path = str(model_path)
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -325,39 +397,142 @@ class SSDAnimeFaceDetector:
         self.keepTopK = 750
         self.top_k = 5000
 
+        # Batching (cf. detect_best_faces)
+        self.batchStride = 32  # les tailles d'entrée sont arrondies à ce multiple pour former les groupes
+        self.maxBatch = 16  # nombre max d'images par forward
+
+        # Cache LRU des priors (déjà sur self.device), clé = taille d'entrée (H, W)
+        self.priorsCacheSize = 64
+        self._priors_cache: "OrderedDict[Tuple[int, int], torch.Tensor]" = OrderedDict()
+        self._priors_lock = threading.Lock()
+
         net = FaceBoxes(phase='test', size=None, num_classes=2)
         net = load_model(net, self.model_path, load_to_cpu=(self.device.type == "cpu"))
         net.eval()
         net.to(self.device)
         self.net = net
-
-    def detect_best_face(self, img_bgr: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        self._requested_backend = (backend, tuple(optimize))
+        self._backend: Optional[Tuple[str, Tuple[str, ...], object]] = None
+        self._backend_lock = threading.Lock()
+
+    def _resolve_backend(self) -> Tuple[str, Tuple[str, ...], object]:
+        with self._backend_lock:
+            if self._backend is None:
+                self._backend = self._load_backend(*self._requested_backend)
+            return self._backend
+
+    @property
+    def backend_name(self) -> str:
+        """Backend effectif (eager si celui demandé est indisponible) ; le prépare au besoin."""
+        return self._resolve_backend()[0]
+
+    @property
+    def optimize(self) -> Tuple[str, ...]:
+        return self._resolve_backend()[1]
+
+    @property
+    def backend(self):
+        return self._resolve_backend()[2]
+
+    def _load_backend(self, name: str, optimize: Tuple[str, ...]):
+        eager = make_backend("eager", self.net, self.model_path, self.device)
+        # onnx / int8 : réseau déjà figé dans le fichier exporté, les optimisations ne s'appliquent pas
+        if name in ("onnx", "int8"):
+            optimize = ()
+        if name == "eager" and not optimize:
+            return name, optimize, eager
+        label = "+".join((name,) + optimize)
+        try:
+            backend = make_backend(name, self.net, self.model_path, self.device, optimize)
+            # torch.compile : une compilation par taille d'entrée, trop long pour un contrôle au chargement ;
+            # int8 : écart attendu sur les sorties brutes, l'accord des bbox est vérifié par export_ssd.py
+            if name not in ("compile", "int8"):
+                diff = max(max_output_diff(eager, backend, [(1, 3, 256, 192), (2, 3, 320, 256)]))
+                if diff > PARITY_ATOL:
+                    raise ValueError(f"outputs differ from eager by {diff:.2e}")
+        except Exception as e:
+            print(f"[WARN] FaceBoxes backend {label} unavailable, using eager: {e}")
+            return "eager", (), eager
+        print(f"[INFO] FaceBoxes backend: {label}")
+        return name, optimize, backend
+
+    def letterbox_shape(self, im_height: int, im_width: int) -> Tuple[int, int]:
         """
-        Détecte le meilleur visage sur une image BGR (H, W, 3).
-        Retourne (xmin, ymin, xmax, ymax) en int, ou None si rien de suffisamment fiable.
+        Taille (H, W) d'entrée "letterboxée" utilisée pour regrouper les images d'un batch :
+        arrondie au multiple supérieur de self.batchStride.
         """
-        if img_bgr is None or img_bgr.size == 0:
-            return None
+        stride = self.batchStride
+        return ceil(im_height / stride) * stride, ceil(im_width / stride) * stride
 
-        img = np.float32(img_bgr)
-        im_height, im_width, _ = img.shape
-        scale = torch.tensor([im_width, im_height, im_width, im_height], device=self.device)
+    def after_fork(self) -> None:
+        """Dans un process forké : nouveaux verrous (ceux copiés au fork peuvent être pris)."""
+        self._priors_lock = threading.Lock()
+        self._backend_lock = threading.Lock()
 
+    def get_priors(self, im_height: int, im_width: int) -> torch.Tensor:
+        """
+        Priors pour une taille d'entrée donnée, mis en cache (LRU borné à self.priorsCacheSize).
+        Les tailles de cartes du catalogue se répètent : on ne paie la génération qu'une fois.
+        """
+        key = (im_height, im_width)
+        with self._priors_lock:
+            priors = self._priors_cache.get(key)
+            if priors is not None:
+                self._priors_cache.move_to_end(key)
+                return priors
+
+        priors = PriorBox(self.cfg, image_size=key).forward().to(self.device)
+
+        with self._priors_lock:
+            self._priors_cache[key] = priors
+            self._priors_cache.move_to_end(key)
+            while len(self._priors_cache) > self.priorsCacheSize:
+                self._priors_cache.popitem(last=False)
+        return priors
+
+    def _preprocess(self, img_bgr: np.ndarray) -> np.ndarray:
+        """
+        BGR (H, W, 3) uint8 -> float32 (3, H, W) centré sur la moyenne du modèle.
+        """
+        img = np.float32(img_bgr)
         img -= (104, 117, 123)
-        img = img.transpose(2, 0, 1)
-        img_t = torch.from_numpy(img).unsqueeze(0).to(self.device)
+        return img.transpose(2, 0, 1)
 
-        with torch.no_grad():
-            loc, conf = self.net(img_t)
+    def _forward(self, inputs: List[np.ndarray], in_height: int, in_width: int):
+        """
+        Forward FaceBoxes sur un batch d'images prétraitées (3, h, w) avec h <= in_height, w <= in_width.
+        Les images plus petites sont complétées en bas/à droite par des zéros
+        (= la couleur moyenne avant centrage), ce qui ne décale pas les coordonnées.
 
-        priorbox = PriorBox(self.cfg, image_size=(im_height, im_width))
-        priors = priorbox.forward().to(self.device)
-        prior_data = priors.data
+        Retourne (loc, conf) de formes (B, P, 4) et (B, P, 2).
+        """
+        batch = np.zeros((len(inputs), 3, in_height, in_width), dtype=np.float32)
+        for i, img in enumerate(inputs):
+            batch[i, :, :img.shape[1], :img.shape[2]] = img
+
+        loc, conf = self.backend(torch.from_numpy(batch))
+
+        return loc.data, conf.data.view(len(inputs), -1, 2)
+
+    def _best_from_output(
+        self,
+        loc: torch.Tensor,
+        conf: torch.Tensor,
+        priors: torch.Tensor,
+        in_height: int,
+        in_width: int,
+        im_height: int,
+        im_width: int
+    ) -> Optional[Tuple[Tuple[int, int, int, int], float]]:
+        """
+        Décodage + NMS pour une image du batch, retourne (meilleure bbox, score) ou None.
+        """
+        scale = torch.tensor([in_width, in_height, in_width, in_height], device=self.device)
 
-        boxes = decode(loc.data.squeeze(0), prior_data, self.cfg['variance'])
+        boxes = decode(loc, priors, self.cfg['variance'])
         boxes = boxes * scale
         boxes = boxes.cpu().numpy()
-        scores = conf.data.cpu().numpy()[:, 1]
+        scores = conf.cpu().numpy()[:, 1]
 
         inds = np.where(scores > self.confidenceTh)[0]
         if inds.size == 0:
@@ -366,7 +541,7 @@ class SSDAnimeFaceDetector:
         boxes = boxes[inds]
         scores = scores[inds]
 
-        order = scores.argsort()[::-1][:self.top_k]
+        order = top_k_desc(scores, self.top_k)
         boxes = boxes[order]
         scores = scores[order]
 
@@ -397,7 +572,69 @@ class SSDAnimeFaceDetector:
         if xmax <= xmin or ymax <= ymin:
             return None
 
-        return xmin, ymin, xmax, ymax
+        return (xmin, ymin, xmax, ymax), float(score)
+
+    def detect_best_face(self, img_bgr: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Détecte le meilleur visage sur une image BGR (H, W, 3).
+        Retourne (xmin, ymin, xmax, ymax) en int, ou None si rien de suffisamment fiable.
+        """
+        found = self.detect_best_face_scored(img_bgr)
+        return found[0] if found is not None else None
+
+    def detect_best_face_scored(
+        self,
+        img_bgr: np.ndarray
+    ) -> Optional[Tuple[Tuple[int, int, int, int], float]]:
+        """
+        Comme detect_best_face, mais retourne (bbox, score) ou None.
+        Même chemin qu'en batch (entrée letterboxée, cf. letterbox_shape) : une image donne le même
+        résultat seule ou dans un lot, quel que soit le remplissage de la file.
+        """
+        return self.detect_best_faces_scored([img_bgr])[0]
+
+    def detect_best_faces(self, imgs_bgr: Sequence[np.ndarray]) -> List[Optional[Tuple[int, int, int, int]]]:
+        """
+        Version batchée de detect_best_face.
+        Retourne une bbox (ou None) par image, dans l'ordre d'entrée.
+        """
+        return [found[0] if found is not None else None for found in self.detect_best_faces_scored(imgs_bgr)]
+
+    def detect_best_faces_scored(
+        self,
+        imgs_bgr: Sequence[np.ndarray]
+    ) -> List[Optional[Tuple[Tuple[int, int, int, int], float]]]:
+        """
+        Version batchée de detect_best_face_scored.
+
+        Les images sont regroupées par taille letterboxée (cf. letterbox_shape) ; chaque groupe
+        passe dans un seul forward FaceBoxes (par paquets de self.maxBatch au plus), puis le
+        décodage / NMS est fait image par image.
+        Retourne (bbox, score) ou None par image, dans l'ordre d'entrée.
+        """
+        results: List[Optional[Tuple[Tuple[int, int, int, int], float]]] = [None] * len(imgs_bgr)
+
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, img in enumerate(imgs_bgr):
+            if img is None or img.size == 0:
+                continue
+            buckets.setdefault(self.letterbox_shape(*img.shape[:2]), []).append(i)
+
+        for (in_height, in_width), indices in buckets.items():
+            priors = self.get_priors(in_height, in_width)
+
+            for start in range(0, len(indices), self.maxBatch):
+                chunk = indices[start:start + self.maxBatch]
+                inputs = [self._preprocess(imgs_bgr[i]) for i in chunk]
+                loc, conf = self._forward(inputs, in_height, in_width)
+
+                for b, i in enumerate(chunk):
+                    im_height, im_width = imgs_bgr[i].shape[:2]
+                    results[i] = self._best_from_output(
+                        loc[b], conf[b], priors, in_height, in_width, im_height, im_width
+                    )
+
+        return results
 
 
 _SSD_DETECTOR: Optional[SSDAnimeFaceDetector] = None
@@ -405,7 +642,9 @@ _SSD_DETECTOR: Optional[SSDAnimeFaceDetector] = None
 
 def get_ssd_detector(
     model_path: Optional[str] = None,
-    device: Optional[str] = None
+    device: Optional[str] = None,
+    backend: str = "eager",
+    optimize: Sequence[str] = ()
 ) -> SSDAnimeFaceDetector:
     """
     Singleton pour réutiliser le même modèle SSD pendant toute la durée du process.
@@ -415,5 +654,5 @@ def get_ssd_detector(
         if model_path is None:
             base_dir = Path(__file__).resolve().parents[1]
             model_path = base_dir / "models" / "ssd_anime_face_detect.pth"
-        _SSD_DETECTOR = SSDAnimeFaceDetector(str(model_path), device=device)
+        _SSD_DETECTOR = SSDAnimeFaceDetector(str(model_path), device=device, backend=backend, optimize=optimize)
     return _SSD_DETECTOR
@@ -1,7 +1,7 @@
 import os, io
 import contextlib
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
 import torch
@@ -36,16 +36,32 @@ class YOLOAnimeFaceDetector:
         self.imgsz = imgsz
         self.min_conf = conf
 
-    def detect_best_face(self, img_bgr: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    def detect_best_face(
+        self,
+        img_bgr: np.ndarray,
+        imgsz: Optional[int] = None
+    ) -> Optional[Tuple[int, int, int, int]]:
         """
         Détecte un visage avec YOLOv8 sur une image BGR (H, W, 3).
+        imgsz : taille d'inférence (par défaut self.imgsz).
         Retourne (xmin, ymin, xmax, ymax) ou None.
         """
+        found = self.detect_best_face_scored(img_bgr, imgsz=imgsz)
+        return found[0] if found is not None else None
+
+    def detect_best_face_scored(
+        self,
+        img_bgr: np.ndarray,
+        imgsz: Optional[int] = None
+    ) -> Optional[Tuple[Tuple[int, int, int, int], float]]:
+        """
+        Comme detect_best_face, mais retourne (bbox, score) ou None.
+        """
         if img_bgr is None or img_bgr.size == 0:
             return None
 
         # Ultralytics accepte les ndarrays directement
-        results = self.model.predict(img_bgr, imgsz=self.imgsz, verbose=False)
+        results = self.model.predict(img_bgr, imgsz=imgsz or self.imgsz, verbose=False)
         if not results:
             return None
 
@@ -65,7 +81,18 @@ class YOLOAnimeFaceDetector:
             return None
 
         x1, y1, x2, y2 = xyxy[k]
-        return int(x1), int(y1), int(x2), int(y2)
+        return (int(x1), int(y1), int(x2), int(y2)), float(scores[k])
+
+    def detect_best_faces_scored(
+        self,
+        imgs_bgr: Sequence[np.ndarray],
+        imgsz: Optional[int] = None
+    ) -> List[Optional[Tuple[Tuple[int, int, int, int], float]]]:
+        """
+        Interface commune aux détecteurs de la cascade : une inférence par image
+        (les images d'un lot n'ont pas la même taille).
+        """
+        return [self.detect_best_face_scored(img, imgsz=imgsz) for img in imgs_bgr]
 
 
 _YOLO_DETECTOR: Optional[YOLOAnimeFaceDetector] = None
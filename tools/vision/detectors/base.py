@@ -0,0 +1,15 @@
+# detectors/base.py
+
+from typing import NamedTuple, Tuple
+
+Box = Tuple[int, int, int, int]
+
+
+class FaceDetection(NamedTuple):
+    """
+    Résultat de la cascade de détection : bbox (xmin, ymin, xmax, ymax) en pixels,
+    score du détecteur et nom du détecteur qui l'a produite ("ssd", "yolo").
+    """
+    box: Box
+    score: float
+    detector: str
@@ -0,0 +1,287 @@
+# detectors/faceboxes_backends.py
+"""
+Backends d'inférence du réseau FaceBoxes (SSDAnimeFaceDetector) :
+  - eager       : module PyTorch tel quel (défaut) ;
+  - torchscript : torch.jit.trace + freeze, chargé depuis <modèle>.ts (export_ssd.py) ou tracé au chargement ;
+  - compile     : torch.compile(dynamic=True) ; compilation longue à la première image de chaque taille ;
+  - onnx        : ONNX Runtime sur CPU, depuis <modèle>.onnx (export_ssd.py ; pip install onnxruntime) ;
+  - int8        : modèle quantifié int8 (quantification statique FX, calibrée sur des images du catalogue),
+                  depuis <modèle>.int8.ts (export_ssd.py --formats int8) ; CPU uniquement.
+
+Optimisations du réseau fp32 (OPTIMIZATIONS), pour eager / torchscript / compile :
+  - fold_bn       : BatchNorm repliées dans les convolutions qui les précèdent (poids + biais) ;
+  - channels_last : poids et entrées en mémoire NHWC, le format natif des convolutions CPU (oneDNN).
+ONNX Runtime fait déjà l'équivalent de son côté ; le modèle int8 est replié au moment de la quantification.
+
+Tous acceptent un batch float32 (B, 3, H, W) de taille quelconque (axes dynamiques) et rendent,
+comme FaceBoxes en phase "test" : loc (B, P, 4) et conf (B * P, 2) après softmax.
+"""
+
+import copy
+import inspect
+import os
+import warnings
+from pathlib import Path
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+# Noms définis dans detectors/__init__.py (options en ligne de commande sans importer torch)
+from . import SSD_BACKENDS as BACKENDS, SSD_OPTIMIZATIONS as OPTIMIZATIONS
+
+# Écart max toléré avec le modèle eager (sorties loc / conf)
+PARITY_ATOL = 1e-4
+# Taille d'entrée de l'export (les axes batch / hauteur / largeur restent dynamiques)
+EXPORT_SHAPE = (1, 3, 320, 256)
+
+
+def torchscript_path(model_path: str) -> Path:
+    return Path(model_path).with_suffix(".ts")
+
+
+def onnx_path(model_path: str) -> Path:
+    return Path(model_path).with_suffix(".onnx")
+
+
+def int8_path(model_path: str) -> Path:
+    return Path(model_path).with_suffix(".int8.ts")
+
+
+def fold_batchnorm(net: nn.Module) -> nn.Module:
+    """
+    Copie du réseau où chaque bloc conv -> bn (BasicConv2d, CRelu) devient une seule convolution :
+    w' = w * gamma / sqrt(var + eps), b' = (b - mean) * gamma / sqrt(var + eps) + beta.
+    Mode eval uniquement (statistiques figées) ; la bn du bloc est remplacée par Identity.
+    """
+    from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+    folded = copy.deepcopy(net).eval()
+    for module in folded.modules():
+        conv, bn = getattr(module, "conv", None), getattr(module, "bn", None)
+        if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+            module.conv = fuse_conv_bn_eval(conv, bn)
+            module.bn = nn.Identity()
+    return folded
+
+
+def optimize_net(net: nn.Module, optimizations: Iterable[str]) -> nn.Module:
+    """Réseau fp32 avec les optimisations demandées (cf. OPTIMIZATIONS) ; net n'est pas modifié."""
+    optimizations = set(optimizations)
+    unknown = optimizations - set(OPTIMIZATIONS)
+    if unknown:
+        raise ValueError(f"Unknown FaceBoxes optimization: {', '.join(sorted(unknown))} "
+                         f"(expected one of {', '.join(OPTIMIZATIONS)})")
+    if "fold_bn" in optimizations:
+        net = fold_batchnorm(net)
+    if "channels_last" in optimizations:
+        if "fold_bn" not in optimizations:
+            net = copy.deepcopy(net)
+        net = net.to(memory_format=torch.channels_last)
+    return net
+
+
+def trace(net: nn.Module, device: torch.device) -> torch.jit.ScriptModule:
+    with warnings.catch_warnings():
+        # Les tailles lues dans forward() (o.size(0)...) restent dynamiques dans le graphe tracé
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        warnings.simplefilter("ignore", FutureWarning)
+        return torch.jit.trace(net, torch.zeros(EXPORT_SHAPE, device=device), check_trace=False)
+
+
+def save_torchscript(module: torch.jit.ScriptModule, path: Path) -> None:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        torch.jit.save(module, str(path))
+
+
+def export_torchscript(net: nn.Module, path: Path) -> None:
+    save_torchscript(trace(net, next(net.parameters()).device), path)
+
+
+def export_onnx(net: nn.Module, path: Path) -> None:
+    sample = torch.zeros(EXPORT_SHAPE, device=next(net.parameters()).device)
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # Exporteur TorchScript : axes dynamiques via dynamic_axes
+        kwargs["dynamo"] = False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        torch.onnx.export(
+            net, (sample,), str(path),
+            input_names=["input"],
+            output_names=["loc", "conf"],
+            dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"},
+                          "loc": {0: "batch", 1: "priors"},
+                          "conf": {0: "rows"}},
+            opset_version=17,
+            **kwargs,
+        )
+
+
+def quantize_int8(net: nn.Module, calibration: Iterable[torch.Tensor]) -> nn.Module:
+    """
+    Quantification statique post-entraînement (FX) : conv + bn + relu fusionnées, poids int8 par canal,
+    activations uint8 avec des échelles observées sur les batchs de calibration (images réelles de préférence :
+    le bruit donne des plages d'activation sans rapport avec celles des cartes).
+
+    Pas de quantification dynamique : dans PyTorch elle ne concerne que Linear / LSTM, or FaceBoxes
+    n'est fait que de convolutions.
+
+    Les têtes loc / conf et la suite (concaténation, softmax) restent en fp32 : les sorties des 3 échelles
+    ont des plages très différentes, un cat quantifié les forcerait sur une même échelle.
+    """
+    import torch.nn.functional as F
+    from torch.ao.quantization import QConfigMapping, get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = torch.backends.quantized.engine
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        qconfig = get_default_qconfig_mapping(engine).global_qconfig
+        # Pas de qconfig global : seul le tronc (et ses max_pool) est quantifié
+        qconfig_mapping = QConfigMapping().set_object_type(F.max_pool2d, qconfig)
+        for name, _ in net.named_children():
+            if name not in ("loc", "conf", "softmax"):
+                qconfig_mapping.set_module_name(name, qconfig)
+        prepared = prepare_fx(copy.deepcopy(net).cpu().eval(), qconfig_mapping, (torch.zeros(EXPORT_SHAPE),))
+        with torch.no_grad():
+            for batch in calibration:
+                prepared(batch)
+        return convert_fx(prepared)
+
+
+def export_int8(net: nn.Module, calibration: Iterable[torch.Tensor], path: Path) -> None:
+    # Module quantifié : paramètres empaquetés, sans nn.Parameter pour en déduire le device
+    save_torchscript(trace(quantize_int8(net, calibration), torch.device("cpu")), path)
+
+
+class EagerBackend:
+    def __init__(self, net: nn.Module, device: torch.device, channels_last: bool = False):
+        self.net = net
+        self.device = device
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+
+    def __call__(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        with torch.no_grad():
+            return self.net(batch.to(self.device).contiguous(memory_format=self.memory_format))
+
+
+class TorchScriptBackend(EagerBackend):
+    def __init__(
+        self,
+        net: nn.Module,
+        device: torch.device,
+        path: Path,
+        optimizations: Sequence[str] = ()
+    ):
+        with warnings.catch_warnings():
+            # Dépréciations de torch.jit (torch >= 2.9) : l'API reste fonctionnelle
+            warnings.simplefilter("ignore", FutureWarning)
+            warnings.simplefilter("ignore", torch.jit.TracerWarning)
+            # Le fichier exporté est le réseau d'origine : avec fold_bn, on trace le réseau replié
+            if path.is_file() and "fold_bn" not in optimizations:
+                module = torch.jit.load(str(path), map_location=device)
+                if "channels_last" in optimizations:
+                    module = module.to(memory_format=torch.channels_last)
+            else:
+                if not path.is_file():
+                    print(f"[INFO] {path} not found, tracing FaceBoxes at load time")
+                module = trace(net, device)
+            module = torch.jit.freeze(module.eval())
+        super().__init__(module, device, channels_last="channels_last" in optimizations)
+
+
+class CompileBackend(EagerBackend):
+    def __init__(self, net: nn.Module, device: torch.device, channels_last: bool = False):
+        super().__init__(torch.compile(net, dynamic=True), device, channels_last)
+
+
+class Int8Backend(EagerBackend):
+    def __init__(self, path: Path, device: torch.device):
+        if device.type != "cpu":
+            raise ValueError("int8 FaceBoxes runs on CPU only")
+        if not path.is_file():
+            raise FileNotFoundError(f"{path} not found (run export_ssd.py --formats int8)")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            module = torch.jit.freeze(torch.jit.load(str(path), map_location=device).eval())
+        super().__init__(module, device)
+
+
+class OnnxBackend:
+    """
+    Session ONNX Runtime CPU ouverte paresseusement, une par process : une session
+    (et son pool de threads) ne survit pas à un fork, les process workers ouvrent donc la leur.
+    """
+
+    def __init__(self, path: Path, device: torch.device):
+        import onnxruntime  # dépendance optionnelle
+
+        if not path.is_file():
+            raise FileNotFoundError(f"{path} not found (run export_ssd.py)")
+        self.ort = onnxruntime
+        self.path = path
+        self.device = device
+        self._session = None
+        self._pid: Optional[int] = None
+
+    def _get_session(self):
+        if self._session is None or self._pid != os.getpid():
+            options = self.ort.SessionOptions()
+            # Même budget de threads que torch (cf. --worker-threads)
+            options.intra_op_num_threads = torch.get_num_threads()
+            self._session = self.ort.InferenceSession(str(self.path), options, providers=["CPUExecutionProvider"])
+            self._pid = os.getpid()
+        return self._session
+
+    def __call__(self, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        loc, conf = self._get_session().run(None, {"input": batch.cpu().numpy()})
+        return torch.from_numpy(loc).to(self.device), torch.from_numpy(conf).to(self.device)
+
+
+def make_backend(
+    name: str,
+    net: nn.Module,
+    model_path: str,
+    device: torch.device,
+    optimizations: Sequence[str] = ()
+) -> Any:
+    """
+    net : réseau fp32 d'origine. optimizations (cf. OPTIMIZATIONS) : appliquées pour eager /
+    torchscript / compile, sans effet pour onnx et int8.
+    """
+    channels_last = "channels_last" in optimizations
+    if name == "eager":
+        return EagerBackend(optimize_net(net, optimizations), device, channels_last)
+    if name == "torchscript":
+        return TorchScriptBackend(optimize_net(net, optimizations), device, torchscript_path(model_path),
+                                  optimizations)
+    if name == "compile":
+        return CompileBackend(optimize_net(net, optimizations), device, channels_last)
+    if name == "onnx":
+        return OnnxBackend(onnx_path(model_path), device)
+    if name == "int8":
+        return Int8Backend(int8_path(model_path), device)
+    raise ValueError(f"Unknown FaceBoxes backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+def max_output_diff(
+    reference: Any,
+    candidate: Any,
+    shapes: Sequence[Tuple[int, int, int, int]],
+    seed: int = 0
+) -> Tuple[float, float]:
+    """
+    Écart max (loc, conf) entre deux backends sur des entrées aléatoires des tailles données
+    (valeurs dans la plage d'une image centrée sur la moyenne du modèle).
+    """
+    gen = torch.Generator().manual_seed(seed)
+    loc_diff = conf_diff = 0.0
+    for shape in shapes:
+        batch = torch.rand(shape, generator=gen) * 255 - 128
+        ref_loc, ref_conf = reference(batch)
+        loc, conf = candidate(batch)
+        loc_diff = max(loc_diff, float((loc.cpu() - ref_loc.cpu()).abs().max()))
+        conf_diff = max(conf_diff, float((conf.cpu() - ref_conf.cpu()).abs().max()))
+    return loc_diff, conf_diff
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+export_ssd.py
+Exporte le modèle SSD (FaceBoxes, models/ssd_anime_face_detect.pth) pour les backends optimisés
+de thumb_server (--ssd-backend), vérifie qu'ils donnent les mêmes résultats que le modèle eager,
+et mesure leur vitesse pour choisir le plus rapide sur la machine.
+
+  - torchscript -> models/ssd_anime_face_detect.ts
+  - onnx        -> models/ssd_anime_face_detect.onnx (nécessite `pip install onnx onnxruntime`)
+  - int8        -> models/ssd_anime_face_detect.int8.ts (quantification statique, calibrée sur
+                   --calib-images, à défaut --images ; sur du bruit en dernier recours)
+
+Chaque backend fp32 (eager / torchscript / compile) est mesuré tel quel puis avec les optimisations
+--optimize cumulées (eager, eager+fold_bn, eager+fold_bn+channels_last...).
+
+Contrôles de parité, pour chaque variante :
+  - sorties brutes (loc / conf) sur des entrées aléatoires de plusieurs tailles et tailles de batch
+    (axes dynamiques), écart max <= --atol (sauf int8, écart seulement affiché) ;
+  - avec --images : meilleure bbox de detect_best_faces_scored() identique à celle du modèle eager
+    (int8 : IoU >= --int8-iou).
+Code de sortie 1 si une variante échoue un contrôle.
+
+Usage:
+  python export_ssd.py [--formats torchscript onnx int8] [--images ../../public/img/personnages_cache]
+                       [--backends eager torchscript onnx int8 compile] [--optimize fold_bn channels_last]
+                       [--repeat 10]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import cv2
+import torch
+
+from detectors.anime_face_ssd import SSDAnimeFaceDetector
+from detectors.faceboxes_backends import (
+    BACKENDS, OPTIMIZATIONS, PARITY_ATOL, export_int8, export_onnx, export_torchscript, int8_path,
+    max_output_diff, onnx_path, torchscript_path
+)
+
+MODEL_PATH = Path(__file__).resolve().parent / "models" / "ssd_anime_face_detect.pth"
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+# (B, 3, H, W) : tailles et batchs différents de la taille d'export, dont un format carte 536x1000
+PARITY_SHAPES = [(1, 3, 320, 256), (2, 3, 640, 480), (1, 3, 1024, 544), (3, 3, 224, 352)]
+# Entrée mesurée : une carte du catalogue (536x1000, letterboxée à 544x1024)
+BENCH_SHAPE = (1, 3, 1024, 544)
+
+
+def load_images(entries):
+    paths = []
+    for entry in entries:
+        p = Path(entry)
+        if p.is_dir():
+            paths += sorted(f for f in p.iterdir() if f.suffix.lower() in IMAGE_EXTS)
+        elif p.is_file():
+            paths.append(p)
+    imgs = [cv2.imread(str(p), cv2.IMREAD_COLOR) for p in paths]
+    return [img for img in imgs if img is not None]
+
+
+def calibration_batches(detector: SSDAnimeFaceDetector, imgs, count: int):
+    """Batchs (1, 3, H, W) prétraités comme en production (centrage + letterbox) pour calibrer l'int8."""
+    batches = []
+    for img in imgs[:count]:
+        h, w = detector.letterbox_shape(*img.shape[:2])
+        batch = torch.zeros((1, 3, h, w))
+        batch[0, :, :img.shape[0], :img.shape[1]] = torch.from_numpy(detector._preprocess(img))
+        batches.append(batch)
+    if not batches:
+        print("[WARN] No calibration images, calibrating int8 on noise (use --calib-images)")
+        gen = torch.Generator().manual_seed(0)
+        batches = [torch.rand(shape, generator=gen) * 255 - 128 for shape in PARITY_SHAPES]
+    return batches
+
+
+def iou(a, b) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def boxes_agree(ref_boxes, boxes, min_iou: float) -> int:
+    """Nombre d'images où les deux modèles trouvent la même bbox (IoU >= min_iou) ou aucune."""
+    return sum((a is None and b is None) or (a is not None and b is not None and iou(a[0], b[0]) >= min_iou)
+               for a, b in zip(ref_boxes, boxes))
+
+
+def variants(backends, optimize):
+    """(backend, optimisations) à contrôler : chaque backend fp32 seul puis avec les optimisations cumulées."""
+    out = []
+    for name in backends:
+        out.append((name, ()))
+        if name not in ("onnx", "int8"):
+            out += [(name, tuple(optimize[:i])) for i in range(1, len(optimize) + 1)]
+    return out
+
+
+def time_backend(backend, repeat: int) -> float:
+    batch = torch.rand(BENCH_SHAPE) * 255 - 128
+    backend(batch)  # chauffe (compilation / allocation)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        backend(batch)
+    return (time.perf_counter() - t0) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export + contrôle de parité des backends FaceBoxes.")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="Poids FaceBoxes (.pth).")
+    parser.add_argument("--formats", nargs="*", choices=["torchscript", "onnx", "int8"],
+                        default=["torchscript", "onnx"], help="Formats à exporter (à côté du .pth).")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["eager", "torchscript", "onnx"],
+                        help="Backends à contrôler et mesurer (compile : très long à la première taille).")
+    parser.add_argument("--optimize", nargs="*", choices=OPTIMIZATIONS, default=list(OPTIMIZATIONS),
+                        help="Optimisations fp32 mesurées en plus, cumulées dans cet ordre.")
+    parser.add_argument("--images", nargs="+", default=None,
+                        help="Images (ou dossiers) pour comparer les bbox finales avec le modèle eager.")
+    parser.add_argument("--calib-images", nargs="+", default=None,
+                        help="Images (ou dossiers) de calibration de l'int8 (défaut : --images).")
+    parser.add_argument("--calib-count", type=int, default=32, help="Nombre max d'images de calibration.")
+    parser.add_argument("--atol", type=float, default=PARITY_ATOL, help="Écart max toléré sur loc / conf.")
+    parser.add_argument("--int8-iou", type=float, default=0.9,
+                        help="IoU min entre la bbox int8 et la bbox eager pour les compter d'accord.")
+    parser.add_argument("--repeat", type=int, default=10, help="Forwards mesurés par backend.")
+    args = parser.parse_args()
+
+    # Export sur CPU : le fichier est chargé ensuite sur le device voulu
+    eager = SSDAnimeFaceDetector(str(args.model), device="cpu")
+    if "torchscript" in args.formats:
+        export_torchscript(eager.net, torchscript_path(args.model))
+        print(f"[INFO] Wrote {torchscript_path(args.model)}")
+    if "onnx" in args.formats:
+        try:
+            export_onnx(eager.net, onnx_path(args.model))
+            print(f"[INFO] Wrote {onnx_path(args.model)}")
+        except Exception as e:
+            print(f"[ERROR] ONNX export failed: {e} (pip install onnx)")
+
+    imgs = load_images(args.images) if args.images else []
+    if "int8" in args.formats:
+        calib = load_images(args.calib_images) if args.calib_images else imgs
+        try:
+            export_int8(eager.net, calibration_batches(eager, calib, args.calib_count), int8_path(args.model))
+            print(f"[INFO] Wrote {int8_path(args.model)} ({min(len(calib), args.calib_count)} calibration images)")
+        except Exception as e:
+            print(f"[ERROR] int8 export failed: {e}")
+
+    ref_boxes = eager.detect_best_faces_scored(imgs) if imgs else []
+
+    print(f"{'variante':>34} {'max Δloc':>10} {'max Δconf':>10} {'bbox ok':>9} {'ms/forward':>11}")
+    failed = False
+    for name, optimize in variants(args.backends, args.optimize):
+        label = "+".join((name,) + optimize)
+        detector = SSDAnimeFaceDetector(str(args.model), device="cpu", backend=name, optimize=optimize)
+        if detector.backend_name != name or detector.optimize != optimize:
+            print(f"{label:>34} {'unavailable':>10}")
+            failed = True
+            continue
+
+        loc_diff, conf_diff = max_output_diff(eager.backend, detector.backend, PARITY_SHAPES)
+        # int8 : écart sur les sorties brutes attendu, seul l'accord des bbox compte
+        ok = name == "int8" or (loc_diff <= args.atol and conf_diff <= args.atol)
+
+        agree = "-"
+        if name == "int8" and not imgs:
+            print("[WARN] int8 bbox agreement not checked (pass --images)")
+        if imgs:
+            boxes = detector.detect_best_faces_scored(imgs)
+            same = boxes_agree(ref_boxes, boxes, args.int8_iou if name == "int8" else 1.0)
+            agree = f"{same}/{len(imgs)}"
+            ok = ok and same == len(imgs)
+
+        ms = time_backend(detector.backend, args.repeat)
+        print(f"{label:>34} {loc_diff:>10.2e} {conf_diff:>10.2e} {agree:>9} {ms:>11.1f}"
+              + ("" if ok else "  <- parity FAILED"))
+        failed = failed or not ok
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+face_cache.py
+Cache persistant (SQLite) des résultats de détection de visage.
+
+Clé : hash du contenu de l'image source (et non son chemin / mtime) + configuration de détection.
+Une nouvelle taille de thumbnail, un re-crop ou un fichier simplement "touché" réutilisent donc
+le résultat sans relancer la cascade SSD -> YOLO. Les images sans visage sont aussi mises en cache
+(box = None) pour ne pas relancer la cascade à chaque fois avant le fallback, sauf si des étapes
+ont été sautées (--cascade-skip-below) : ce n'est alors pas le verdict de la cascade complète.
+
+Les bbox sont stockées avec la taille de l'image sur laquelle elles ont été calculées
+(CachedFace.scaled_to les remet à l'échelle de l'image décodée, éventuellement réduite).
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+from detectors import Box, FaceDetection
+
+
+def hash_bytes(data: bytes) -> str:
+    """Hash du contenu d'une image source (clé du cache)."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class CachedFace(NamedTuple):
+    """
+    Entrée du cache : detection est None si la cascade n'a trouvé aucun visage.
+    img_w / img_h : taille de l'image sur laquelle la détection a été faite.
+    """
+    detection: Optional[FaceDetection]
+    img_w: int
+    img_h: int
+
+    def scaled_to(self, img_w: int, img_h: int) -> Optional[FaceDetection]:
+        """Détection remise à l'échelle d'une image img_w x img_h (même contenu)."""
+        if self.detection is None:
+            return None
+        box = _rescale_box(self.detection.box, img_w / self.img_w, img_h / self.img_h, img_w, img_h)
+        if box is None:
+            return None
+        return self.detection._replace(box=box)
+
+
+class FaceBoxCache:
+    """
+    Table face_boxes (content_hash, config) -> bbox / score / détecteur.
+
+    La connexion est ouverte paresseusement et rouverte si le process change
+    (une connexion SQLite ne doit pas traverser un fork).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def after_fork(self) -> None:
+        """Dans un process worker : nouveau verrou (celui copié au fork peut être pris)."""
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS face_boxes (
+                    content_hash TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    img_w INTEGER NOT NULL,
+                    img_h INTEGER NOT NULL,
+                    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER,
+                    score REAL,
+                    detector TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (content_hash, config)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, content_hash: str, config: str) -> Optional[CachedFace]:
+        """
+        Retourne l'entrée du cache, ou None si absente.
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT img_w, img_h, x1, y1, x2, y2, score, detector FROM face_boxes "
+                "WHERE content_hash = ? AND config = ?",
+                (content_hash, config),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        img_w, img_h, x1, y1, x2, y2, score, detector = row
+        if x1 is None:
+            return CachedFace(None, img_w, img_h)
+        return CachedFace(FaceDetection((x1, y1, x2, y2), score, detector), img_w, img_h)
+
+    def put(
+        self,
+        content_hash: str,
+        config: str,
+        img_w: int,
+        img_h: int,
+        detection: Optional[FaceDetection]
+    ) -> None:
+        box = detection.box if detection is not None else (None, None, None, None)
+        score = detection.score if detection is not None else None
+        detector = detection.detector if detection is not None else None
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO face_boxes "
+                "(content_hash, config, img_w, img_h, x1, y1, x2, y2, score, detector, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, config, img_w, img_h, *box, score, detector, time.time()),
+            )
+            conn.commit()
+
+
+def _rescale_box(box: Box, sx: float, sy: float, w: int, h: int) -> Optional[Tuple[int, int, int, int]]:
+    if sx == 1.0 and sy == 1.0:
+        return box
+    x1, y1, x2, y2 = box
+    x1 = int(max(0, x1 * sx))
+    y1 = int(max(0, y1 * sy))
+    x2 = int(min(w, x2 * sx))
+    y2 = int(min(h, y2 * sy))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
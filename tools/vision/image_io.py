@@ -0,0 +1,182 @@
+"""
+image_io.py
+Lecture des dimensions d'une image depuis son en-tête (sans la décoder),
+pour choisir le facteur de décodage réduit avant cv2.imdecode.
+
+Formats gérés : JPEG, PNG, WebP, GIF, BMP. Retourne None pour le reste.
+
+Décodage réduit : cv2.IMREAD_REDUCED_COLOR_{2,4,8}. Pour le JPEG, libjpeg décode directement
+à l'échelle 1/2, 1/4 ou 1/8 (mémoire et temps divisés) ; pour les autres formats OpenCV décode
+en pleine résolution puis réduit (pas de gain mémoire).
+
+Écriture des thumbnails : encodage en mémoire (réglages par format, cf. encoder_params) puis
+écriture atomique (fichier temporaire + rename, cf. write_atomic).
+"""
+
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Marqueurs JPEG "Start Of Frame" (hors DHT 0xC4, JPG 0xC8, DAC 0xCC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_image(data: bytes, factor: int = 1) -> Optional[np.ndarray]:
+    """
+    Décode une image BGR, réduite d'un facteur 1, 2, 4 ou 8. None si illisible.
+    """
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCED_DECODE_FLAGS[factor])
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:3] == b"\xff\xd8\xff"
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Dimensions (largeur, hauteur) lues dans l'en-tête, ou None si format inconnu / en-tête invalide.
+    Attention : l'orientation EXIF n'est pas appliquée (largeur et hauteur peuvent être inversées
+    une fois l'image décodée par OpenCV).
+    """
+    try:
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            w, h = struct.unpack(">II", data[16:24])
+            return w, h
+
+        if is_jpeg(data):
+            return _jpeg_size(data)
+
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _webp_size(data)
+
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            w, h = struct.unpack("<HH", data[6:10])
+            return w, h
+
+        if data[:2] == b"BM":
+            w, h = struct.unpack("<ii", data[18:26])
+            return abs(w), abs(h)
+    except struct.error:
+        return None
+
+    return None
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # octets de remplissage
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # marqueurs sans longueur
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):  # fin d'image / début des données compressées
+            return None
+
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in _JPEG_SOF:
+            h, w = struct.unpack(">HH", data[i + 5:i + 9])
+            return w, h
+        i += 2 + length
+    return None
+
+
+def _webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8X":
+        w = int.from_bytes(data[24:27], "little") + 1
+        h = int.from_bytes(data[27:30], "little") + 1
+        return w, h
+    if chunk == b"VP8L":
+        b = data[21:25]
+        w = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        h = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return w, h
+    if chunk == b"VP8 ":
+        w, h = struct.unpack("<HH", data[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    return None
+
+
+def encoder_params(ext: str, quality: Optional[int] = None, progressive: bool = False) -> List[int]:
+    """
+    Paramètres cv2.imencode pour une extension de sortie :
+      - JPEG : qualité, tables de Huffman optimisées, progressif (affichage par passes, souvent plus petit) ;
+      - WebP : qualité (sans paramètre, OpenCV encode en WebP sans perte : fichiers proches du PNG) ;
+      - AVIF : qualité (OpenCV >= 4.9 compilé avec libavif).
+    quality None : réglage par défaut d'OpenCV.
+    """
+    ext = ext.lower()
+    params: List[int] = []
+    if ext in (".jpg", ".jpeg"):
+        params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        if quality is not None:
+            params += [cv2.IMWRITE_JPEG_QUALITY, quality]
+        if progressive:
+            params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+    elif ext == ".webp" and quality is not None:
+        params += [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif ext == ".avif" and quality is not None and hasattr(cv2, "IMWRITE_AVIF_QUALITY"):
+        params += [cv2.IMWRITE_AVIF_QUALITY, quality]
+    return params
+
+
+def can_encode(ext: str) -> bool:
+    """L'OpenCV local sait-il écrire ce format (AVIF : selon la compilation) ?"""
+    try:
+        return cv2.haveImageWriter("x" + ext)
+    except cv2.error:
+        return False
+
+
+def encode_image(img: np.ndarray, ext: str, params: Sequence[int] = ()) -> bytes:
+    """
+    Encode une image BGR au format de ext. Lève ValueError si OpenCV n'a pas d'encodeur
+    pour ce format ou si l'encodage échoue.
+    """
+    try:
+        ok, buf = cv2.imencode(ext, img, list(params))
+    except cv2.error as e:
+        raise ValueError(f"No {ext} encoder in this OpenCV build") from e
+    if not ok:
+        raise ValueError(f"Failed to encode {ext} image")
+    return buf.tobytes()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Écrit data dans path via un fichier temporaire du même dossier puis os.replace : un lecteur
+    (thumb_status.php, serveur web) voit l'ancien fichier ou le nouveau complet, jamais un fichier partiel.
+    Le temporaire est créé avec les droits habituels (umask), pas ceux restreints de tempfile.
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,112 @@
+"""
+job_queue.py
+File de jobs en mémoire à deux voies pour thumb_server : "interactive" (un visiteur attend le thumbnail)
+et "background" (pré-génération, rattrapage du catalogue...).
+
+Interface de queue.Queue utilisée par le worker et le pool (put / get / get_nowait / qsize, queue.Empty) :
+  - get() sert toujours la voie interactive d'abord ;
+  - anti-famine : après background_every jobs interactifs servis d'affilée alors que des jobs
+    background attendaient, un job background passe ;
+  - promote(output_id) : un job background encore en file passe en voie interactive
+    (même sortie ré-enfilée par une requête interactive).
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)
+
+
+class _QueuedJob:
+    """Entrée de la file ; active = False si le job a été déplacé vers une autre voie (suppression paresseuse)."""
+    __slots__ = ("job", "lane", "active")
+
+    def __init__(self, job: Dict[str, Any], lane: str):
+        self.job = job
+        self.lane = lane
+        self.active = True
+
+
+class JobQueue:
+    def __init__(self, background_every: int = 8):
+        self.background_every = background_every
+        self._cond = threading.Condition()
+        self._lanes: Dict[str, Deque[_QueuedJob]] = {lane: deque() for lane in LANES}
+        self._counts = {lane: 0 for lane in LANES}
+        self._by_output: Dict[str, _QueuedJob] = {}
+        self._streak = 0
+
+    def put(self, job: Dict[str, Any]) -> None:
+        lane = job.get("priority", INTERACTIVE)
+        with self._cond:
+            self._append(_QueuedJob(job, lane))
+            self._cond.notify()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        with self._cond:
+            if not block:
+                timeout = 0
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.qsize() == 0:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+            return self._pop()
+
+    def get_nowait(self) -> Dict[str, Any]:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return self._counts[INTERACTIVE] + self._counts[BACKGROUND]
+
+    def lane_sizes(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    def promote(self, output_id: str) -> bool:
+        """
+        Passe en voie interactive le job background (encore en file) qui contient output_id.
+        Retourne False si la sortie n'est pas en file, ou déjà en voie interactive.
+        """
+        with self._cond:
+            entry = self._by_output.get(output_id)
+            if entry is None or entry.lane == INTERACTIVE:
+                return False
+            entry.active = False
+            self._counts[entry.lane] -= 1
+            self._append(_QueuedJob({**entry.job, "priority": INTERACTIVE}, INTERACTIVE))
+            return True
+
+    def _append(self, entry: _QueuedJob) -> None:
+        self._lanes[entry.lane].append(entry)
+        self._counts[entry.lane] += 1
+        for output in entry.job["outputs"]:
+            self._by_output[output["job_id"]] = entry
+
+    def _pop(self) -> Dict[str, Any]:
+        waiting_bg = self._counts[BACKGROUND] > 0
+        if waiting_bg and (self._counts[INTERACTIVE] == 0 or self._streak >= self.background_every):
+            lane = BACKGROUND
+            self._streak = 0
+        else:
+            lane = INTERACTIVE
+            self._streak = self._streak + 1 if waiting_bg else 0
+
+        lane_queue = self._lanes[lane]
+        entry = lane_queue.popleft()
+        while not entry.active:
+            entry = lane_queue.popleft()
+
+        self._counts[lane] -= 1
+        for output in entry.job["outputs"]:
+            if self._by_output.get(output["job_id"]) is entry:
+                del self._by_output[output["job_id"]]
+        return entry.job
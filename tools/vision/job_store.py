@@ -0,0 +1,162 @@
+"""
+job_store.py
+File de jobs persistante (SQLite en mode WAL) pour thumb_server.
+
+Une ligne par sortie de job (output_id = clé primaire -> dédoublonnage en base) :
+  - add() / add_many() : à l'enqueue, avant la réponse HTTP (une transaction par requête) ;
+  - set_priority() : job background ré-enfilé en interactif (priorité conservée au replay) ;
+  - lease()    : au début du traitement (bail = pid + date, compteur de tentatives) ;
+  - complete() : à la fin (thumbnail écrit ou échec définitif) -> la ligne est supprimée ;
+  - replay()   : au démarrage, tout ce qui reste (en attente, ou en cours lors d'un crash)
+                 est regroupé en jobs et renvoyé pour être ré-enfilé.
+
+Une sortie dont le bail a déjà été pris MAX_ATTEMPTS fois sans jamais se terminer
+(image qui fait planter le process, par ex.) est abandonnée au replay.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_ATTEMPTS = 3
+
+
+class JobStore:
+    """
+    Table job_outputs (output_id) -> job d'origine + sortie + état du bail.
+
+    Comme FaceBoxCache, la connexion est ouverte paresseusement et rouverte si le process change.
+    """
+
+    def __init__(self, path: Path, synchronous: str = "NORMAL"):
+        """
+        synchronous : PRAGMA SQLite. NORMAL (défaut) survit à un crash du process ;
+        FULL survit aussi à une coupure de courant, au prix d'un fsync par enqueue.
+        """
+        self.path = Path(path)
+        self.synchronous = synchronous
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_outputs (
+                    output_id TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    job_id TEXT NOT NULL,
+                    src TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    extra TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    lease_pid INTEGER,
+                    leased_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS job_outputs_seq ON job_outputs (seq)")
+            conn.commit()
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM job_outputs").fetchone()[0]
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def add(self, job: Dict[str, Any]) -> List[str]:
+        """
+        Enregistre les sorties d'un job normalisé (cf. thumb_server.parse_job).
+        Retourne les ids de sorties réellement ajoutées (les autres existaient déjà).
+        """
+        return self.add_many([job])
+
+    def add_many(self, jobs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Comme add(), pour plusieurs jobs en une seule transaction (/enqueue_batch).
+        """
+        now = time.time()
+        added = []
+        with self._lock:
+            conn = self._connection()
+            for job in jobs:
+                extra = json.dumps({k: v for k, v in job.items() if k not in ("job_id", "src", "outputs")})
+                self._seq += 1
+                for output in job["outputs"]:
+                    cur = conn.execute(
+                        "INSERT OR IGNORE INTO job_outputs (output_id, seq, job_id, src, output, extra, enqueued_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (output["job_id"], self._seq, job["job_id"], job["src"], json.dumps(output), extra, now),
+                    )
+                    if cur.rowcount:
+                        added.append(output["job_id"])
+            conn.commit()
+        return added
+
+    def set_priority(self, output_id: str, priority: str) -> None:
+        """
+        Change la priorité du job (toutes ses sorties, cf. JobQueue.promote) qui contient output_id.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT seq, extra FROM job_outputs WHERE output_id = ?", (output_id,)).fetchone()
+            if row is None:
+                return
+            seq, extra = row
+            conn.execute("UPDATE job_outputs SET extra = ? WHERE seq = ?",
+                         (json.dumps({**json.loads(extra), "priority": priority}), seq))
+            conn.commit()
+
+    def lease(self, output_ids: List[str], pid: Optional[int] = None) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "UPDATE job_outputs SET lease_pid = ?, leased_at = ?, attempts = attempts + 1 WHERE output_id = ?",
+                [(pid or os.getpid(), time.time(), oid) for oid in output_ids],
+            )
+            conn.commit()
+
+    def complete(self, output_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM job_outputs WHERE output_id = ?", (output_id,))
+            conn.commit()
+
+    def replay(self) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Au démarrage : retourne (jobs à ré-enfiler dans l'ordre d'arrivée, sorties abandonnées).
+        Les bails en cours sont ceux d'un process mort : ils sont relâchés.
+        """
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT output_id, seq, job_id, src, output, extra, attempts FROM job_outputs ORDER BY seq, rowid"
+            ).fetchall()
+
+            dropped = [oid for oid, *_, attempts in rows if attempts >= MAX_ATTEMPTS]
+            conn.executemany("DELETE FROM job_outputs WHERE output_id = ?", [(oid,) for oid in dropped])
+            conn.execute("UPDATE job_outputs SET lease_pid = NULL, leased_at = NULL")
+            conn.commit()
+
+        jobs: Dict[int, Dict[str, Any]] = {}
+        for oid, seq, job_id, src, output, extra, attempts in rows:
+            if attempts >= MAX_ATTEMPTS:
+                continue
+            job = jobs.get(seq)
+            if job is None:
+                job = jobs[seq] = {**json.loads(extra), "job_id": job_id, "src": src, "outputs": []}
+            job["outputs"].append(json.loads(output))
+
+        return list(jobs.values()), dropped
+
+    def count(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            return conn.execute("SELECT COUNT(*) FROM job_outputs").fetchone()[0]
@@ -0,0 +1,120 @@
+"""
+metrics.py
+Métriques de thumb_server au format texte Prometheus (sans dépendance à prometheus_client).
+
+  - histogrammes de durée par étape (file d'attente, décodage, SSD, YOLO, crop/resize, écriture) ;
+  - compteurs étiquetés (détecteur retenu, cache des détections, sorties terminées...).
+
+Une observation = une recherche de bucket + quelques additions sous verrou : négligeable devant
+un décodage ou un forward. En mode multi-process, chaque worker accumule dans son propre Metrics
+et envoie take() après chaque lot ; le process HTTP l'ajoute avec merge().
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Bornes (secondes) des histogrammes : de la milliseconde (crop) à la minute (file d'attente chargée)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_value(v: float) -> str:
+    """
+    Valeur d'un échantillon : entier exact si possible (":g" arrondit à 6 chiffres significatifs, un
+    compteur à 1234567 deviendrait 1.23457e+06 et semblerait figé), sinon repr du flottant.
+    """
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+class Metrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # étape -> [compte par bucket (+Inf en dernier)..., somme]
+        self._hist: Dict[str, List[float]] = {}
+        # (nom, valeur d'étiquette) -> compteur
+        self._counters: Dict[Tuple[str, str], float] = {}
+
+    def observe(self, stage: str, seconds: float, n: int = 1) -> None:
+        """n observations de la même durée (ex. forward batché réparti sur ses images)."""
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            h = self._hist.get(stage)
+            if h is None:
+                h = self._hist[stage] = [0.0] * (len(self.buckets) + 2)
+            h[i] += n
+            h[-1] += seconds * n
+
+    def inc(self, name: str, label: str, n: float = 1) -> None:
+        with self._lock:
+            key = (name, label)
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def take(self) -> Optional[Dict[str, Any]]:
+        """Retourne puis remet à zéro ce qui a été accumulé (None si rien)."""
+        with self._lock:
+            if not self._hist and not self._counters:
+                return None
+            snapshot = {"hist": self._hist, "counters": list(self._counters.items())}
+            self._hist, self._counters = {}, {}
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        with self._lock:
+            for stage, values in snapshot["hist"].items():
+                h = self._hist.setdefault(stage, [0.0] * (len(self.buckets) + 2))
+                for i, v in enumerate(values):
+                    h[i] += v
+            for key, v in snapshot["counters"]:
+                key = tuple(key)
+                self._counters[key] = self._counters.get(key, 0) + v
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hist, self._counters = {}, {}
+
+    def render(
+        self,
+        histogram: Tuple[str, str, str],
+        counters: Dict[str, Tuple[str, str]],
+        gauges: Iterable[Tuple[str, str, Dict[str, str], float]]
+    ) -> str:
+        """
+        Texte d'exposition Prometheus.
+        histogram : (nom, étiquette, aide) ; counters : nom -> (étiquette, aide) ;
+        gauges : (nom, aide, étiquettes, valeur), lus au moment de la requête.
+        """
+        with self._lock:
+            hist = {stage: list(values) for stage, values in self._hist.items()}
+            counter_values = dict(self._counters)
+
+        lines = []
+        name, label, help_text = histogram
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for stage in sorted(hist):
+            values = hist[stage]
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{label}="{stage}",le="{le}"}} {format_value(cumulative)}')
+            lines.append(f'{name}_sum{{{label}="{stage}"}} {values[-1]:.6f}')
+            lines.append(f'{name}_count{{{label}="{stage}"}} {format_value(cumulative)}')
+
+        for name, (label, help_text) in counters.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (counter, value), v in sorted(counter_values.items()):
+                if counter == name:
+                    lines.append(f'{name}{{{label}="{value}"}} {format_value(v)}')
+
+        declared = set()
+        for name, help_text, labels, value in gauges:
+            if name not in declared:
+                declared.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            sample = format_value(value)
+            lines.append(f"{name}{{{label_text}}} {sample}" if label_text else f"{name} {sample}")
+
+        return "\n".join(lines) + "\n"
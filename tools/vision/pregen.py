@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""
+pregen.py
+Pré-génération hors ligne des thumbnails (remplit public/img/thumbs_cache avant le trafic).
+
+Sources :
+  - le catalogue data/genshin_characters.json (défaut) : chaque urlImg est cherchée là où
+    ImageService::downloadImage() la range (public/img/<group>_cache/md5(url).<ext>) ;
+    --download télécharge les images manquantes de la même façon ;
+  - ou --dir DIR : toutes les images d'un dossier (récursif).
+
+Les job ids et chemins sont ceux du PHP (ThumbnailManager::buildJobId) :
+md5(realpath(src) + "|" + mtime + "|" + LxH), thumbnail = thumbs_cache/<job_id><thumb_extension>.
+Une page visitée ensuite trouve donc directement le thumbnail sur disque.
+
+Traitement :
+  - par défaut dans ce process, avec le pipeline de thumb_server (lots, cache des détections,
+    --workers N process workers) ;
+  - avec --server URL, les jobs sont envoyés (priorité "background", /enqueue_batch) à un thumb_server
+    en marche : les visiteurs restent servis en premier.
+
+Reprise : les thumbnails déjà présents sont ignorés, relancer la commande après une interruption
+suffit (le job id change si la source est modifiée).
+
+Usage:
+  python pregen.py [--sizes 480x600 240x300] [--workers 2] [--download]
+  python pregen.py --sizes 1440x1800 960x1200 480x600 --pyramid
+  python pregen.py --dir ../../public/img/personnages_cache
+  python pregen.py --server http://127.0.0.1:5001
+"""
+
+import re
+import sys
+import time
+import json
+import hashlib
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[2]
+CATALOG_PATH = ROOT / "data" / "genshin_characters.json"
+IMG_DIR = ROOT / "public" / "img"
+THUMBS_DIR = IMG_DIR / "thumbs_cache"
+# Groupe utilisé par MainController pour les images des personnages
+DEFAULT_GROUP = "personnages"
+# Taille par défaut de ImageService::prepareThumbnailsForEntities()
+DEFAULT_SIZES = ["480x600"]
+# ThumbnailManager::DEFAULT_EXT
+DEFAULT_EXT = ".webp"
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+# Sous-ensemble de FileSystem::mimeToExt() (formats décodables par OpenCV)
+MIME_EXTS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/bmp": "bmp",
+    "image/tiff": "tif",
+}
+
+# Intervalle (s) entre deux lectures de l'avancement
+POLL_INTERVAL = 0.5
+
+
+# -------------------------------------------------
+# Sources et jobs
+# -------------------------------------------------
+
+def config_thumb_extension() -> str:
+    """thumb_extension de Config/prod.ini, sinon Config/dev.ini (même ordre que Config::getParameter())."""
+    for name in ("prod.ini", "dev.ini"):
+        path = ROOT / "Config" / name
+        if not path.is_file():
+            continue
+        m = re.search(r"^\s*thumb_extension\s*=\s*['\"]?([^'\";\s]+)", path.read_text(encoding="utf-8"), re.M)
+        return "." + m.group(1).lstrip(".") if m else DEFAULT_EXT
+    return DEFAULT_EXT
+
+
+def build_job_id(src: Path, width: int, height: int) -> str:
+    """Même calcul que ThumbnailManager::buildJobId() (realpath, mtime en secondes entières)."""
+    real = src.resolve()
+    mtime = int(real.stat().st_mtime)
+    return hashlib.md5(f"{real}|{mtime}|{width}x{height}".encode()).hexdigest()
+
+
+def cached_source(url: str, group: str) -> Optional[Path]:
+    """Image déjà téléchargée par ImageService::downloadImage() (<group>_cache/md5(url).*)."""
+    key = hashlib.md5(url.encode()).hexdigest()
+    return next(iter(sorted((IMG_DIR / f"{group}_cache").glob(key + ".*"))), None)
+
+
+def download_source(url: str, group: str) -> Optional[Path]:
+    """Télécharge url comme ImageService::downloadImage() (fichier temporaire puis rename)."""
+    store = IMG_DIR / f"{group}_cache"
+    store.mkdir(parents=True, exist_ok=True)
+    key = hashlib.md5(url.encode()).hexdigest()
+    tmp = store / f"tmp_{key}"
+    try:
+        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            ext = MIME_EXTS.get(resp.headers.get_content_type())
+            if ext is None:
+                print(f"[WARN] Unsupported content type for {url}: {resp.headers.get_content_type()}")
+                return None
+            tmp.write_bytes(resp.read())
+    except OSError as e:
+        print(f"[WARN] Download failed for {url}: {e}")
+        tmp.unlink(missing_ok=True)
+        return None
+    path = store / f"{key}.{ext}"
+    tmp.replace(path)
+    return path
+
+
+def catalog_sources(catalog: Path, group: str, download: bool) -> Tuple[List[Path], List[str]]:
+    """Sources locales des urlImg du catalogue -> (chemins, urls introuvables)."""
+    with catalog.open("r", encoding="utf-8") as f:
+        urls = [entry["urlImg"] for entry in json.load(f) if entry.get("urlImg")]
+
+    sources, missing = [], []
+    for url in urls:
+        path = cached_source(url, group)
+        if path is not None:
+            sources.append(path)
+        else:
+            missing.append(url)
+
+    if download and missing:
+        print(f"[INFO] Downloading {len(missing)} missing images into {IMG_DIR / (group + '_cache')}")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            downloaded = list(pool.map(lambda u: download_source(u, group), missing))
+        sources += [p for p in downloaded if p is not None]
+        missing = [u for u, p in zip(missing, downloaded) if p is None]
+
+    return sources, missing
+
+
+def directory_sources(folder: Path) -> List[Path]:
+    return sorted(p for p in folder.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_EXTS)
+
+
+def build_jobs(
+    sources: List[Path],
+    sizes: List[Tuple[int, int]],
+    ext: str,
+    pyramid: bool = False
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Un job multi-tailles par source (une lecture + une détection), sans les sorties déjà sur disque.
+    pyramid : tailles de même ratio réduites en cascade depuis la plus grande (cf. thumb_server.write_outputs).
+    Retourne (jobs, nombre de sorties ignorées).
+    """
+    jobs, skipped = [], 0
+    seen = set()
+    for src in sources:
+        real = src.resolve()
+        if real in seen:  # symlinks lisibles -> même fichier que <group>_cache
+            continue
+        seen.add(real)
+
+        outputs = []
+        for width, height in sizes:
+            oid = build_job_id(real, width, height)
+            dst = THUMBS_DIR / (oid + ext)
+            if dst.is_file():
+                skipped += 1
+                continue
+            outputs.append({"job_id": oid, "width": width, "height": height, "dst": str(dst)})
+        if outputs:
+            job = {"job_id": outputs[0]["job_id"], "src": str(real), "outputs": outputs, "priority": "background"}
+            if pyramid:
+                job["pyramid"] = True
+            jobs.append(job)
+    return jobs, skipped
+
+
+# -------------------------------------------------
+# Traitement : local ou via un thumb_server
+# -------------------------------------------------
+
+class LocalBackend:
+    """Pipeline de thumb_server dans ce process (worker thread, ou --workers N process workers)."""
+
+    def __init__(self, args: argparse.Namespace, total: int):
+        import thumb_server as ts
+        from face_cache import FaceBoxCache
+
+        self.ts = ts
+        if args.batch_max_jobs is not None:
+            ts.BATCH_MAX_JOBS = max(1, args.batch_max_jobs)
+        if args.detect_max_side is not None:
+            ts.DETECT_MAX_SIDE = max(0, args.detect_max_side)
+        # Toutes les sorties doivent rester dans l'index des états jusqu'à la fin
+        ts.STATUS_HISTORY = max(ts.STATUS_HISTORY, total)
+        if not args.no_face_cache:
+            ts._FACE_CACHE = FaceBoxCache(ts.FACE_CACHE_PATH)
+        ts.WORKERS = max(0, args.workers)
+        ts.WORKER_THREADS = args.worker_threads
+        ts.start_workers()
+
+    def submit(self, jobs: List[Dict[str, Any]]) -> Dict[str, str]:
+        self.ts.enqueue_jobs(jobs)
+        return {}
+
+    def statuses(self, output_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {oid: self.ts.output_status(oid) for oid in output_ids}
+
+
+class ServerBackend:
+    """thumb_server déjà lancé : /enqueue_batch (priorité background) puis /status."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        # Limites par défaut de thumb_server (ENQUEUE_BATCH_MAX, STATUS_MAX_IDS)
+        self.chunk = 1000
+
+    def _post(self, endpoint: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        req = urllib.request.Request(self.base_url + endpoint, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return json.loads(resp.read())
+
+    def submit(self, jobs: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Envoie les jobs ; retourne les sorties refusées (output id -> erreur)."""
+        rejected = {}
+        for i in range(0, len(jobs), self.chunk):
+            chunk = jobs[i:i + self.chunk]
+            results = self._post("/enqueue_batch", {"jobs": chunk})["jobs"]
+            for job, result in zip(chunk, results):
+                if not result.get("ok"):
+                    for output in job["outputs"]:
+                        rejected[output["job_id"]] = result.get("error", "Rejected")
+        return rejected
+
+    def statuses(self, output_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        statuses = {}
+        for i in range(0, len(output_ids), self.chunk):
+            statuses.update(self._post("/status", {"job_ids": output_ids[i:i + self.chunk]})["jobs"])
+        return statuses
+
+
+def run(backend, jobs: List[Dict[str, Any]], progress_every: float) -> Tuple[int, Dict[str, str]]:
+    """
+    Enfile les jobs et suit leur avancement jusqu'au bout.
+    Retourne (sorties générées, sorties en échec -> raison).
+    """
+    dst_by_output = {o["job_id"]: o["dst"] for job in jobs for o in job["outputs"]}
+    total = len(dst_by_output)
+    failed = backend.submit(jobs)
+    remaining = set(dst_by_output) - set(failed)
+    done = 0
+
+    t0 = last_print = time.perf_counter()
+    while remaining:
+        time.sleep(POLL_INTERVAL)
+        for oid, status in backend.statuses(sorted(remaining)).items():
+            state = status.get("status")
+            if state in ("queued", "processing"):
+                continue
+            remaining.discard(oid)
+            # unknown : oublié par l'index du serveur (ou serveur redémarré) -> le disque fait foi
+            if state == "done" or (state == "unknown" and Path(dst_by_output[oid]).is_file()):
+                done += 1
+            else:
+                failed[oid] = status.get("error") or "Unknown job"
+
+        now = time.perf_counter()
+        if now - last_print >= progress_every or not remaining:
+            last_print = now
+            finished = done + len(failed)
+            rate = finished / (now - t0)
+            eta = f"{len(remaining) / rate:.0f} s" if rate > 0 and remaining else "-"
+            print(f"[INFO] Progress {finished}/{total} ({finished / total:.0%}) "
+                  f"- {done} ok, {len(failed)} failed - {rate:.1f} thumbnails/s - ETA {eta}")
+    return done, failed
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    try:
+        width, height = (int(v) for v in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {value!r} (expected WIDTHxHEIGHT)")
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-génération hors ligne des thumbnails du catalogue.")
+    parser.add_argument("--catalog", type=Path, default=CATALOG_PATH, help="Catalogue JSON (champ urlImg).")
+    parser.add_argument("--dir", type=Path, help="Dossier d'images à traiter au lieu du catalogue.")
+    parser.add_argument("--group", default=DEFAULT_GROUP,
+                        help="Groupe des images téléchargées (public/img/<group>_cache).")
+    parser.add_argument("--download", action="store_true",
+                        help="Télécharge les images du catalogue absentes du cache local.")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[parse_size(s) for s in DEFAULT_SIZES],
+                        help="Tailles à générer (LxH).")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="srcset : tailles de même ratio réduites en cascade depuis la plus grande "
+                             "(ex. --sizes 1440x1800 960x1200 480x600 --pyramid).")
+    parser.add_argument("--ext", default=None,
+                        help="Extension des thumbnails (défaut : thumb_extension de Config/*.ini, sinon .webp).")
+    parser.add_argument("--server", default=None,
+                        help="URL d'un thumb_server en marche (jobs en priorité background) au lieu d'un "
+                             "traitement local.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Traitement local : process workers (0 = un worker thread).")
+    parser.add_argument("--worker-threads", type=int, default=0,
+                        help="Traitement local : threads torch / OpenCV par process worker.")
+    parser.add_argument("--batch-max-jobs", type=int, default=None,
+                        help="Traitement local : jobs par lot (défaut : celui de thumb_server).")
+    parser.add_argument("--detect-max-side", type=int, default=None,
+                        help="Traitement local : résolution de détection (défaut : celle de thumb_server).")
+    parser.add_argument("--no-face-cache", action="store_true",
+                        help="Traitement local : ne pas utiliser le cache des détections.")
+    parser.add_argument("--progress-every", type=float, default=5.0,
+                        help="Intervalle (s) entre deux lignes d'avancement.")
+    parser.add_argument("--dry-run", action="store_true", help="Liste le travail à faire sans rien générer.")
+    args = parser.parse_args()
+
+    ext = "." + (args.ext or config_thumb_extension()).lstrip(".")
+
+    missing: List[str] = []
+    if args.dir is not None:
+        sources = directory_sources(args.dir)
+    else:
+        sources, missing = catalog_sources(args.catalog, args.group, args.download)
+    for url in missing:
+        print(f"[WARN] Source not downloaded yet (use --download): {url}")
+
+    jobs, skipped = build_jobs(sources, args.sizes, ext, args.pyramid)
+    total = sum(len(job["outputs"]) for job in jobs)
+    print(f"[INFO] {len(sources)} sources, {len(args.sizes)} sizes: {total} thumbnails to generate, "
+          f"{skipped} already in {THUMBS_DIR}")
+    if args.dry_run or not jobs:
+        return
+
+    backend = ServerBackend(args.server) if args.server else LocalBackend(args, total)
+
+    t0 = time.perf_counter()
+    try:
+        done, failed = run(backend, jobs, args.progress_every)
+    except KeyboardInterrupt:
+        print("[INFO] Interrupted: run the same command again to resume (existing thumbnails are skipped)")
+        if args.server:
+            print("[INFO] Jobs already sent stay queued on the thumb_server")
+        sys.exit(130)
+    elapsed = time.perf_counter() - t0
+
+    for oid, error in sorted(failed.items()):
+        print(f"[WARN] Failed {oid}: {error}")
+    print(f"[INFO] Generated {done} thumbnails from {len(jobs)} sources in {elapsed:.1f} s "
+          f"({done / elapsed:.1f} thumbnails/s, {len(jobs) / elapsed:.1f} sources/s), "
+          f"{len(failed)} failed, {skipped} skipped")
+    if failed or missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
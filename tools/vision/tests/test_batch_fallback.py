@@ -0,0 +1,60 @@
+"""
+Détection batchée en échec : repli job par job sur les images déjà décodées (pas de seconde lecture).
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from cascade import CascadeStats, parse_cascade  # noqa: E402
+
+
+class BatchFailingDetector:
+    """Échoue sur un lot de plus d'une image, sans visage sinon."""
+
+    def detect_best_faces_scored(self, imgs):
+        if len(imgs) > 1:
+            raise RuntimeError("batch failed")
+        return [None]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(thumb_server, "CASCADE", parse_cascade("ssd"))
+    monkeypatch.setitem(thumb_server._DETECTORS, "ssd", BatchFailingDetector())
+    monkeypatch.setattr(thumb_server, "_CASCADE_STATS", CascadeStats())
+    monkeypatch.setattr(thumb_server, "_FACE_CACHE", None)
+    monkeypatch.setattr(thumb_server, "_JOB_STORE", None)
+    monkeypatch.setattr(thumb_server, "_EVENTS", None)
+
+    decoded = []
+    decode_image = thumb_server.decode_image
+
+    def recording(data, factor):
+        decoded.append(factor)
+        return decode_image(data, factor)
+
+    monkeypatch.setattr(thumb_server, "decode_image", recording)
+    return decoded
+
+
+def test_fallback_reuses_decoded_images(server, tmp_path):
+    jobs = []
+    for name in ("a", "b", "c"):
+        src = tmp_path / f"{name}.png"
+        cv2.imwrite(str(src), np.full((80, 60, 3), 128, np.uint8))
+        jobs.append({"job_id": name, "src": str(src),
+                     "outputs": [{"job_id": name, "width": 30, "height": 40, "dst": str(tmp_path / f"{name}.jpg")}]})
+
+    thumb_server.process_jobs(jobs)
+
+    assert len(server) == len(jobs)
+    for name in ("a", "b", "c"):
+        assert thumb_server.output_status(name)["status"] == "done"
+        assert (tmp_path / f"{name}.jpg").is_file()
@@ -0,0 +1,46 @@
+"""
+Décodage réduit : seul le JPEG est décodé à 1/2, 1/4 ou 1/8 ; le budget porte sur la taille décodée.
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+
+OUTPUTS = [{"width": 100, "height": 100}]
+
+
+def encode(ext: str, width: int, height: int) -> bytes:
+    ok, buf = cv2.imencode(ext, np.zeros((height, width, 3), np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+    monkeypatch.setattr(thumb_server, "MAX_DECODE_MPIX", 4.0)
+
+
+def test_jpeg_is_decoded_reduced():
+    assert thumb_server.choose_decode_factor(encode(".jpg", 1600, 1600), OUTPUTS, need_detection=False) == 8
+
+
+@pytest.mark.parametrize("ext", [".png", ".webp", ".bmp"])
+def test_other_formats_are_decoded_full_size(ext):
+    assert thumb_server.choose_decode_factor(encode(ext, 1600, 1600), OUTPUTS, need_detection=False) == 1
+
+
+def test_jpeg_over_budget_is_reduced_to_fit():
+    data = encode(".jpg", 3000, 3000)
+    assert thumb_server.choose_decode_factor(data, [{"width": 3000, "height": 3000}], need_detection=False) == 2
+
+
+def test_other_format_over_budget_is_refused():
+    with pytest.raises(thumb_server.JobError):
+        thumb_server.choose_decode_factor(encode(".png", 3000, 3000), OUTPUTS, need_detection=False)
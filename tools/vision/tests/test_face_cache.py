@@ -0,0 +1,101 @@
+"""
+Cache des détections : un "pas de visage" n'est gardé que si la cascade complète a tourné ;
+un succès du cache est compté à part dans thumb_detections_total ; la clé couvre le backend du SSD.
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from cascade import CascadeStats, image_bucket, parse_cascade  # noqa: E402
+from face_cache import FaceBoxCache, hash_bytes  # noqa: E402
+
+
+class NoFaceDetector:
+    def __init__(self):
+        self.calls = 0
+
+    def detect_best_faces_scored(self, imgs):
+        self.calls += 1
+        return [None for _ in imgs]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    detector = NoFaceDetector()
+    monkeypatch.setattr(thumb_server, "CASCADE", parse_cascade("ssd"))
+    monkeypatch.setitem(thumb_server._DETECTORS, "ssd", detector)
+    monkeypatch.setattr(thumb_server, "_CASCADE_STATS", CascadeStats())
+    monkeypatch.setattr(thumb_server, "CASCADE_PROBE_EVERY", 0)
+    monkeypatch.setattr(thumb_server, "_FACE_CACHE", FaceBoxCache(tmp_path / "faces.sqlite3"))
+    return detector
+
+
+def make_job(tmp_path: Path):
+    img = np.full((400, 300, 3), 128, np.uint8)
+    src = tmp_path / "src.png"
+    cv2.imwrite(str(src), img)
+    job, error = thumb_server.parse_job({"job_id": "j1", "src": str(src), "dst": str(tmp_path / "out.jpg"),
+                                         "width": 60, "height": 80})
+    assert error is None
+    return job, hash_bytes(src.read_bytes()), image_bucket(img.shape[1], img.shape[0])
+
+
+def test_full_cascade_miss_is_cached(server, tmp_path):
+    job, content_hash, _ = make_job(tmp_path)
+    thumb_server.process_jobs([job])
+
+    assert server.calls == 1
+    cached = thumb_server.lookup_face_cache(content_hash)
+    assert cached is not None and cached.detection is None
+
+
+def test_skipped_stage_miss_is_not_cached(server, tmp_path, monkeypatch):
+    job, content_hash, bucket = make_job(tmp_path)
+    # Étape qui ne trouve jamais rien dans ce bucket : sautée avec --cascade-skip-below
+    thumb_server._CASCADE_STATS.record(bucket, "ssd", 100, 0, 1.0)
+    monkeypatch.setattr(thumb_server, "CASCADE_SKIP_BELOW", 0.05)
+    thumb_server.process_jobs([job])
+
+    assert server.calls == 0
+    assert (tmp_path / "out.jpg").is_file()
+    assert thumb_server.lookup_face_cache(content_hash) is None
+
+
+def test_cache_hit_is_not_counted_as_a_cascade_stage(server, tmp_path, monkeypatch):
+    metrics = thumb_server.Metrics()
+    monkeypatch.setattr(thumb_server, "_METRICS", metrics)
+    job, _, _ = make_job(tmp_path)
+    thumb_server.process_jobs([job])
+    thumb_server.process_jobs([job])
+
+    assert server.calls == 1
+    counters = metrics.take()["counters"]
+    assert dict(counters)[("thumb_detections_total", "fallback")] == 1
+    assert dict(counters)[("thumb_detections_total", "cache")] == 1
+
+
+def test_ssd_backend_is_part_of_the_cache_key(monkeypatch):
+    monkeypatch.setattr(thumb_server, "CASCADE", parse_cascade("ssd,yolo"))
+    monkeypatch.setattr(thumb_server, "SSD_BACKEND", "eager")
+    monkeypatch.setattr(thumb_server, "SSD_OPTIMIZE", ())
+    eager = thumb_server.detection_config_key()
+
+    monkeypatch.setattr(thumb_server, "SSD_BACKEND", "int8")
+    int8 = thumb_server.detection_config_key()
+    monkeypatch.setattr(thumb_server, "SSD_BACKEND", "eager")
+    monkeypatch.setattr(thumb_server, "SSD_OPTIMIZE", ("fold_bn",))
+    fold_bn = thumb_server.detection_config_key()
+
+    assert len({eager, int8, fold_bn}) == 3
+    # Sans étape ssd, le backend du SSD ne change rien
+    monkeypatch.setattr(thumb_server, "CASCADE", parse_cascade("yolo"))
+    yolo = thumb_server.detection_config_key()
+    monkeypatch.setattr(thumb_server, "SSD_BACKEND", "int8")
+    assert thumb_server.detection_config_key() == yolo
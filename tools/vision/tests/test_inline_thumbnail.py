@@ -0,0 +1,76 @@
+"""
+POST /thumbnail (front aiohttp) : une requête abandonnée, par timeout ou annulation, ne laisse
+pas sa place dans _inline_results.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer, make_mocked_request  # noqa: E402
+
+import async_server  # noqa: E402
+import thumb_server  # noqa: E402
+from job_queue import JobQueue  # noqa: E402
+
+
+@pytest.fixture
+def api(monkeypatch):
+    # Pas de worker : le job reste en file, la requête attend jusqu'au timeout
+    monkeypatch.setattr(thumb_server, "_job_queue", JobQueue())
+    monkeypatch.setattr(thumb_server, "_inline_results", {})
+    monkeypatch.setattr(thumb_server, "INLINE_TIMEOUT", 0.2)
+    return thumb_server
+
+
+def png() -> bytes:
+    ok, buf = cv2.imencode(".png", np.zeros((40, 30, 3), np.uint8))
+    assert ok
+    return buf.tobytes()
+
+
+def test_timed_out_request_drops_its_slot(api):
+    async def run():
+        async with TestClient(TestServer(async_server.create_app(api))) as client:
+            resp = await client.post("/thumbnail?width=20&height=20&format=png", data=png())
+            return resp.status
+
+    assert asyncio.run(run()) == 504
+    assert api._inline_results == {}
+
+
+def test_cancelled_request_drops_its_slot(api, monkeypatch):
+    monkeypatch.setattr(api, "INLINE_TIMEOUT", 30.0)
+
+    async def run():
+        app = async_server.create_app(api)
+        app.freeze()
+        await app.on_startup.send(app)
+        try:
+            handler = next(route.handler for route in app.router.routes() if route.resource.canonical == "/thumbnail")
+            request = make_mocked_request("POST", "/thumbnail?width=20&height=20&format=png", app=app)
+            data = png()
+
+            async def read():
+                return data
+
+            request.read = read
+            task = asyncio.create_task(handler(request))
+            while not api._inline_results:
+                await asyncio.sleep(0.01)
+            # Client déconnecté
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            await app.on_cleanup.send(app)
+
+    asyncio.run(run())
+    assert api._inline_results == {}
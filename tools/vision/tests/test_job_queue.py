@@ -0,0 +1,84 @@
+"""
+File à deux voies : interactive d'abord, anti-famine de la voie background, promotion d'un job en file.
+"""
+
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from job_queue import BACKGROUND, INTERACTIVE, JobQueue  # noqa: E402
+
+
+def job(name: str, priority: str = INTERACTIVE) -> dict:
+    return {"job_id": name, "src": f"/tmp/{name}.png", "priority": priority,
+            "outputs": [{"job_id": f"{name}:1", "width": 10, "height": 10, "dst": f"/tmp/{name}.jpg"}]}
+
+
+def drain(q: JobQueue) -> list:
+    names = []
+    while q.qsize():
+        names.append(q.get_nowait()["job_id"])
+    return names
+
+
+def test_interactive_lane_is_served_first_in_arrival_order():
+    q = JobQueue()
+    for name, priority in [("b1", BACKGROUND), ("i1", INTERACTIVE), ("b2", BACKGROUND), ("i2", INTERACTIVE)]:
+        q.put(job(name, priority))
+    assert q.lane_sizes() == {INTERACTIVE: 2, BACKGROUND: 2}
+    assert drain(q) == ["i1", "i2", "b1", "b2"]
+
+
+def test_background_job_passes_after_background_every_interactive_jobs():
+    q = JobQueue(background_every=3)
+    q.put(job("b1", BACKGROUND))
+    q.put(job("b2", BACKGROUND))
+    for i in range(7):
+        q.put(job(f"i{i}"))
+    assert drain(q) == ["i0", "i1", "i2", "b1", "i3", "i4", "i5", "b2", "i6"]
+
+
+def test_streak_only_counts_while_background_jobs_wait():
+    q = JobQueue(background_every=2)
+    for i in range(3):
+        q.put(job(f"i{i}"))
+    assert [q.get_nowait()["job_id"] for _ in range(3)] == ["i0", "i1", "i2"]
+
+    # Aucune attente background jusqu'ici : pas de dette accumulée
+    q.put(job("b1", BACKGROUND))
+    q.put(job("i3"))
+    q.put(job("i4"))
+    q.put(job("i5"))
+    assert drain(q) == ["i3", "i4", "b1", "i5"]
+
+
+def test_promote_moves_a_background_job_to_the_interactive_lane():
+    q = JobQueue()
+    q.put(job("b1", BACKGROUND))
+    q.put(job("b2", BACKGROUND))
+    q.put(job("i1"))
+
+    assert q.promote("b2:1")
+    assert q.lane_sizes() == {INTERACTIVE: 2, BACKGROUND: 1}
+    # Déjà interactive, ou absente de la file : rien à faire
+    assert not q.promote("b2:1")
+    assert not q.promote("i1:1")
+    assert not q.promote("nope")
+
+    promoted = [q.get_nowait() for _ in range(3)]
+    assert [j["job_id"] for j in promoted] == ["i1", "b2", "b1"]
+    assert promoted[1]["priority"] == INTERACTIVE
+    assert q.qsize() == 0
+    assert not q.promote("b1:1")
+
+
+def test_get_times_out_on_empty_queue():
+    q = JobQueue()
+    with pytest.raises(queue.Empty):
+        q.get(timeout=0.05)
+    with pytest.raises(queue.Empty):
+        q.get_nowait()
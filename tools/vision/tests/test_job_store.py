@@ -0,0 +1,111 @@
+"""
+File persistante : bails, replay après un crash (ordre, priorité, abandon après MAX_ATTEMPTS),
+suppression des sorties terminées ; un job rejoué attend depuis le redémarrage.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from job_queue import BACKGROUND, INTERACTIVE, JobQueue  # noqa: E402
+from job_store import MAX_ATTEMPTS, JobStore  # noqa: E402
+
+
+def job(name: str, sizes=(10,), priority: str = INTERACTIVE) -> dict:
+    return {"job_id": name, "src": f"/tmp/{name}.png", "priority": priority,
+            "outputs": [{"job_id": f"{name}:{s}", "width": s, "height": s, "dst": f"/tmp/{name}_{s}.jpg"}
+                        for s in sizes]}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "jobs.sqlite3"
+
+
+def leases(store: JobStore) -> dict:
+    conn = store._connection()
+    return {oid: (pid, attempts) for oid, pid, attempts in
+            conn.execute("SELECT output_id, lease_pid, attempts FROM job_outputs")}
+
+
+def test_add_deduplicates_outputs(path):
+    store = JobStore(path)
+    assert store.add(job("a", (10, 20))) == ["a:10", "a:20"]
+    assert store.add_many([job("a", (20, 30)), job("b")]) == ["a:30", "b:10"]
+    assert store.count() == 4
+
+
+def test_lease_records_pid_and_attempts(path):
+    store = JobStore(path)
+    store.add(job("a", (10, 20)))
+    store.lease(["a:10"], pid=1234)
+    store.lease(["a:10"], pid=1234)
+    assert leases(store) == {"a:10": (1234, 2), "a:20": (None, 0)}
+
+
+def test_completed_outputs_are_deleted(path):
+    store = JobStore(path)
+    store.add(job("a", (10, 20)))
+    store.lease(["a:10", "a:20"])
+    store.complete("a:10")
+    assert store.count() == 1
+    store.complete("a:20")
+    store.complete("a:20")
+    assert store.count() == 0
+    assert JobStore(path).replay() == ([], [])
+
+
+def test_replay_after_crash_requeues_pending_and_leased_outputs(path):
+    store = JobStore(path)
+    store.add(job("a", (10, 20)))
+    store.add(job("b", priority=BACKGROUND))
+    store.add(job("c"))
+    store.set_priority("b:10", INTERACTIVE)
+    store.lease(["a:10", "a:20"], pid=999999)
+    store.complete("a:20")
+    store.complete("c:10")
+
+    # Redémarrage : nouvelle connexion sur le même fichier
+    restarted = JobStore(path)
+    jobs, dropped = restarted.replay()
+    assert dropped == []
+    assert [(j["job_id"], [o["job_id"] for o in j["outputs"]], j["priority"]) for j in jobs] == [
+        ("a", ["a:10"], INTERACTIVE),
+        ("b", ["b:10"], INTERACTIVE),
+    ]
+    assert jobs[0]["outputs"][0] == {"job_id": "a:10", "width": 10, "height": 10, "dst": "/tmp/a_10.jpg"}
+    # Bails du process mort relâchés, tentatives conservées
+    assert leases(restarted) == {"a:10": (None, 1), "b:10": (None, 0)}
+
+
+def test_output_interrupted_too_many_times_is_dropped(path):
+    store = JobStore(path)
+    store.add(job("a", (10, 20)))
+    for _ in range(MAX_ATTEMPTS):
+        store.lease(["a:10"])
+    store.lease(["a:20"])
+
+    jobs, dropped = JobStore(path).replay()
+    assert dropped == ["a:10"]
+    assert [[o["job_id"] for o in j["outputs"]] for j in jobs] == [["a:20"]]
+    assert JobStore(path).count() == 1
+
+
+def test_replayed_jobs_wait_from_the_restart(path, monkeypatch):
+    store = JobStore(path)
+    store.add({**job("a"), "enqueued_at": time.time() - 3600})
+    monkeypatch.setattr(thumb_server, "_JOB_STORE", JobStore(path))
+    monkeypatch.setattr(thumb_server, "_job_queue", JobQueue())
+    monkeypatch.setattr(thumb_server, "_pending_jobs", set())
+
+    t0 = time.time()
+    thumb_server.replay_job_store()
+    replayed = thumb_server._job_queue.get_nowait()
+    assert replayed["job_id"] == "a" and thumb_server._pending_jobs == {"a:10"}
+    # L'heure d'arrêt du serveur n'est pas comptée dans queue_wait
+    assert replayed["enqueued_at"] >= t0
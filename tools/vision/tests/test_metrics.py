@@ -0,0 +1,39 @@
+"""
+Exposition Prometheus : les compteurs restent exacts au-delà de 6 chiffres significatifs.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from metrics import Metrics, format_value  # noqa: E402
+
+HISTOGRAM = ("thumb_stage_seconds", "stage", "Stage time.")
+COUNTERS = {"thumb_outputs_total": ("status", "Finished outputs.")}
+
+
+def test_format_value():
+    assert format_value(1234567) == "1234567"
+    assert format_value(3.0) == "3"
+    assert format_value(0.25) == "0.25"
+    assert format_value(2 ** 53) == str(2 ** 53)
+
+
+def test_counter_above_one_million_is_exact():
+    metrics = Metrics()
+    metrics.inc("thumb_outputs_total", "done", 1234567)
+    metrics.inc("thumb_outputs_total", "done")
+    text = metrics.render(HISTOGRAM, COUNTERS, [("thumb_queue_depth", "Queued.", {}, 2000001)])
+
+    assert 'thumb_outputs_total{status="done"} 1234568\n' in text
+    assert "thumb_queue_depth 2000001\n" in text
+
+
+def test_histogram_counts_are_exact():
+    metrics = Metrics()
+    metrics.observe("decode", 0.002, n=1500000)
+    text = metrics.render(HISTOGRAM, {}, [])
+
+    assert 'thumb_stage_seconds_bucket{stage="decode",le="+Inf"} 1500000\n' in text
+    assert 'thumb_stage_seconds_count{stage="decode"} 1500000\n' in text
@@ -0,0 +1,50 @@
+"""
+Validation des jobs (/enqueue, /enqueue_batch) : ids de job et de sortie, chaînes non vides.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+
+
+def simple_job(**fields):
+    return {"job_id": "a", "src": "/tmp/a.png", "dst": "/tmp/a.jpg", "width": 30, "height": 40, **fields}
+
+
+def multi_job(*outputs):
+    return {"job_id": "a", "src": "/tmp/a.png", "outputs": list(outputs)}
+
+
+@pytest.mark.parametrize("job_id", [123, 1.5, True, ["a"], {"a": 1}])
+def test_non_string_job_id_is_refused(job_id):
+    job, error = thumb_server.parse_job(simple_job(job_id=job_id))
+    assert job is None and error == "Invalid job_id"
+
+
+@pytest.mark.parametrize("job_id", ["", 0, 12, [], ["x"]])
+def test_invalid_output_job_id_is_refused(job_id):
+    job, error = thumb_server.parse_job(multi_job({"job_id": job_id, "dst": "/tmp/a.jpg", "width": 30, "height": 40}))
+    assert job is None and error == "Invalid job_id"
+
+
+def test_output_job_id_defaults_to_job_id_and_size():
+    job, error = thumb_server.parse_job(multi_job({"dst": "/tmp/a.jpg", "width": 30, "height": 40},
+                                                  {"job_id": None, "dst": "/tmp/b.jpg", "width": 60, "height": 80},
+                                                  {"job_id": "c", "dst": "/tmp/c.jpg", "width": 90, "height": 120}))
+    assert error is None
+    assert [o["job_id"] for o in job["outputs"]] == ["a:30x40", "a:60x80", "c"]
+
+
+def test_invalid_job_id_is_a_bad_request(tmp_path):
+    src = tmp_path / "a.png"
+    src.write_bytes(b"")
+    payload, code = thumb_server.handle_enqueue(simple_job(job_id=7, src=str(src)))
+    assert code == 400 and payload == {"ok": False, "error": "Invalid job_id"}
+
+    payload, code = thumb_server.handle_enqueue_batch({"jobs": [simple_job(job_id=7, src=str(src))]})
+    assert code == 200 and payload["jobs"] == [{"ok": False, "error": "Invalid job_id", "job_id": 7, "code": 400}]
@@ -0,0 +1,40 @@
+"""
+Jobs par chemin (/enqueue, /enqueue_batch) : réservés aux clients locaux si le serveur écoute hors loopback.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("127.0.0.1", True),
+    ("127.0.1.1", True),
+    ("::1", True),
+    ("::ffff:127.0.0.1", True),
+    ("localhost", True),
+    ("0.0.0.0", False),
+    ("192.168.1.10", False),
+    ("::", False),
+    ("", False),
+    (None, False),
+])
+def test_is_loopback(address, expected):
+    assert thumb_server.is_loopback(address) is expected
+
+
+def test_remote_client_refused_when_local_only(monkeypatch):
+    monkeypatch.setattr(thumb_server, "PATH_JOBS_LOCAL_ONLY", True)
+    assert thumb_server.check_path_jobs_client("127.0.0.1") is None
+    payload, code = thumb_server.check_path_jobs_client("192.168.1.10")
+    assert code == 403 and not payload["ok"]
+
+
+def test_remote_client_accepted_by_default(monkeypatch):
+    monkeypatch.setattr(thumb_server, "PATH_JOBS_LOCAL_ONLY", False)
+    assert thumb_server.check_path_jobs_client("192.168.1.10") is None
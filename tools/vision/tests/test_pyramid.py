@@ -0,0 +1,67 @@
+"""
+Mode pyramide : sorties de même ratio réduites en chaîne depuis la plus grande, mêmes tailles
+et même cadrage qu'un rendu indépendant de chaque sortie.
+"""
+
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from detectors import FaceDetection  # noqa: E402
+
+SIZES = [(480, 600), (160, 200), (320, 400), (300, 300)]
+
+
+@pytest.fixture(autouse=True)
+def no_status(monkeypatch):
+    monkeypatch.setattr(thumb_server, "_JOB_STORE", None)
+    monkeypatch.setattr(thumb_server, "_EVENTS", None)
+
+
+def make_job(tmp_path: Path, name: str, pyramid: bool) -> dict:
+    outputs = [{"job_id": f"{name}:{w}x{h}", "width": w, "height": h, "dst": str(tmp_path / name / f"{w}x{h}.png")}
+               for w, h in SIZES]
+    return {"job_id": name, "src": "<test>", "outputs": outputs, "pyramid": pyramid}
+
+
+def test_pyramid_chains_group_by_ratio_largest_first():
+    outputs = [{"width": w, "height": h} for w, h in SIZES]
+    chains = thumb_server.pyramid_chains(outputs)
+    assert [[(o["width"], o["height"]) for o in chain] for chain in chains] == [
+        [(480, 600), (320, 400), (160, 200)],
+        [(300, 300)],
+    ]
+
+
+def test_pyramid_outputs_match_direct_resizes(tmp_path, monkeypatch):
+    rendered = []
+    render_thumbnail = thumb_server.render_thumbnail
+
+    def recording(img, width, height, box, larger=None):
+        rendered.append(((width, height), None if larger is None else larger.shape[1::-1]))
+        return render_thumbnail(img, width, height, box, larger)
+
+    monkeypatch.setattr(thumb_server, "render_thumbnail", recording)
+
+    rng = np.random.default_rng(0)
+    img = cv2.GaussianBlur(rng.integers(0, 256, (1500, 1000, 3), dtype=np.uint8), (15, 15), 0)
+    detection = FaceDetection((400, 300, 600, 500), 0.9, "ssd")
+    thumb_server.write_outputs(make_job(tmp_path, "pyramid", True), img, detection)
+    thumb_server.write_outputs(make_job(tmp_path, "direct", False), img, detection)
+
+    # Chaque niveau réduit depuis le précédent ; la sortie d'un autre ratio, depuis le crop
+    assert rendered[:4] == [((480, 600), None), ((320, 400), (480, 600)), ((160, 200), (320, 400)),
+                            ((300, 300), None)]
+    for w, h in SIZES:
+        pyramid = cv2.imread(str(tmp_path / "pyramid" / f"{w}x{h}.png")).astype(np.int16)
+        direct = cv2.imread(str(tmp_path / "direct" / f"{w}x{h}.png")).astype(np.int16)
+        assert pyramid.shape == direct.shape == (h, w, 3)
+        # Même cadrage, au filtrage près
+        assert np.abs(pyramid - direct).mean() < 2.0
+        assert thumb_server.output_status(f"pyramid:{w}x{h}")["status"] == "done"
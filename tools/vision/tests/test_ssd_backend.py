@@ -0,0 +1,66 @@
+"""
+Backend du SSD : traçage et contrôle de parité (de l'inférence) au premier usage, pas au chargement
+des poids ; avec --workers, le process HTTP n'en fait donc aucun avant le fork.
+"""
+
+import multiprocessing as mp
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+torch = pytest.importorskip("torch")
+
+from detectors import anime_face_ssd  # noqa: E402
+from detectors.anime_face_ssd import FaceBoxes, SSDAnimeFaceDetector  # noqa: E402
+
+
+@pytest.fixture
+def weights(tmp_path):
+    torch.manual_seed(0)
+    path = tmp_path / "faceboxes.pth"
+    torch.save(FaceBoxes(phase="test", size=None, num_classes=2).state_dict(), path)
+    return path
+
+
+@pytest.fixture
+def backend_calls(monkeypatch):
+    calls = []
+    make_backend = anime_face_ssd.make_backend
+
+    def recording_make_backend(name, *args, **kwargs):
+        calls.append(name)
+        return make_backend(name, *args, **kwargs)
+
+    monkeypatch.setattr(anime_face_ssd, "make_backend", recording_make_backend)
+    return calls
+
+
+def test_backend_is_prepared_on_first_use(weights, backend_calls):
+    detector = SSDAnimeFaceDetector(str(weights), device="cpu", backend="torchscript", optimize=("fold_bn",))
+    assert backend_calls == []
+
+    detector.detect_best_faces_scored([np.zeros((96, 64, 3), np.uint8)])
+    assert backend_calls == ["eager", "torchscript"]
+    assert (detector.backend_name, detector.optimize) == ("torchscript", ("fold_bn",))
+
+
+def _child_backend_name(detector, result):
+    detector.after_fork()
+    result.put(detector.backend_name)
+
+
+def test_forked_worker_prepares_its_own_backend(weights):
+    detector = SSDAnimeFaceDetector(str(weights), device="cpu", backend="torchscript")
+    ctx = mp.get_context("fork")
+    result = ctx.Queue()
+    p = ctx.Process(target=_child_backend_name, args=(detector, result))
+    p.start()
+    assert result.get(timeout=60) == "torchscript"
+    p.join(timeout=10)
+
+    # Rien de préparé dans le process parent
+    assert detector._backend is None
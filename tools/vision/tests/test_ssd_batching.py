@@ -0,0 +1,59 @@
+"""
+SSD : une image donne le même résultat seule ou dans un lot (même entrée letterboxée, mêmes priors).
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+torch = pytest.importorskip("torch")
+
+from detectors.anime_face_ssd import FaceBoxes, SSDAnimeFaceDetector  # noqa: E402
+
+SIZES = [(300, 200), (290, 190), (310, 220), (500, 380)]
+
+
+@pytest.fixture
+def detector(tmp_path):
+    torch.manual_seed(0)
+    path = tmp_path / "faceboxes.pth"
+    torch.save(FaceBoxes(phase="test", size=None, num_classes=2).state_dict(), path)
+    return SSDAnimeFaceDetector(str(path), device="cpu")
+
+
+def record_decoding(detector, monkeypatch):
+    """Entrées du décodage / NMS de chaque image (déterministe à entrées égales)."""
+    calls = []
+    best_from_output = detector._best_from_output
+
+    def recording(loc, conf, priors, *sizes):
+        calls.append((loc.clone(), conf.clone(), priors, sizes))
+        return best_from_output(loc, conf, priors, *sizes)
+
+    monkeypatch.setattr(detector, "_best_from_output", recording)
+    return calls
+
+
+def test_single_and_batched_inference_match(detector, monkeypatch):
+    rng = np.random.default_rng(0)
+    imgs = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for h, w in SIZES]
+    calls = record_decoding(detector, monkeypatch)
+
+    batched = detector.detect_best_faces_scored(imgs)
+    single = [detector.detect_best_face_scored(img) for img in imgs]
+    assert single == batched
+
+    batched_calls, single_calls = calls[:len(imgs)], calls[len(imgs):]
+    # Ordre des appels en batch : par groupe de taille letterboxée
+    batched_calls.sort(key=lambda call: call[3][2:])
+    single_calls.sort(key=lambda call: call[3][2:])
+    for (b_loc, b_conf, b_priors, b_sizes), (s_loc, s_conf, s_priors, s_sizes) in zip(batched_calls, single_calls):
+        assert b_sizes == s_sizes
+        assert torch.equal(b_priors, s_priors)
+        # Un forward batché peut arrondir différemment (algorithmes de convolution selon le batch)
+        assert torch.allclose(b_loc, s_loc, atol=1e-5)
+        assert torch.allclose(b_conf, s_conf, atol=1e-5)
@@ -0,0 +1,68 @@
+"""
+Post-traitement SSD : PriorBox vectorisé, top-k partiel et NMS vectorisé identiques aux versions
+historiques (boucles Python, tri complet).
+"""
+
+import sys
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+torch = pytest.importorskip("torch")
+
+from detectors.anime_face_ssd import PriorBox, cpu_nms, cpu_nms_vectorized, top_k_desc  # noqa: E402
+
+CFG = {"min_sizes": [[32, 64, 128], [256], [512]], "steps": [32, 64, 128], "clip": False}
+
+
+def reference_priors(image_size):
+    """PriorBox.forward historique, en boucles Python."""
+    im_height, im_width = image_size
+    anchors = []
+    for k, step in enumerate(CFG["steps"]):
+        for i, j in product(range(-(-im_height // step)), range(-(-im_width // step))):
+            for min_size in CFG["min_sizes"][k]:
+                s_kx = min_size / im_width
+                s_ky = min_size / im_height
+                offsets = {32: [0, 0.25, 0.5, 0.75], 64: [0, 0.5]}.get(min_size, [0.5])
+                for dy, dx in product(offsets, offsets):
+                    anchors += [(j + dx) * step / im_width, (i + dy) * step / im_height, s_kx, s_ky]
+    return torch.Tensor(anchors).view(-1, 4)
+
+
+@pytest.mark.parametrize("image_size", [(320, 256), (1024, 544), (250, 130)])
+def test_prior_box_matches_reference(image_size):
+    priors = PriorBox(CFG, image_size=image_size).forward()
+    assert torch.allclose(priors, reference_priors(image_size), rtol=0, atol=1e-6)
+
+
+def make_dets(rng, n, score_levels=None):
+    c = rng.uniform(0, 1000, size=(n, 2))
+    s = rng.uniform(20, 200, size=(n, 2))
+    if score_levels is None:
+        scores = rng.uniform(0.1, 1.0, size=n)
+    else:
+        # Beaucoup d'égalités de score (sorties quantifiées, ex. int8)
+        scores = rng.choice(np.linspace(0.1, 1.0, score_levels), size=n)
+    return np.hstack([c - s / 2, c + s / 2, scores[:, None]]).astype(np.float32)
+
+
+@pytest.mark.parametrize("levels", [None, 7, 50])
+@pytest.mark.parametrize("k", [1, 10, 300, 5000])
+def test_top_k_matches_stable_full_sort(levels, k):
+    scores = make_dets(np.random.default_rng(k), 2000, levels)[:, 4]
+    expected = scores.argsort(kind="stable")[::-1][:k]
+    np.testing.assert_array_equal(top_k_desc(scores, k), expected)
+
+
+@pytest.mark.parametrize("levels", [None, 7])
+def test_vectorized_nms_keeps_same_indices(levels):
+    rng = np.random.default_rng(0)
+    for n in (1, 50, 800):
+        dets = make_dets(rng, n, levels)
+        dets = dets[top_k_desc(dets[:, 4], 500)]
+        assert [int(i) for i in cpu_nms_vectorized(dets, 0.3)] == [int(i) for i in cpu_nms(dets, 0.3)]
@@ -0,0 +1,76 @@
+"""
+/status : états des sorties (queued, processing, done, failed avec sa raison, unknown) et long-poll
+réveillé par la fin d'une sortie.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(thumb_server, "_pending_jobs", set())
+    monkeypatch.setattr(thumb_server, "_processing_jobs", set())
+    monkeypatch.setattr(thumb_server, "_completed_jobs", OrderedDict())
+    monkeypatch.setattr(thumb_server, "_JOB_STORE", None)
+    return thumb_server.app.test_client()
+
+
+def statuses(client, ids, wait=0):
+    resp = client.post("/status", json={"job_ids": ids, "wait": wait})
+    assert resp.status_code == 200
+    return {oid: st["status"] for oid, st in resp.get_json()["jobs"].items()}
+
+
+def test_output_lifecycle(client):
+    thumb_server._pending_jobs.add("a")
+    assert statuses(client, ["a", "x"]) == {"a": "queued", "x": "unknown"}
+
+    thumb_server.start_outputs(["a"])
+    assert statuses(client, ["a"]) == {"a": "processing"}
+
+    thumb_server.finish_output("a")
+    assert statuses(client, ["a"]) == {"a": "done"}
+
+
+def test_failed_output_reports_its_reason(client):
+    thumb_server.start_outputs(["a", "b"])
+    thumb_server.finish_output("a", "Failed to read image")
+    thumb_server.finish_output("b")
+
+    jobs = client.get("/status?ids=a,b").get_json()["jobs"]
+    assert jobs["a"]["status"] == "failed" and jobs["a"]["error"] == "Failed to read image"
+    assert jobs["b"]["status"] == "done" and "error" not in jobs["b"]
+
+
+def test_long_poll_wakes_up_when_an_output_finishes(client):
+    thumb_server.start_outputs(["a", "b"])
+    timer = threading.Timer(0.2, thumb_server.finish_output, ("b", "Source image not found"))
+    timer.start()
+    try:
+        t0 = time.monotonic()
+        assert statuses(client, ["a", "b"], wait=10) == {"a": "processing", "b": "failed"}
+        assert time.monotonic() - t0 < 5
+    finally:
+        timer.cancel()
+
+
+def test_long_poll_returns_after_wait(client):
+    thumb_server._pending_jobs.add("a")
+    t0 = time.monotonic()
+    assert statuses(client, ["a"], wait=0.2) == {"a": "queued"}
+    assert time.monotonic() - t0 >= 0.2
+
+
+@pytest.mark.parametrize("body", [{}, {"job_ids": "a"}, {"job_ids": [1]}, {"job_ids": ["a"], "wait": "x"}])
+def test_invalid_query_is_a_bad_request(client, body):
+    assert client.post("/status", json=body).status_code == 400
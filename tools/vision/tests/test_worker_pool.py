@@ -0,0 +1,75 @@
+"""
+Process workers (--workers N) : un job interactif passe devant les jobs background encore en file.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumb_server  # noqa: E402
+from cascade import CascadeStats, parse_cascade  # noqa: E402
+from job_queue import BACKGROUND, INTERACTIVE, JobQueue  # noqa: E402
+
+
+class SlowDetector:
+    """Un forward = 0,2 s par lot, sans visage."""
+
+    def detect_best_faces_scored(self, imgs):
+        time.sleep(0.2)
+        return [None for _ in imgs]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(thumb_server, "CASCADE", parse_cascade("ssd"))
+    monkeypatch.setitem(thumb_server._DETECTORS, "ssd", SlowDetector())
+    monkeypatch.setattr(thumb_server, "_CASCADE_STATS", CascadeStats())
+    monkeypatch.setattr(thumb_server, "_FACE_CACHE", None)
+    monkeypatch.setattr(thumb_server, "_JOB_STORE", None)
+    monkeypatch.setattr(thumb_server, "_job_queue", JobQueue())
+    monkeypatch.setattr(thumb_server, "BATCH_MAX_JOBS", 2)
+    monkeypatch.setattr(thumb_server, "BATCH_WAIT_MS", 0)
+    # Poids "chargés" (cf. load_models) : le pool signale le serveur prêt quand le worker l'est
+    monkeypatch.setattr(thumb_server, "_STARTUP_TIMES", {"models_s": 0.0})
+
+    pool = thumb_server.WorkerPool(1, 1, warmup=False)
+    pool.start()
+    deadline = time.monotonic() + 30
+    while pool.starting is not None:
+        assert time.monotonic() < deadline, "worker process did not start"
+        time.sleep(0.05)
+    yield pool
+    pool.stop()
+
+
+def enqueue(tmp_path: Path, name: str, priority: str) -> str:
+    src = tmp_path / f"{name}.png"
+    cv2.imwrite(str(src), np.full((80, 60, 3), 128, np.uint8))
+    job, error = thumb_server.parse_job({"job_id": name, "src": str(src), "dst": str(tmp_path / f"{name}.jpg"),
+                                         "width": 30, "height": 40, "priority": priority})
+    assert error is None
+    thumb_server.enqueue_jobs([job])
+    return name
+
+
+def test_interactive_job_overtakes_queued_background_jobs(pool, tmp_path):
+    background = [enqueue(tmp_path, f"bg{i}", BACKGROUND) for i in range(8)]
+    # Premier lot background en cours dans le worker
+    time.sleep(0.1)
+    interactive = enqueue(tmp_path, "int", INTERACTIVE)
+
+    ids = background + [interactive]
+    deadline = time.monotonic() + 30
+    while any(thumb_server.output_status(oid)["status"] != "done" for oid in ids):
+        assert time.monotonic() < deadline, {oid: thumb_server.output_status(oid) for oid in ids}
+        time.sleep(0.05)
+
+    finished = [oid for oid in thumb_server._completed_jobs if oid in ids]
+    # Seul le lot déjà en cours (BATCH_MAX_JOBS jobs) passe avant le job interactif
+    assert finished.index(interactive) <= thumb_server.BATCH_MAX_JOBS
@@ -4,26 +4,69 @@ thumb_server.py
 Serveur HTTP pour génération de thumbnails centrés sur le visage (si possible).
 
 Pipeline:
-  - Reçoit des jobs via POST /enqueue  (JSON: src, dst, width, height, job_id)
-  - Enfile dans une queue
-  - Un worker traite les jobs :
-      -> SSD Anime Face
+  - Reçoit des jobs via POST /enqueue  (JSON: src, dst, width, height, job_id
+    ou src, job_id, outputs=[{width, height, dst}, ...] pour plusieurs tailles),
+    ou plusieurs d'un coup via POST /enqueue_batch ({"jobs": [...]})
+  - Enregistre le job dans une file persistante (SQLite, rejouée au redémarrage) puis l'enfile,
+    en voie "interactive" (défaut) ou "background" (servie quand la voie interactive est vide,
+    et au moins un job sur BACKGROUND_EVERY + 1 sinon)
+  - Un worker traite les jobs par lots (jusqu'à BATCH_MAX_JOBS, en attendant au plus BATCH_WAIT_MS) :
+      -> cache des détections (hash du contenu de la source) : si présent, pas d'inférence
+      -> SSD Anime Face (un forward batché par taille d'entrée)
       -> si rien -> YOLOv8 Anime Face
       -> si toujours rien -> crop centré (50% largeur, 30% hauteur)
-  - Écrit le thumbnail dans dst
+      (ordre des détecteurs configurable, éventuellement appris par bucket de source : cf. cascade.py)
+  - Écrit le(s) thumbnail(s) dans dst (une lecture et une détection pour toutes les sorties) :
+    format = extension de dst (réglages d'encodage : THUMB_QUALITY), fichier temporaire puis rename ;
+    en mode pyramide, les tailles de même ratio (srcset 1x / 2x / 3x) sont réduites en cascade
+  - POST /status : état de plusieurs sorties en un appel (queued / processing / done / failed + raison),
+    éventuellement en long-poll (répond dès qu'une des sorties se termine)
+  - GET /metrics : métriques Prometheus (durée par étape, détecteur retenu, profondeur de file)
+  - GET /ready : 200 une fois les modèles chargés et chauffés, 503 avant (GET /health : le process répond)
+  - GET /cascade : statistiques apprises par la cascade (par bucket de source) et ordre actuel des étapes
+  - POST /thumbnail?width=W&height=H[&format=webp] : octets de l'image dans le corps, thumbnail encodé
+    dans la réponse (même pipeline, via la file en voie interactive ; rien n'est lu ni écrit sur disque)
+
+Démarrage : le serveur HTTP écoute tout de suite (torch / ultralytics ne sont importés qu'au chargement
+des modèles) ; un thread charge puis chauffe les détecteurs, et démarre ensuite le worker.
+Les jobs reçus entre-temps attendent dans la file.
+
+Avec --workers N, les poids sont chargés une fois dans le process HTTP, sans inférence, puis N process
+workers sont forkés avant tout thread (poids partagés en copy-on-write) et alimentés depuis la même
+queue ; chacun se chauffe après le fork pendant que le serveur HTTP répond déjà.
 """
 
+import os
+import sys
+import atexit
+import signal
+import argparse
+import inspect
+import ipaddress
 import threading
 import queue
+import time
+import uuid
+import multiprocessing as mp
+from collections import OrderedDict
+from fractions import Fraction
+from math import ceil
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Callable, Dict, Any, List, Mapping, NamedTuple, Optional, Set, Tuple
 
 import cv2
 import numpy as np
 from flask import Flask, request, jsonify
 
-from detectors import get_ssd_detector
-from detectors import get_yolo_detector
+from cascade import CascadeStage, CascadeStats, format_cascade, image_bucket, parse_cascade
+from detectors import FaceDetection
+from detectors import DETECTORS, get_detector
+from detectors import SSD_BACKENDS, SSD_OPTIMIZATIONS
+from face_cache import CachedFace, FaceBoxCache, hash_bytes
+from image_io import can_encode, decode_image, encode_image, encoder_params, image_size, is_jpeg, write_atomic
+from job_queue import INTERACTIVE, LANES, JobQueue
+from job_store import JobStore
+from metrics import Metrics
 
 # -------------------------------------------------
 # Config minimale
@@ -31,22 +74,142 @@ from detectors import get_yolo_detector
 
 app = Flask(__name__)
 
-_job_queue: queue.Queue[dict] = queue.Queue()
+# File à deux voies : les jobs "interactive" (un visiteur attend) passent avant les "background",
+# qui gardent au moins un job sur BACKGROUND_EVERY + 1 tant qu'ils attendent (anti-famine).
+BACKGROUND_EVERY = 8
+_job_queue = JobQueue(BACKGROUND_EVERY)
 _pending_jobs = set()
 _processing_jobs = set()
+# Index borné des sorties terminées (output id -> (état, raison, date de fin)), servi par /status.
+# Au-delà de STATUS_HISTORY entrées, les plus anciennes sont oubliées (statut "unknown").
+STATUS_HISTORY = 10000
+STATUS_MAX_IDS = 1000
+# Attente max (s) d'un long-poll /status
+STATUS_WAIT_MAX = 30.0
+_completed_jobs: "OrderedDict[str, Tuple[str, Optional[str], float]]" = OrderedDict()
+# Protège _completed_jobs et réveille les long-polls à chaque sortie terminée
+_completed_cond = threading.Condition()
+# Appelés (depuis un thread worker) à chaque sortie terminée, ex. réveil des long-polls asyncio
+_completion_listeners: List[Callable[[], None]] = []
+# Métriques exposées par /metrics (dans un process worker : accumulées puis envoyées après chaque lot)
+_METRICS = Metrics()
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Nombre max de jobs par requête /enqueue_batch
+ENQUEUE_BATCH_MAX = 1000
+# Dédoublonnage + enregistrement + mise en queue atomiques entre requêtes concurrentes
+_enqueue_lock = threading.Lock()
+# /enqueue et /enqueue_batch lisent / écrivent des chemins arbitraires du serveur (src / dst) :
+# réservés aux clients locaux si le serveur écoute sur une adresse non loopback (cf. --allow-remote-enqueue)
+PATH_JOBS_LOCAL_ONLY = False
+
+# Thumbnails synchrones (POST /thumbnail) : taille max du corps (octets de l'image source),
+# attente max (s) du rendu, file comprise, et formats de sortie acceptés.
+INLINE_MAX_BYTES = 32 * 1024 * 1024
+INLINE_TIMEOUT = 30.0
+INLINE_FORMATS = {".webp": "image/webp", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
+                  ".png": "image/png", ".avif": "image/avif"}
+# Sorties synchrones attendues par une requête : output id -> octets encodés (None tant que non rendue).
+# Protégé par _completed_cond ; un rendu arrivé après l'abandon de la requête est ignoré.
+_inline_results: Dict[str, Optional[bytes]] = {}
+
+# File persistante : les sorties en attente / en cours survivent à un redémarrage (rejouées au démarrage).
+JOB_STORE_PATH = Path(__file__).resolve().parent / "cache" / "jobs.sqlite3"
+_JOB_STORE: Optional[JobStore] = None
+
+# Batching du worker : nombre max de jobs traités ensemble,
+# et temps max d'attente (ms) pour compléter un lot après le premier job.
+BATCH_MAX_JOBS = 16
+BATCH_WAIT_MS = 5
+
+# Résolution de détection : si > 0, SSD / YOLO tournent sur une copie réduite de l'image
+# (plus grand côté = DETECT_MAX_SIDE) et les bbox sont ramenées à la résolution source
+# avant le calcul du crop. 0 = détection en pleine résolution.
+DETECT_MAX_SIDE = 0
+
+# Moteur d'inférence du SSD (FaceBoxes) : eager, torchscript, compile, onnx ou int8 (cf. export_ssd.py).
+SSD_BACKEND = "eager"
+# Optimisations du réseau fp32 du SSD : fold_bn, channels_last (eager / torchscript / compile).
+SSD_OPTIMIZE: Tuple[str, ...] = ()
+
+# Budget mémoire par job : nombre max de pixels décodés (en mégapixels, 0 = illimité).
+# Les JPEG trop grands sont décodés directement en réduit (1/2, 1/4, 1/8) ; les autres formats,
+# qu'OpenCV décode toujours en pleine résolution, sont refusés au-delà du budget.
+MAX_DECODE_MPIX = 40.0
+
+# Encodage des thumbnails (format = extension de dst) : qualité par format, JPEG progressif.
+# Sans qualité explicite, OpenCV encode le WebP sans perte (fichiers proches du PNG).
+# Comparer tailles / temps / PSNR des réglages : bench/bench_encode.py.
+THUMB_QUALITY: Dict[str, int] = {".jpg": 85, ".jpeg": 85, ".webp": 80, ".avif": 50}
+JPEG_PROGRESSIVE = True
+
+# Mode pyramide par défaut des jobs multi-tailles (champ pyramid d'un job pour le forcer) :
+# un crop par ratio, puis chaque taille réduite depuis la précédente (cf. write_outputs).
+PYRAMID = False
+
+# Cache persistant des détections, clé = hash du contenu de l'image source.
+FACE_CACHE_PATH = Path(__file__).resolve().parent / "cache" / "face_boxes.sqlite3"
+_FACE_CACHE: Optional[FaceBoxCache] = None
+
+# Pool multi-process (--workers N) : 0 = un seul worker thread dans le process HTTP.
+WORKERS = 0
+# Threads intra-op torch / OpenCV par process worker (0 = cpu_count // WORKERS).
+WORKER_THREADS = 0
+_POOL: Optional["WorkerPool"] = None
+# Dans un process worker : queue d'évènements vers le process HTTP (avancement des sorties).
+_EVENTS = None
+
+# Cascade de détection (cf. cascade.py) : étapes essayées dans l'ordre jusqu'au premier visage.
+DEFAULT_CASCADE = "ssd,yolo"
+CASCADE: List[CascadeStage] = parse_cascade(DEFAULT_CASCADE)
+# Ordre appris : étapes triées par coût / taux de succès mesurés (peut changer le détecteur retenu).
+CASCADE_ADAPTIVE = False
+# Étape sautée si son taux de succès mesuré est sous ce seuil (0 = jamais), sauf un lot sur CASCADE_PROBE_EVERY.
+CASCADE_SKIP_BELOW = 0.0
+# Images essayées par étape avant de réordonner / sauter quoi que ce soit.
+CASCADE_MIN_SAMPLES = 50
+CASCADE_PROBE_EVERY = 20
+_CASCADE_STATS = CascadeStats()
+# Statistiques de la cascade rechargées au démarrage, sauvegardées toutes les CASCADE_STATS_SAVE_S
+# secondes et à l'arrêt (None = en mémoire seulement).
+CASCADE_STATS_PATH: Optional[Path] = Path(__file__).resolve().parent / "cache" / "cascade_stats.json"
+CASCADE_STATS_SAVE_S = 60.0
+
+# Détecteurs chargés (nom du registre -> instance), à la première étape qui en a besoin
+_DETECTORS: Dict[str, Any] = {}
+_DETECTORS_LOCK = threading.Lock()
 
-# Lazy init des détecteurs (chargés une seule fois)
-_SSD = None
-_YOLO = None
 
+def detector_options(name: str) -> Dict[str, Any]:
+    """Options de chargement propres à un détecteur (--ssd-backend / --ssd-optimize)."""
+    if name == "ssd":
+        # SSD forcé sur CPU en mode multi-process : un contexte CUDA ne survit pas à un fork
+        return {"device": "cpu" if WORKERS > 0 else None, "backend": SSD_BACKEND, "optimize": SSD_OPTIMIZE}
+    return {}
 
-def get_detectors():
-    global _SSD, _YOLO
-    if _SSD is None:
-        _SSD = get_ssd_detector()  # modèle SSD
-    if _YOLO is None:
-        _YOLO = get_yolo_detector()  # modèle YOLO
-    return _SSD, _YOLO
+
+def load_detector(name: str) -> Any:
+    detector = _DETECTORS.get(name)
+    if detector is None:
+        with _DETECTORS_LOCK:
+            detector = _DETECTORS.get(name)
+            if detector is None:
+                detector = _DETECTORS[name] = get_detector(name, **detector_options(name))
+    return detector
+
+
+def load_cascade_detectors() -> None:
+    for stage in CASCADE:
+        load_detector(stage.name)
+
+
+# Démarrage (cf. startup) : prêt = modèles chargés + chauffés, workers démarrés
+_READY = threading.Event()
+_STARTUP_ERROR: Optional[str] = None
+# Durées de démarrage en secondes, depuis l'entrée dans main() : models_s, warmup_s, ready_s
+_STARTUP_TIMES: Dict[str, float] = {}
+_STARTUP_T0 = time.monotonic()
+# Image factice de chauffe (H, W) : une carte du catalogue
+WARMUP_SHAPE = (1000, 536)
 
 
 # -------------------------------------------------
@@ -134,102 +297,1104 @@ def compute_focus_box(
     return x1, y1, x2, y2
 
 
+def compute_thumbnail_crop(
+    img: np.ndarray,
+    width: int,
+    height: int,
+    box: Optional[Tuple[int, int, int, int]]
+) -> Tuple[int, int, int, int]:
+    """
+    Rectangle de crop (x1, y1, x2, y2) au ratio width/height :
+    centré sur le visage détecté, ou sur le point de fallback si box est None.
+    """
+    offset_box_y = 0
+    if box is not None:
+        x1_face, y1_face, x2_face, y2_face = box
+        # Point de focus = centre du visage détecté
+        fx = (x1_face + x2_face) / 2.0
+        fy = (y1_face + y2_face) / 2.0
+        offset_box_y = 0.1
+    else:
+        h, w = img.shape[:2]
+        # Fallback : point de focus par défaut (50% largeur, 30% hauteur)
+        fx = w * 0.5
+        fy = h * 0.3
+
+    # On calcule un crop minimal au bon ratio centré sur ce point
+    return compute_focus_box(img, width, height, fx, fy, offset_box_y=offset_box_y)
+
+
+def make_detection_proxy(
+    img: np.ndarray,
+    max_side: int
+) -> Tuple[np.ndarray, float, float]:
+    """
+    Réduit l'image pour que son plus grand côté vaille max_side (jamais d'agrandissement).
+    Retourne (proxy, sx, sy) avec sx / sy = facteurs proxy / source.
+    """
+    h, w = img.shape[:2]
+    if max_side <= 0 or max(h, w) <= max_side:
+        return img, 1.0, 1.0
+
+    scale = max_side / max(h, w)
+    pw = max(1, int(round(w * scale)))
+    ph = max(1, int(round(h * scale)))
+    proxy = cv2.resize(img, (pw, ph), interpolation=cv2.INTER_AREA)
+    return proxy, pw / w, ph / h
+
+
+def scale_box_to_source(
+    box: Optional[Tuple[int, int, int, int]],
+    sx: float,
+    sy: float,
+    src_w: int,
+    src_h: int
+) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Ramène une bbox détectée sur le proxy dans les coordonnées de l'image source.
+    """
+    if box is None or (sx == 1.0 and sy == 1.0):
+        return box
+
+    x1, y1, x2, y2 = box
+    x1 = int(max(0, x1 / sx))
+    y1 = int(max(0, y1 / sy))
+    x2 = int(min(src_w, x2 / sx))
+    y2 = int(min(src_h, y2 / sy))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def stage_max_side(stage: CascadeStage) -> int:
+    return DETECT_MAX_SIDE if stage.max_side is None else stage.max_side
+
+
+def detection_max_side() -> int:
+    """Plus grand côté nécessaire à la cascade : 0 (pleine résolution) si une étape en a besoin."""
+    sides = [stage_max_side(stage) for stage in CASCADE]
+    return 0 if not sides or min(sides) <= 0 else max(sides)
+
+
+def stage_options(stage: CascadeStage, detector: Any) -> Dict[str, Any]:
+    """
+    Options d'appel d'une étape. Un détecteur à taille d'inférence (imgsz, ex. YOLO à 1280) suit
+    par défaut la taille du proxy (multiple de 32) : inutile de remonter l'image au-delà.
+    """
+    options = dict(stage.options)
+    max_side = stage_max_side(stage)
+    if ("imgsz" not in options and max_side > 0
+            and "imgsz" in inspect.signature(detector.detect_best_faces_scored).parameters):
+        options["imgsz"] = int(ceil(max_side / 32) * 32)
+    return options
+
+
+def detect_face(
+    img: np.ndarray
+) -> Optional[FaceDetection]:
+    """
+    Essaie les étapes de la cascade (SSD, puis YOLO par défaut), retourne la détection retenue ou None.
+    """
+    return detect_faces([img])[0]
+
+
+def detect_faces(
+    imgs: List[np.ndarray]
+) -> List[Optional[FaceDetection]]:
+    """
+    Version batchée de detect_face (cf. run_cascade).
+    """
+    return run_cascade(imgs)[0]
+
+
+def run_cascade(
+    imgs: List[np.ndarray]
+) -> Tuple[List[Optional[FaceDetection]], List[bool]]:
+    """
+    Chaque image suit le plan de son bucket (format x taille, cf. CascadeStats.plan : --cascade-adaptive /
+    --cascade-skip-below) ; à chaque rang du plan, une étape tourne en une fois (batch pour le SSD)
+    sur toutes les images encore sans visage qui l'y ont.
+    Retourne (détections, partiel) : partiel[i] est vrai si le plan de l'image i a sauté des étapes,
+    son résultat n'est alors pas celui de la cascade complète.
+    """
+    buckets = [image_bucket(img.shape[1], img.shape[0]) for img in imgs]
+    plans: Dict[str, List[CascadeStage]] = {}
+    partial: Dict[str, bool] = {}
+    for bucket in dict.fromkeys(buckets):
+        plans[bucket], skipped = _CASCADE_STATS.plan(
+            bucket, CASCADE, CASCADE_ADAPTIVE, CASCADE_SKIP_BELOW, CASCADE_MIN_SAMPLES, CASCADE_PROBE_EVERY
+        )
+        partial[bucket] = bool(skipped)
+        for stage in skipped:
+            _METRICS.inc("thumb_cascade_skipped_total", stage.label, buckets.count(bucket))
+
+    detections: List[Optional[FaceDetection]] = [None] * len(imgs)
+    # Proxys par taille de détection (max_side -> image -> proxy), partagés par les étapes de même max_side
+    proxies: Dict[int, Dict[int, Tuple[np.ndarray, float, float]]] = {}
+    remaining = list(range(len(imgs)))
+    rank = 0
+
+    while remaining:
+        groups: Dict[CascadeStage, List[int]] = {}
+        for i in remaining:
+            plan = plans[buckets[i]]
+            if rank < len(plan):
+                groups.setdefault(plan[rank], []).append(i)
+        if not groups:
+            break
+
+        missed = []
+        for stage, group in groups.items():
+            missed += run_cascade_stage(stage, group, imgs, buckets, proxies, detections)
+        remaining = sorted(missed)
+        rank += 1
+
+    # None -> fallback géré ailleurs
+    return detections, [partial[bucket] for bucket in buckets]
+
+
+def run_cascade_stage(
+    stage: CascadeStage,
+    group: List[int],
+    imgs: List[np.ndarray],
+    buckets: List[str],
+    proxies: Dict[int, Dict[int, Tuple[np.ndarray, float, float]]],
+    detections: List[Optional[FaceDetection]]
+) -> List[int]:
+    """
+    Une étape sur les images group (indices dans imgs) : remplit detections, enregistre
+    durée et succès par bucket ; retourne les indices encore sans visage.
+    """
+    detector = load_detector(stage.name)
+    max_side = stage_max_side(stage)
+    scaled = proxies.setdefault(max_side, {})
+    for i in group:
+        if i not in scaled:
+            scaled[i] = make_detection_proxy(imgs[i], max_side)
+
+    # Durée répartie sur les images essayées
+    t0 = time.perf_counter()
+    found = detector.detect_best_faces_scored([scaled[i][0] for i in group], **stage_options(stage, detector))
+    per_image = (time.perf_counter() - t0) / len(group)
+    _METRICS.observe(stage.label, per_image, n=len(group))
+
+    missed = []
+    tried: Dict[str, List[int]] = {}
+    for i, hit in zip(group, found):
+        if hit is not None and (stage.min_score is None or hit[1] >= stage.min_score):
+            _, sx, sy = scaled[i]
+            detections[i] = to_source_detection(hit, stage.name, imgs[i], sx, sy)
+        if detections[i] is None:
+            missed.append(i)
+        counts = tried.setdefault(buckets[i], [0, 0])
+        counts[0] += 1
+        counts[1] += detections[i] is not None
+
+    for bucket, (n, hits) in tried.items():
+        _CASCADE_STATS.record(bucket, stage.label, n, hits, per_image * n)
+    _METRICS.inc("thumb_cascade_tried_total", stage.label, len(group))
+    _METRICS.inc("thumb_cascade_hits_total", stage.label, len(group) - len(missed))
+    return missed
+
+
+def to_source_detection(
+    found: Tuple[Tuple[int, int, int, int], float],
+    detector: str,
+    img: np.ndarray,
+    sx: float,
+    sy: float
+) -> Optional[FaceDetection]:
+    box, score = found
+    box = scale_box_to_source(box, sx, sy, img.shape[1], img.shape[0])
+    if box is None:
+        return None
+    return FaceDetection(box, score, detector)
+
+
 def detect_best_face_box(
     img: np.ndarray
 ) -> Optional[Tuple[int, int, int, int]]:
     """
-    Essaie SSD, puis YOLO, retourne une bbox ou None.
+    Essaie les étapes de la cascade, retourne une bbox ou None.
     """
-    ssd, yolo = get_detectors()
+    detection = detect_face(img)
+    return detection.box if detection is not None else None
 
-    # 1. SSD
-    box = ssd.detect_best_face(img)
-    if box is not None:
-        return box
 
-    # 2. YOLO
-    box = yolo.detect_best_face(img)
-    if box is not None:
-        return box
+def detect_best_face_boxes(
+    imgs: List[np.ndarray]
+) -> List[Optional[Tuple[int, int, int, int]]]:
+    """
+    Version batchée de detect_best_face_box.
+    """
+    return [d.box if d is not None else None for d in detect_faces(imgs)]
 
-    # 3. None -> fallback géré ailleurs
-    return None
+
+# -------------------------------------------------
+# Cache des détections
+# -------------------------------------------------
+
+def detection_config_key() -> str:
+    """
+    Paramètres qui influencent le résultat de la cascade : deux configurations différentes
+    ne partagent pas leurs entrées de cache.
+    """
+    key = f"max_side={DETECT_MAX_SIDE}"
+    cascade = format_cascade(CASCADE)
+    # Cascade par défaut : même clé qu'avant l'option --cascade (entrées existantes réutilisées)
+    if cascade != DEFAULT_CASCADE:
+        key += f";cascade={cascade}"
+    # Backend / optimisations du SSD : int8 (et dans une moindre mesure les autres) ne donne pas
+    # exactement les mêmes boîtes. Configuration demandée, pas le repli éventuel sur eager (qui
+    # demanderait de préparer le backend dans le process HTTP) ; eager sans optimisation : clé inchangée.
+    if any(stage.name == "ssd" for stage in CASCADE) and (SSD_BACKEND != "eager" or SSD_OPTIMIZE):
+        key += f";ssd={'+'.join((SSD_BACKEND,) + tuple(sorted(SSD_OPTIMIZE)))}"
+    return key
+
+
+def lookup_face_cache(content_hash: str) -> Optional[CachedFace]:
+    if _FACE_CACHE is None:
+        return None
+    try:
+        return _FACE_CACHE.get(content_hash, detection_config_key())
+    except Exception as e:
+        print(f"[WARN] Face cache read failed: {e}")
+        return None
+
+
+def store_face_cache(content_hash: str, img: np.ndarray, detection: Optional[FaceDetection]) -> None:
+    if _FACE_CACHE is None:
+        return
+    try:
+        _FACE_CACHE.put(content_hash, detection_config_key(), img.shape[1], img.shape[0], detection)
+    except Exception as e:
+        print(f"[WARN] Face cache write failed: {e}")
+
+
+# -------------------------------------------------
+# Statistiques de la cascade (persistance)
+# -------------------------------------------------
+
+def load_cascade_stats() -> None:
+    if CASCADE_STATS_PATH is None or not CASCADE_STATS_PATH.exists():
+        return
+    try:
+        n = _CASCADE_STATS.load(CASCADE_STATS_PATH)
+        print(f"[INFO] Loaded cascade statistics for {n} source buckets from {CASCADE_STATS_PATH}")
+    except Exception as e:
+        print(f"[WARN] Ignoring cascade statistics {CASCADE_STATS_PATH}: {e}")
+
+
+def save_cascade_stats() -> None:
+    if CASCADE_STATS_PATH is None:
+        return
+    try:
+        _CASCADE_STATS.save(CASCADE_STATS_PATH)
+    except OSError as e:
+        print(f"[WARN] Cascade statistics write failed: {e}")
+
+
+def cascade_stats_saver() -> None:
+    while True:
+        time.sleep(CASCADE_STATS_SAVE_S)
+        save_cascade_stats()
 
 
 # -------------------------------------------------
 # Traitement d'un job
 # -------------------------------------------------
 
-def process_job(job: Dict[str, Any]) -> None:
+class JobError(Exception):
+    """
+    Échec "attendu" d'un job (source absente, image illisible...) : le message sert de raison.
+    """
+
+
+class SourceImage(NamedTuple):
+    """
+    Image source d'un job, lue une seule fois pour toutes ses sorties.
+    img : image BGR décodée (éventuellement réduite) ; cached : entrée du cache des détections.
+    """
+    img: np.ndarray
+    content_hash: str
+    cached: Optional[CachedFace]
+
+
+def read_job_source(job: Dict[str, Any]) -> bytes:
+    # Job synchrone (POST /thumbnail) : octets reçus dans la requête
+    if "data" in job:
+        return job["data"]
+
     src = Path(job["src"])
-    dst = Path(job["dst"])
-    width = int(job["width"])
-    height = int(job["height"])
 
     if not src.is_file():
         print(f"[WARN] Source image not found at processing time: {src}")
-        return
+        raise JobError("Source image not found")
 
-    dst.parent.mkdir(parents=True, exist_ok=True)
+    return src.read_bytes()
+
+
+def choose_decode_factor(
+    data: bytes,
+    outputs: List[Dict[str, Any]],
+    need_detection: bool
+) -> int:
+    """
+    JPEG : plus grand facteur de réduction au décodage (8, 4, 2 ou 1) qui satisfait encore :
+      - chaque sortie : le plus grand crop au ratio demandé reste >= width x height ;
+      - la détection (si elle doit tourner) : plus grand côté >= celui de la cascade
+        (cf. detection_max_side), et pleine résolution s'il vaut 0 ;
+    puis, si besoin, le facteur minimal qui respecte le budget MAX_DECODE_MPIX.
+    Autres formats : toujours 1 (OpenCV décode en pleine résolution avant de réduire : un facteur
+    n'économiserait ni mémoire ni temps), le budget porte sur la pleine résolution.
+    Lève JobError si l'image ne tient pas dans le budget.
+    """
+    size = image_size(data)
+    if size is None:
+        return 1
 
-    img = cv2.imread(str(src), cv2.IMREAD_COLOR)
+    full_w, full_h = size
+    budget = MAX_DECODE_MPIX * 1e6
+    if not is_jpeg(data):
+        if budget > 0 and full_w * full_h > budget:
+            print(f"[WARN] {full_w}x{full_h} image over the decode budget")
+            raise JobError(f"Image too large ({full_w}x{full_h} > {MAX_DECODE_MPIX} Mpix)")
+        return 1
+
+    max_side = detection_max_side()
+
+    def fits(f: int) -> bool:
+        w, h = full_w // f, full_h // f
+        # L'orientation EXIF peut inverser largeur / hauteur : on vérifie les deux sens
+        for ww, hh in ((w, h), (h, w)):
+            for output in outputs:
+                if min(ww / int(output["width"]), hh / int(output["height"])) < 1:
+                    return False
+            if need_detection and (max_side <= 0 or max(ww, hh) < max_side):
+                return False
+        return True
+
+    factor = next((f for f in (8, 4, 2) if fits(f)), 1)
+
+    if budget > 0 and full_w * full_h / factor ** 2 > budget:
+        # Au détriment de la qualité : on respecte le budget
+        factor = next((f for f in (2, 4, 8) if full_w * full_h / f ** 2 <= budget), None)
+        if factor is None:
+            print(f"[WARN] {full_w}x{full_h} image over the decode budget even at 1/8")
+            raise JobError(f"Image too large ({full_w}x{full_h} > {MAX_DECODE_MPIX} Mpix even at 1/8)")
+        print(f"[WARN] {full_w}x{full_h} image over the decode budget, decoding at 1/{factor}")
+
+    return factor
+
+
+def load_job_image(job: Dict[str, Any]) -> SourceImage:
+    """
+    Lit l'image source d'un job : octets -> hash du contenu -> cache des détections,
+    puis décodage au plus petit facteur utile (la détection n'impose rien si elle est en cache).
+    Lève JobError si elle est absente / illisible / hors budget.
+    """
+    data = read_job_source(job)
+    content_hash = hash_bytes(data)
+    cached = lookup_face_cache(content_hash)
+
+    factor = choose_decode_factor(data, job["outputs"], need_detection=cached is None)
+    t0 = time.perf_counter()
+    img = decode_image(data, factor)
+    _METRICS.observe("decode", time.perf_counter() - t0)
     if img is None:
-        print(f"[WARN] Failed to read image: {src}")
+        print(f"[WARN] Failed to read image: {job['src']}")
+        raise JobError("Failed to read image")
+
+    budget = MAX_DECODE_MPIX * 1e6
+    if budget > 0 and img.shape[0] * img.shape[1] > budget:
+        # Format dont l'en-tête n'a pas pu être lu (ou en-tête menteur) : contrôle sur la taille décodée
+        print(f"[WARN] Image over the decode budget: {job['src']}")
+        raise JobError(f"Image too large ({img.shape[1]}x{img.shape[0]} > {MAX_DECODE_MPIX} Mpix)")
+
+    return SourceImage(img, content_hash, cached)
+
+
+def encode_thumbnail(thumb: np.ndarray, ext: str) -> bytes:
+    """Encode un thumbnail au format ext avec les réglages du serveur (THUMB_QUALITY, JPEG_PROGRESSIVE)."""
+    ext = ext.lower()
+    return encode_image(thumb, ext, encoder_params(ext, THUMB_QUALITY.get(ext), JPEG_PROGRESSIVE))
+
+
+def render_thumbnail(
+    img: np.ndarray,
+    width: int,
+    height: int,
+    box: Optional[Tuple[int, int, int, int]],
+    larger: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Crop centré sur le visage (ou fallback) au ratio width/height, puis resize.
+    larger : thumbnail déjà rendu au même ratio et au moins aussi grand (mode pyramide) ; s'il a
+    lui-même été réduit depuis le crop, c'est lui qui est réduit (bien moins de pixels à lire).
+    Un niveau agrandi (crop plus petit que lui) n'apporte rien : on repart du crop.
+    """
+    x1, y1, x2, y2 = compute_thumbnail_crop(img, width, height, box)
+    if larger is not None and larger.shape[1] <= x2 - x1:
+        face = larger
+    else:
+        face = img[y1:y2, x1:x2]
+
+    # Resize vers la taille cible sans déformation de ratio (le crop a déjà le bon ratio)
+    return cv2.resize(face, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def write_thumbnail(
+    output: Dict[str, Any],
+    img: np.ndarray,
+    box: Optional[Tuple[int, int, int, int]],
+    larger: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Rend le thumbnail (cf. render_thumbnail) puis l'encode et l'écrit de façon atomique dans output["dst"],
+    ou, pour une sortie synchrone (pas de dst, format dans output["ext"]), le renvoie à la requête qui l'attend.
+    Retourne le thumbnail rendu (source du niveau suivant en mode pyramide).
+    """
+    dst = Path(output["dst"]) if output.get("dst") else None
+    ext = dst.suffix if dst is not None else output["ext"]
+    width = int(output["width"])
+    height = int(output["height"])
+
+    t0 = time.perf_counter()
+    thumb = render_thumbnail(img, width, height, box, larger)
+    t1 = time.perf_counter()
+    data = encode_thumbnail(thumb, ext)
+    t2 = time.perf_counter()
+    _METRICS.observe("crop_resize", t1 - t0)
+    _METRICS.observe("encode", t2 - t1)
+    _METRICS.inc("thumb_output_bytes_total", ext.lower().lstrip("."), len(data))
+
+    if dst is None:
+        deliver_inline(output["job_id"], data)
+        return thumb
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    # thumb_status.php ne voit jamais un fichier à moitié écrit
+    write_atomic(dst, data)
+    _METRICS.observe("write", time.perf_counter() - t2)
+    print(f"[INFO] Wrote thumbnail {dst} ({len(data)} bytes)")
+    return thumb
+
+
+def deliver_inline(output_id: str, data: bytes) -> None:
+    """Thumbnail synchrone rendu : vers la requête qui l'attend (via le process HTTP depuis un worker)."""
+    if _EVENTS is not None:
+        # Envoyé avant l'évènement "done" de la sortie, sur la même queue : reçu avant lui
+        _EVENTS.put(("inline", os.getpid(), (output_id, data), None))
+    else:
+        store_inline_result(output_id, data)
+
+
+def store_inline_result(output_id: str, data: bytes) -> None:
+    with _completed_cond:
+        if output_id in _inline_results:
+            _inline_results[output_id] = data
+
+
+def pyramid_chains(outputs: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Sorties groupées par ratio exact (ex. 480x600, 960x1200, 1440x1800), de la plus grande à la plus petite."""
+    chains: Dict[Fraction, List[Dict[str, Any]]] = {}
+    for output in outputs:
+        chains.setdefault(Fraction(int(output["width"]), int(output["height"])), []).append(output)
+    return [sorted(chain, key=lambda o: int(o["width"]), reverse=True) for chain in chains.values()]
+
+
+def start_outputs(output_ids: List[str]) -> None:
+    """
+    Début du traitement de sorties : elles passent de "en attente" à "en cours".
+    """
+    for oid in output_ids:
+        _processing_jobs.add(oid)
+        _pending_jobs.discard(oid)
+    if _EVENTS is not None:
+        _EVENTS.put(("start", os.getpid(), output_ids, None))
+    if _JOB_STORE is not None:
+        try:
+            _JOB_STORE.lease(output_ids)
+        except Exception as e:
+            print(f"[WARN] Job store lease failed: {e}")
+
+
+def finish_output(output_id: str, error: Optional[str] = None) -> None:
+    """
+    Fin d'une sortie de job (écrite, ou en échec avec une raison) :
+    elle n'est plus comptée comme en cours, indépendamment des autres sorties du job.
+    Dans un process worker, seul le process HTTP tient l'index des sorties terminées : la fin
+    lui est envoyée (évènement "done"), sans passer par record_completion.
+    """
+    if _EVENTS is not None:
+        _processing_jobs.discard(output_id)
+        _EVENTS.put(("done", os.getpid(), output_id, error))
         return
 
-    # 1. Détection visage (SSD -> YOLO)
-    box = detect_best_face_box(img)
+    record_completion(output_id, error)
+    if _JOB_STORE is not None:
+        try:
+            _JOB_STORE.complete(output_id)
+        except Exception as e:
+            print(f"[WARN] Job store update failed for {output_id}: {e}")
 
-    offset_box_y = 0
-    if box is not None:
-        x1_face, y1_face, x2_face, y2_face = box
-        # Point de focus = centre du visage détecté
-        fx = (x1_face + x2_face) / 2.0
-        fy = (y1_face + y2_face) / 2.0
-        offset_box_y = 0.1
+
+def record_completion(output_id: str, error: Optional[str] = None) -> None:
+    with _completed_cond:
+        _completed_jobs[output_id] = ("failed" if error else "done", error, time.time())
+        _completed_jobs.move_to_end(output_id)
+        while len(_completed_jobs) > STATUS_HISTORY:
+            _completed_jobs.popitem(last=False)
+        # Retirée des sorties en cours avant le réveil : un long-poll réveillé ne la voit plus "processing"
+        _processing_jobs.discard(output_id)
+        _completed_cond.notify_all()
+    _METRICS.inc("thumb_outputs_total", "failed" if error else "done")
+    for listener in _completion_listeners:
+        listener()
+
+
+def output_status(output_id: str) -> Dict[str, Any]:
+    """
+    État d'une sortie : queued / processing (file courante), done / failed (index des sorties terminées),
+    unknown sinon (jamais vue, ou oubliée de l'index).
+    Une sortie ré-enfilée après un échec repasse en queued.
+
+    Les transitions ajoutent le nouvel état avant de retirer l'ancien : en testant dans l'ordre
+    du cycle de vie, une sortie n'est jamais vue "unknown" pendant un changement d'état.
+    """
+    if output_id in _pending_jobs:
+        return {"status": "queued"}
+    if output_id in _processing_jobs:
+        return {"status": "processing"}
+    with _completed_cond:
+        entry = _completed_jobs.get(output_id)
+    if entry is None:
+        return {"status": "unknown"}
+    status, error, finished_at = entry
+    info = {"status": status, "finished_at": finished_at}
+    if error:
+        info["error"] = error
+    return info
+
+
+def is_finished(statuses: Dict[str, Dict[str, Any]]) -> bool:
+    """Vrai si au moins une des sorties n'est plus queued / processing (fin d'un long-poll)."""
+    return any(st["status"] not in ("queued", "processing") for st in statuses.values())
+
+
+def wait_output_statuses(output_ids: List[str], timeout: float) -> Dict[str, Dict[str, Any]]:
+    """
+    Long-poll : attend au plus timeout secondes qu'au moins une des sorties ne soit plus
+    queued / processing, puis retourne l'état de toutes.
+    """
+    deadline = time.monotonic() + timeout
+    with _completed_cond:
+        while True:
+            statuses = {oid: output_status(oid) for oid in output_ids}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or is_finished(statuses):
+                return statuses
+            _completed_cond.wait(remaining)
+
+
+def fail_job(job: Dict[str, Any], reason: str) -> None:
+    for output in job["outputs"]:
+        finish_output(output["job_id"], reason)
+
+
+def write_outputs(
+    job: Dict[str, Any],
+    img: np.ndarray,
+    detection: Optional[FaceDetection]
+) -> None:
+    """
+    Écrit toutes les sorties d'un job à partir de la même image décodée et de la même détection.
+    L'échec d'une sortie n'empêche pas les suivantes.
+
+    Mode pyramide (champ pyramid du job, sinon PYRAMID) : les sorties de même ratio partagent un seul
+    crop ; la plus grande est réduite depuis le crop, chacune des suivantes depuis la précédente
+    (3x -> 2x -> 1x), au lieu d'un resize du crop pleine résolution par taille.
+    """
+    box = detection.box if detection is not None else None
+    if job.get("pyramid", PYRAMID):
+        chains = pyramid_chains(job["outputs"])
     else:
-        h, w = img.shape[:2]
-        # Fallback : point de focus par défaut (50% largeur, 30% hauteur)
-        fx = w * 0.5
-        fy = h * 0.3
+        chains = [[output] for output in job["outputs"]]
 
-    # 2. On calcule un crop minimal au bon ratio centré sur ce point
-    x1, y1, x2, y2 = compute_focus_box(img, width, height, fx, fy, offset_box_y=offset_box_y)
-    face = img[y1:y2, x1:x2]
+    for chain in chains:
+        larger = None
+        for output in chain:
+            try:
+                larger = write_thumbnail(output, img, box, larger)
+            except Exception as e:
+                print(f"[ERROR] Exception while writing output {output['job_id']} of job {job['job_id']}: {e}")
+                finish_output(output["job_id"], str(e))
+            else:
+                finish_output(output["job_id"])
 
-    # 3. Resize vers la taille cible sans déformation de ratio (le crop a déjà le bon ratio)
-    thumb = cv2.resize(face, (width, height), interpolation=cv2.INTER_AREA)
-    cv2.imwrite(str(dst), thumb)
-    print(f"[INFO] Wrote thumbnail {dst}")
+
+def process_job(job: Dict[str, Any]) -> None:
+    process_jobs([job], batched=False)
+
+
+def process_jobs(jobs: List[Dict[str, Any]], batched: bool = True) -> None:
+    """
+    Traite un lot de jobs : lecture de toutes les images, une détection batchée
+    (hors images déjà présentes dans le cache), puis crop / resize / écriture de chaque sortie.
+    Si la détection batchée échoue, on retombe sur un traitement job par job
+    pour qu'une image problématique n'emporte pas tout le lot.
+    """
+    loaded: List[Tuple[Dict[str, Any], SourceImage]] = []
+    for job in jobs:
+        try:
+            loaded.append((job, load_job_image(job)))
+        except JobError as e:
+            fail_job(job, str(e))
+        except Exception as e:
+            print(f"[ERROR] Exception while reading job {job['job_id']}: {e}")
+            fail_job(job, str(e))
+
+    if loaded:
+        process_loaded_jobs(loaded, batched)
+
+
+def process_loaded_jobs(loaded: List[Tuple[Dict[str, Any], SourceImage]], batched: bool = True) -> None:
+    """
+    Suite de process_jobs, images déjà lues et décodées : détection puis écriture des sorties.
+    """
+    # 1. Détection visage (cache -> SSD -> YOLO), une seule fois pour toutes les sorties d'un job
+    detections: List[Optional[FaceDetection]] = [None] * len(loaded)
+    misses = []
+    for i, (_, source) in enumerate(loaded):
+        if source.cached is not None:
+            detections[i] = source.cached.scaled_to(source.img.shape[1], source.img.shape[0])
+        else:
+            misses.append(i)
+
+    retried = set()
+    if misses:
+        imgs = [loaded[i][1].img for i in misses]
+        try:
+            if batched:
+                found, partial = run_cascade(imgs)
+            else:
+                found, partial = [], []
+                for img in imgs:
+                    detection, skipped = run_cascade([img])
+                    found += detection
+                    partial += skipped
+        except Exception as e:
+            if not batched:
+                raise
+            print(f"[ERROR] Batched detection failed for {len(imgs)} jobs, retrying one by one: {e}")
+            retried = set(misses)
+            found, partial = [], []
+            for i in misses:
+                job = loaded[i][0]
+                try:
+                    # Image déjà décodée : seule la détection est refaite
+                    process_loaded_jobs([loaded[i]], batched=False)
+                except Exception as e:
+                    print(f"[ERROR] Exception while processing job {job['job_id']}: {e}")
+                    fail_job(job, str(e))
+
+        for i, detection, skipped in zip(misses, found, partial):
+            detections[i] = detection
+            # Étapes sautées (--cascade-skip-below) : pas de verdict définitif à garder pour ce contenu,
+            # la prochaine lecture refait la cascade (complète si les statistiques ont changé)
+            if not skipped:
+                store_face_cache(loaded[i][1].content_hash, loaded[i][1].img, detection)
+
+    # 2. Crop / resize / écriture de chaque sortie
+    for i, ((job, source), detection) in enumerate(zip(loaded, detections)):
+        if i not in retried:
+            # Détection lue dans le cache (visage ou non) : aucune étape de la cascade n'a tourné pour ce job
+            if source.cached is not None:
+                _METRICS.inc("thumb_detections_total", "cache")
+            else:
+                _METRICS.inc("thumb_detections_total", detection.detector if detection is not None else "fallback")
+            if _FACE_CACHE is not None:
+                _METRICS.inc("thumb_face_cache_total", "hit" if source.cached is not None else "miss")
+            write_outputs(job, source.img, detection)
+
+
+def take_job_batch(source) -> List[Dict[str, Any]]:
+    """
+    Bloque jusqu'au premier job de source (JobQueue ou multiprocessing.Queue),
+    puis draine jusqu'à BATCH_MAX_JOBS ou jusqu'à ce que BATCH_WAIT_MS se soient écoulées.
+    """
+    jobs = [source.get()]
+    deadline = time.monotonic() + BATCH_WAIT_MS / 1000.0
+
+    while len(jobs) < BATCH_MAX_JOBS:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining > 0:
+                jobs.append(source.get(timeout=remaining))
+            else:
+                jobs.append(source.get_nowait())
+        except queue.Empty:
+            break
+
+    return jobs
+
+
+def run_job_batch(jobs: List[Dict[str, Any]]) -> None:
+    oids = [output["job_id"] for job in jobs for output in job["outputs"]]
+    start_outputs(oids)
+
+    now = time.time()
+    for job in jobs:
+        if "enqueued_at" in job:
+            _METRICS.observe("queue_wait", max(0.0, now - job["enqueued_at"]))
+
+    try:
+        process_jobs(jobs)
+    except Exception as e:
+        print(f"[ERROR] Exception while processing jobs {[job['job_id'] for job in jobs]}: {e}")
+    finally:
+        # Sorties non terminées (exception inattendue) : on les marque en échec
+        for oid in oids:
+            if oid in _processing_jobs:
+                finish_output(oid, "Internal error")
+        if _EVENTS is not None:
+            snapshot = _METRICS.take()
+            if snapshot is not None:
+                _EVENTS.put(("metrics", os.getpid(), snapshot, None))
+            delta = _CASCADE_STATS.take()
+            if delta is not None:
+                _EVENTS.put(("cascade", os.getpid(), delta, None))
 
 
 def worker_loop() -> None:
     while True:
-        job = _job_queue.get()
-        jid = job.get("job_id")
+        run_job_batch(take_job_batch(_job_queue))
+
+
+# -------------------------------------------------
+# Pool de workers multi-process
+# -------------------------------------------------
+
+def worker_process_main(tasks, events, threads: int, warmup: bool) -> None:
+    """
+    Point d'entrée d'un process worker (forké après chargement des modèles).
+    Un worker remplacé est forké depuis le process HTTP en marche : tout verrou copié au fork peut
+    être pris par un autre thread. Le worker recrée ceux qu'il utilise et ne touche pas à l'état
+    des sorties du process HTTP (index des terminées, long-polls), qu'il alimente par évènements.
+    """
+    global _EVENTS, _JOB_STORE, _METRICS, _DETECTORS_LOCK
+    _EVENTS = events
+    # La file persistante est tenue par le process HTTP (qui reçoit les évènements)
+    _JOB_STORE = None
+    # Métriques copiées au fork : le worker repart d'un Metrics neuf et n'envoie que les siennes
+    _METRICS = Metrics()
+    # Statistiques de la cascade : le worker garde celles apprises jusqu'au fork et envoie les siennes
+    _CASCADE_STATS.after_fork()
+    _DETECTORS_LOCK = threading.Lock()
+    for detector in _DETECTORS.values():
+        if hasattr(detector, "after_fork"):
+            detector.after_fork()
+    if _FACE_CACHE is not None:
+        _FACE_CACHE.after_fork()
+    # Copies de l'état du process HTTP : _processing_jobs ne suit plus que les sorties du lot en cours
+    _pending_jobs.clear()
+    _processing_jobs.clear()
+    _completion_listeners.clear()
+
+    # Ctrl+C est géré par le process HTTP, qui emporte les workers (daemon)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Forké après le démarrage du serveur : les handlers asyncio (aiohttp) hérités
+    # rendraient le worker insensible au SIGTERM de terminate() à l'arrêt
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+
+    import torch  # déjà chargé par le SSD avant le fork
 
-        if jid is not None:
-            _pending_jobs.discard(jid)
-            _processing_jobs.add(jid)
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
 
+    # Chauffe après le fork : pools de threads OpenMP / oneDNN (et CUDA pour YOLO) propres à ce process
+    t0 = time.monotonic()
+    error = None
+    if warmup and _STARTUP_ERROR is None:
         try:
-            process_job(job)
+            warm_up_detectors()
         except Exception as e:
-            print(f"[ERROR] Exception while processing job {jid}: {e}")
-        finally:
-            if jid is not None:
-                _processing_jobs.discard(jid)
-            _job_queue.task_done()
+            error = str(e)
+    _EVENTS.put(("ready", os.getpid(), round(time.monotonic() - t0, 3), error))
+
+    # Un lot à la fois, demandé une fois libre : cf. WorkerPool
+    parent = os.getppid()
+    while True:
+        _EVENTS.put(("want", os.getpid(), None, None))
+        while True:
+            try:
+                jobs = tasks.get(timeout=1.0)
+                break
+            except queue.Empty:
+                # Process HTTP tué sans atexit (SIGTERM, SIGKILL) : le worker ne lui survit pas
+                if os.getppid() != parent:
+                    return
+        run_job_batch(jobs)
+
+
+class WorkerPool:
+    """
+    N process workers forkés depuis le process HTTP.
+
+    - un thread "dispatch" forme les lots depuis _job_queue (take_job_batch), un lot par demande
+      ("want") d'un worker libre, envoyé dans la queue propre à ce worker. Aucun job n'attend côté
+      workers : l'ordre de _job_queue (voies, anti-famine, promotions) décide jusqu'au dernier moment,
+      et un job interactif n'attend au plus que les lots déjà en cours ;
+    - un thread "events" applique l'avancement remonté par les workers à _pending_jobs /
+      _processing_jobs, et remplace un worker mort : ses sorties en cours sont marquées en échec,
+      un lot reçu mais pas commencé est remis en file (fork depuis ce thread : cf. worker_process_main
+      pour ce que le worker réinitialise). Une queue par worker : un worker tué pendant un get()
+      garderait le verrou de lecture d'une queue partagée.
+    """
+
+    def __init__(self, n: int, threads: int, warmup: bool = True):
+        self.n = n
+        self.threads = threads
+        self.warmup = warmup
+        # Workers du démarrage pas encore chauffés (None une fois tous prêts, cf. _worker_ready)
+        self.starting: Optional[Set[int]] = set()
+        self.warmup_s = 0.0
+        self.ctx = mp.get_context("fork")
+        self.events = self.ctx.Queue()
+        self.procs: Dict[int, Any] = {}
+        self.inflight: Dict[int, Set[str]] = {}
+        # Protégés par _idle_cond : queue de lots de chaque worker, workers qui ont demandé un lot
+        # pas encore formé, lot envoyé à un worker qui ne l'a pas encore commencé
+        self._idle_cond = threading.Condition()
+        self.tasks: Dict[int, Any] = {}
+        self.idle: Set[int] = set()
+        self.sent: Dict[int, List[Dict[str, Any]]] = {}
+        self.stopping = False
+
+    def start(self) -> None:
+        for _ in range(self.n):
+            self._spawn()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+        threading.Thread(target=self._events_loop, daemon=True).start()
+
+    def queue_size(self) -> int:
+        """Jobs envoyés à un worker, pas encore commencés."""
+        with self._idle_cond:
+            return sum(len(jobs) for jobs in self.sent.values())
+
+    def _spawn(self) -> None:
+        tasks = self.ctx.Queue()
+        p = self.ctx.Process(
+            target=worker_process_main,
+            args=(tasks, self.events, self.threads, self.warmup),
+            daemon=True,
+        )
+        p.start()
+        with self._idle_cond:
+            self.tasks[p.pid] = tasks
+        self.procs[p.pid] = p
+        self.inflight[p.pid] = set()
+        if self.starting is not None:
+            self.starting.add(p.pid)
+        print(f"[INFO] Started worker process {p.pid} ({self.threads} threads)")
+
+    def stop(self) -> None:
+        """Arrête les workers sans les remplacer (le thread dispatch peut rester bloqué sur _job_queue)."""
+        with self._idle_cond:
+            self.stopping = True
+            self._idle_cond.notify_all()
+        procs = list(self.procs.values())
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join(timeout=10)
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._idle_cond:
+                while not self.idle and not self.stopping:
+                    self._idle_cond.wait()
+                if self.stopping:
+                    return
+                pid = self.idle.pop()
+            jobs = take_job_batch(_job_queue)
+            with self._idle_cond:
+                tasks = self.tasks.get(pid)
+                if tasks is not None:
+                    self.sent[pid] = jobs
+                    tasks.put(jobs)
+            if tasks is None:
+                # Worker mort entre sa demande et l'envoi : le lot retourne en file
+                for job in jobs:
+                    _job_queue.put(job)
+
+    def _events_loop(self) -> None:
+        last_check = time.monotonic()
+        while not self.stopping:
+            try:
+                kind, pid, payload, error = self.events.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+
+            if kind == "start":
+                with self._idle_cond:
+                    self.sent.pop(pid, None)
+                start_outputs(payload)
+                if pid in self.inflight:
+                    self.inflight[pid].update(payload)
+            elif kind == "done":
+                finish_output(payload, error)
+                self.inflight.get(pid, set()).discard(payload)
+            elif kind == "metrics":
+                _METRICS.merge(payload)
+            elif kind == "cascade":
+                _CASCADE_STATS.merge(payload)
+            elif kind == "inline":
+                store_inline_result(*payload)
+            elif kind == "ready":
+                self._worker_ready(pid, payload, error)
+            elif kind == "want":
+                with self._idle_cond:
+                    self.idle.add(pid)
+                    self._idle_cond.notify()
+
+            if time.monotonic() - last_check >= 1.0:
+                last_check = time.monotonic()
+                self._check_workers()
+
+    def _worker_ready(self, pid: int, warmup_s: float, error: Optional[str]) -> None:
+        """Worker chauffé ; le serveur est prêt quand tous ceux du démarrage le sont."""
+        if error is not None:
+            print(f"[ERROR] Worker process {pid} warm-up failed: {error}")
+        if self.starting is None:
+            return
+        self.starting.discard(pid)
+        self.warmup_s = max(self.warmup_s, warmup_s)
+        if error is not None:
+            set_startup_error(f"Warm-up failed: {error}")
+        if not self.starting:
+            self.starting = None
+            if self.warmup:
+                _STARTUP_TIMES["warmup_s"] = self.warmup_s
+            startup_complete()
+
+    def _check_workers(self) -> None:
+        for pid, p in list(self.procs.items()):
+            if p.is_alive() or self.stopping:
+                continue
+            print(f"[ERROR] Worker process {pid} died (exit code {p.exitcode}), restarting")
+            for oid in self.inflight.pop(pid, set()):
+                finish_output(oid, "Worker process crashed")
+            del self.procs[pid]
+            with self._idle_cond:
+                self.idle.discard(pid)
+                del self.tasks[pid]
+                unstarted = self.sent.pop(pid, [])
+            for job in unstarted:
+                _job_queue.put(job)
+            if self.starting is not None:
+                self.starting.discard(pid)
+            self._spawn()
 
 
 # -------------------------------------------------
 # API HTTP
 # -------------------------------------------------
 
-@app.route("/enqueue", methods=["POST"])
-def enqueue():
+def parse_job(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Valide un job reçu en JSON et le normalise sous la forme :
+    {"job_id": ..., "src": ..., "outputs": [{"job_id", "width", "height", "dst"}, ...]}
+
+    Deux formes acceptées :
+      - simple : {job_id, src, dst, width, height} -> une sortie dont l'id est job_id ;
+      - multi-tailles : {job_id, src, outputs: [{width, height, dst, job_id?}, ...]}
+        (id de sortie par défaut : "<job_id>:<width>x<height>").
+    Champs optionnels : priority, "interactive" (défaut) ou "background" ; pyramid (booléen, défaut
+    --pyramid), cf. write_outputs.
+
+    Retourne (job, None) ou (None, message d'erreur).
+    """
+    job_id = data.get("job_id")
+    src = data.get("src")
+    raw_outputs = data.get("outputs")
+    priority = data.get("priority") or INTERACTIVE
+
+    if raw_outputs is None:
+        raw_outputs = [{
+            "job_id": job_id,
+            "dst": data.get("dst"),
+            "width": data.get("width"),
+            "height": data.get("height"),
+        }]
+
+    # Vérif présence de base
+    if not job_id or not src or not isinstance(raw_outputs, list) or not raw_outputs:
+        return None, "Missing parameters"
+    if not isinstance(job_id, str):
+        return None, "Invalid job_id"
+    if priority not in LANES:
+        return None, "Invalid priority"
+    if not isinstance(data.get("pyramid", False), bool):
+        return None, "Invalid pyramid"
+
+    outputs = []
+    seen = set()
+    for raw in raw_outputs:
+        if not isinstance(raw, dict) or not all([raw.get("dst"), raw.get("width"), raw.get("height")]):
+            return None, "Missing parameters"
+        try:
+            width = int(raw["width"])
+            height = int(raw["height"])
+        except (TypeError, ValueError):
+            return None, "Invalid width / height"
+        if width <= 0 or height <= 0:
+            return None, "Invalid width / height"
+        # Id de sortie : clé du statut, de la file persistante et du nom de fichier côté PHP
+        if raw.get("job_id") is not None and (not isinstance(raw["job_id"], str) or not raw["job_id"]):
+            return None, "Invalid job_id"
+
+        oid = raw.get("job_id") or f"{job_id}:{width}x{height}"
+        if oid in seen:
+            continue
+        seen.add(oid)
+        outputs.append({"job_id": oid, "width": width, "height": height, "dst": raw["dst"]})
+
+    job = {"job_id": job_id, "src": src, "outputs": outputs, "priority": priority}
+    if "pyramid" in data:
+        job["pyramid"] = data["pyramid"]
+    return job, None
+
+
+# Handlers indépendants du framework HTTP : Flask ci-dessous, aiohttp dans async_server.py.
+# Chacun retourne (réponse JSON, code HTTP).
+
+def is_loopback(address: Optional[str]) -> bool:
+    """Adresse IP (ou nom "localhost") de la boucle locale, y compris IPv4 mappée en IPv6."""
+    if address == "localhost":
+        return True
+    try:
+        ip = ipaddress.ip_address(address or "")
+    except ValueError:
+        return False
+    mapped = getattr(ip, "ipv4_mapped", None)
+    return (mapped or ip).is_loopback
+
+
+def check_path_jobs_client(remote: Optional[str]) -> Optional[Tuple[Dict[str, Any], int]]:
+    """
+    Refuse (403) un job par chemin venant d'un client non local si PATH_JOBS_LOCAL_ONLY.
+    Retourne la réponse d'erreur, ou None si le client est accepté.
+    """
+    if PATH_JOBS_LOCAL_ONLY and not is_loopback(remote):
+        return {"ok": False, "error": "Path-based jobs are only accepted from localhost"}, 403
+    return None
+
+
+def handle_enqueue(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
     """
-    Reçoit un job JSON :
+    Reçoit un job JSON, forme simple :
     {
       "job_id": "...",
       "src": "/abs/path/to/source.jpg",
@@ -238,66 +1403,657 @@ def enqueue():
       "height": 600
     }
 
-    Si job_id déjà en attente ou en cours → ne pas le rajouter.
+    ou multi-tailles (une seule lecture + une seule détection pour toutes les sorties) :
+    {
+      "job_id": "...",
+      "src": "/abs/path/to/source.jpg",
+      "outputs": [
+        {"job_id": "...", "dst": "/abs/path/to/grid.webp", "width": 240, "height": 300},
+        {"job_id": "...", "dst": "/abs/path/to/detail.webp", "width": 480, "height": 600}
+      ]
+    }
+
+    Champ optionnel "priority" : "interactive" (défaut, un visiteur attend le thumbnail) ou "background"
+    (pré-génération) ; les jobs interactifs sont toujours servis en premier.
+
+    Les sorties déjà en attente ou en cours (même id) ne sont pas rajoutées ; une sortie en attente
+    en voie background ré-enfilée en interactive est remontée (status "reprioritized").
+    Les nouvelles sont enregistrées dans la file persistante avant la réponse.
     """
-    data = request.get_json(silent=True) or {}
+    job, error = validate_job(data)
+    if job is None:
+        return error
 
-    job_id = data.get("job_id")
-    src = data.get("src")
-    dst = data.get("dst")
-    width = data.get("width")
-    height = data.get("height")
+    statuses = enqueue_jobs([job])[0]
+    return {"ok": True, "status": enqueue_summary(statuses), "outputs": statuses}, 200
 
-    # Vérif présence de base
-    if not all([job_id, src, dst, width, height]):
-        return jsonify({"ok": False, "error": "Missing parameters"}), 400
+
+def handle_enqueue_batch(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Plusieurs jobs en une requête (rendu d'une page entière côté PHP) :
+    {"jobs": [<job au format de /enqueue>, ...]}
+
+    Validation, dédoublonnage et enregistrement en une passe (une transaction SQLite).
+    Un job invalide n'empêche pas les autres. Réponse, dans l'ordre des jobs reçus :
+    {"ok": true, "jobs": [{"job_id": "...", "ok": true, "status": "queued|already_queued|reprioritized", "outputs": {...}},
+                          {"job_id": "...", "ok": false, "error": "...", "code": 404}, ...]}
+    """
+    raw_jobs = data.get("jobs")
+    if not isinstance(raw_jobs, list) or not raw_jobs:
+        return {"ok": False, "error": "Missing or invalid jobs"}, 400
+    if len(raw_jobs) > ENQUEUE_BATCH_MAX:
+        return {"ok": False, "error": f"Too many jobs (max {ENQUEUE_BATCH_MAX})"}, 400
+
+    results: List[Dict[str, Any]] = []
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    for raw in raw_jobs:
+        job_id = raw.get("job_id") if isinstance(raw, dict) else None
+        job, error = validate_job(raw if isinstance(raw, dict) else {})
+        if job is None:
+            payload, code = error
+            results.append({**payload, "job_id": job_id, "code": code})
+        else:
+            valid.append((len(results), job))
+            results.append({})
+
+    for (i, job), statuses in zip(valid, enqueue_jobs([job for _, job in valid])):
+        results[i] = {"job_id": job["job_id"], "ok": True, "status": enqueue_summary(statuses), "outputs": statuses}
+
+    return {"ok": True, "jobs": results}, 200
+
+
+def validate_job(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Dict[str, Any], int]]]:
+    """
+    parse_job + existence de la source. Retourne (job, None) ou (None, (réponse d'erreur, code HTTP)).
+    """
+    job, error = parse_job(data)
+    if job is None:
+        return None, ({"ok": False, "error": error}, 400)
 
     # Vérif que le fichier source existe AVANT d'enqueuer
-    if not Path(src).is_file():
-        return jsonify({
+    if not Path(job["src"]).is_file():
+        return None, ({
             "ok": False,
             "error": "Source image not found",
-            "src": src
-        }), 404
+            "src": job["src"]
+        }, 404)
 
-    # Éviter les doublons
-    if job_id in _pending_jobs or job_id in _processing_jobs:
-        return jsonify({"ok": True, "status": "already_queued"})
+    return job, None
 
-    _pending_jobs.add(job_id)
-    _job_queue.put({
-        "job_id": job_id,
-        "src": src,
-        "dst": dst,
-        "width": width,
-        "height": height,
-    })
 
-    return jsonify({"ok": True, "status": "queued"})
+def enqueue_jobs(jobs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Dédoublonne (par sortie, y compris entre jobs d'un même lot), enregistre dans la file persistante
+    et enfile des jobs validés. Retourne, pour chaque job, le statut de ses sorties
+    (queued / already_queued / reprioritized).
 
+    Les jobs d'un même lot qui partagent la même source (et la même priorité) sont fusionnés en un seul
+    job multi-sorties (une seule lecture + une seule détection).
 
-@app.route("/health", methods=["GET"])
-def health():
-    """Petit endpoint pour vérifier que le serveur tourne."""
-    return jsonify({
+    Une sortie déjà en file en voie background, ré-enfilée par un job interactif, passe en voie
+    interactive (reprioritized) : un visiteur l'attend désormais.
+    """
+    results = []
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    # Date d'entrée en file (temps d'attente dans /metrics), conservée par la file persistante
+    now = time.time()
+    with _enqueue_lock:
+        seen = set()
+        for job in jobs:
+            statuses = {}
+            for output in job["outputs"]:
+                oid = output["job_id"]
+                if oid in _pending_jobs and job["priority"] == INTERACTIVE and _job_queue.promote(oid):
+                    statuses[oid] = "reprioritized"
+                    if _JOB_STORE is not None:
+                        try:
+                            _JOB_STORE.set_priority(oid, INTERACTIVE)
+                        except Exception as e:
+                            # Promotion perdue au redémarrage seulement (le job est rejoué en background)
+                            print(f"[WARN] Job store priority update failed for {oid}: {e}")
+                elif oid in _pending_jobs or oid in _processing_jobs or oid in seen:
+                    statuses[oid] = "already_queued"
+                else:
+                    statuses[oid] = "queued"
+                    seen.add(oid)
+                    key = (job["src"], job["priority"])
+                    merged.setdefault(key, {**job, "outputs": [], "enqueued_at": now})["outputs"].append(output)
+            results.append(statuses)
+
+        new_jobs = list(merged.values())
+        if new_jobs and _JOB_STORE is not None:
+            try:
+                _JOB_STORE.add_many(new_jobs)
+            except Exception as e:
+                # Les jobs restent traités, mais ne survivront pas à un redémarrage
+                print(f"[WARN] Job store write failed for {len(new_jobs)} jobs: {e}")
+
+        for job in new_jobs:
+            for output in job["outputs"]:
+                _pending_jobs.add(output["job_id"])
+            _job_queue.put(job)
+
+    return results
+
+
+def enqueue_summary(statuses: Dict[str, str]) -> str:
+    """Statut global d'un job : queued si au moins une sortie a été ajoutée, sinon reprioritized si au moins une
+    a changé de voie."""
+    for status in ("queued", "reprioritized"):
+        if status in statuses.values():
+            return status
+    return "already_queued"
+
+
+def parse_inline_request(
+    body: bytes,
+    params: Mapping[str, str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Dict[str, Any], int]]]:
+    """
+    POST /thumbnail : octets de l'image dans le corps, width / height (et format, défaut webp) en paramètres
+    d'URL. Retourne (job synchrone, None) ou (None, (réponse d'erreur, code HTTP)).
+    """
+    if not body:
+        return None, ({"ok": False, "error": "Missing image body"}, 400)
+    if len(body) > INLINE_MAX_BYTES:
+        return None, ({"ok": False, "error": f"Image too large (max {INLINE_MAX_BYTES} bytes)"}, 413)
+    try:
+        width = int(params.get("width", 0))
+        height = int(params.get("height", 0))
+    except (TypeError, ValueError):
+        width = height = 0
+    if width <= 0 or height <= 0:
+        return None, ({"ok": False, "error": "Invalid width / height"}, 400)
+    ext = "." + str(params.get("format") or "webp").lower().lstrip(".")
+    if ext not in INLINE_FORMATS or not can_encode(ext):
+        return None, ({"ok": False, "error": f"Unsupported format: {ext}"}, 415)
+
+    oid = f"inline:{uuid.uuid4().hex}"
+    output = {"job_id": oid, "width": width, "height": height, "ext": ext}
+    return {"job_id": oid, "src": "<inline>", "data": body, "outputs": [output], "priority": INTERACTIVE}, None
+
+
+def submit_inline_job(job: Dict[str, Any]) -> str:
+    """
+    Enfile un job synchrone en voie interactive, hors file persistante (le client attend la réponse :
+    rien à rejouer après un redémarrage). Retourne l'id de sa sortie, à attendre avant inline_response.
+    """
+    oid = job["outputs"][0]["job_id"]
+    job["enqueued_at"] = time.time()
+    with _completed_cond:
+        _inline_results[oid] = None
+    with _enqueue_lock:
+        _pending_jobs.add(oid)
+        _job_queue.put(job)
+    return oid
+
+
+def discard_inline_result(output_id: str) -> None:
+    """Requête synchrone abandonnée (timeout, client parti) : son rendu, s'il arrive, sera ignoré."""
+    with _completed_cond:
+        _inline_results.pop(output_id, None)
+
+
+def inline_response(job: Dict[str, Any], status: Dict[str, Any]) -> Tuple[Optional[bytes], Dict[str, Any], int]:
+    """
+    Réponse à un POST /thumbnail une fois l'attente terminée (status : état de sa sortie) :
+    (octets, en-têtes, 200) si le thumbnail est prêt, sinon (None, réponse JSON d'erreur, code HTTP).
+    """
+    output = job["outputs"][0]
+    with _completed_cond:
+        data = _inline_results.pop(output["job_id"], None)
+    if status["status"] == "done" and data is not None:
+        return data, {"Content-Type": INLINE_FORMATS[output["ext"]]}, 200
+    if status["status"] == "failed":
+        return None, {"ok": False, "error": status.get("error", "Failed")}, 422
+    return None, {"ok": False, "error": "Timed out", "status": status["status"]}, 504
+
+
+def parse_status_query(ids: Any, wait: Any) -> Tuple[Optional[List[str]], float, Optional[str]]:
+    """
+    Valide les paramètres de /status. Retourne (ids, wait, None) ou (None, 0, message d'erreur).
+    """
+    if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+        return None, 0.0, "Missing or invalid job_ids"
+    if len(ids) > STATUS_MAX_IDS:
+        return None, 0.0, f"Too many job_ids (max {STATUS_MAX_IDS})"
+    try:
+        wait = min(max(0.0, float(wait)), STATUS_WAIT_MAX)
+    except (TypeError, ValueError):
+        return None, 0.0, "Invalid wait"
+    return ids, wait, None
+
+
+def health_payload() -> Dict[str, Any]:
+    return {
         "ok": True,
         "pending": len(_pending_jobs),
         "processing": len(_processing_jobs),
         "processing_jobs": list(_processing_jobs),
-        "queue_size": _job_queue.qsize(),
-    })
+        "queue_size": _job_queue.qsize() + (_POOL.queue_size() if _POOL is not None else 0),
+        "queue_lanes": _job_queue.lane_sizes(),
+        "workers": WORKERS,
+        "job_store": _JOB_STORE is not None,
+        "cascade": format_cascade(CASCADE),
+        "ready": _READY.is_set(),
+    }
+
+
+def ready_payload() -> Tuple[Dict[str, Any], int]:
+    """
+    Sonde de disponibilité : 200 quand les modèles sont chargés et chauffés et les workers démarrés,
+    503 avant (ou si le chargement a échoué, avec l'erreur). Les enqueues sont acceptés dans tous les cas.
+    """
+    payload: Dict[str, Any] = {"ready": _READY.is_set(), "startup": dict(_STARTUP_TIMES)}
+    if _STARTUP_ERROR is not None:
+        payload["error"] = _STARTUP_ERROR
+    return payload, 200 if payload["ready"] else 503
+
+
+def cascade_payload() -> Dict[str, Any]:
+    """
+    Statistiques apprises par la cascade, par bucket de source (essais, taux de succès, coût moyen
+    par étape) avec le plan qui en découle hors sonde : ordre des étapes et étapes sautées.
+    En mode multi-process : cumul de tous les workers (chacun planifie sur ses propres mesures).
+    """
+    buckets = {}
+    for bucket, stages in _CASCADE_STATS.snapshot().items():
+        order, skipped = _CASCADE_STATS.plan(bucket, CASCADE, CASCADE_ADAPTIVE, CASCADE_SKIP_BELOW,
+                                             CASCADE_MIN_SAMPLES, probe_every=0)
+        buckets[bucket] = {"stages": stages, "order": [s.label for s in order],
+                           "skipped": [s.label for s in skipped]}
+    return {
+        "cascade": format_cascade(CASCADE),
+        "adaptive": CASCADE_ADAPTIVE,
+        "skip_below": CASCADE_SKIP_BELOW,
+        "min_samples": CASCADE_MIN_SAMPLES,
+        "buckets": buckets,
+    }
+
+
+def metrics_text() -> str:
+    """Métriques au format texte Prometheus : histogrammes par étape, compteurs, et jauges lues à l'instant."""
+    gauges = [("thumb_queue_jobs", "Jobs waiting in the in-memory queue.", {"lane": lane}, n)
+              for lane, n in _job_queue.lane_sizes().items()]
+    if _POOL is not None:
+        gauges.append(("thumb_pool_buffer_jobs", "Jobs handed to worker processes, not started yet.", {},
+                       _POOL.queue_size()))
+    gauges += [
+        ("thumb_pending_outputs", "Outputs queued, not started.", {}, len(_pending_jobs)),
+        ("thumb_inflight_outputs", "Outputs being processed.", {}, len(_processing_jobs)),
+        ("thumb_workers", "Worker processes (0 = one worker thread).", {}, WORKERS),
+        ("thumb_status_index_outputs", "Finished outputs remembered by /status.", {}, len(_completed_jobs)),
+    ]
+    return _METRICS.render(
+        ("thumb_stage_seconds", "stage", "Time per pipeline stage (queue_wait, decode, cascade stages "
+                                         "such as ssd / yolo, crop_resize, encode, write), per job or per output."),
+        {
+            "thumb_detections_total": ("detector", "Jobs by cascade stage that produced the crop focus (cache = detection cache hit)."),
+            "thumb_face_cache_total": ("result", "Detection cache lookups."),
+            "thumb_outputs_total": ("status", "Finished outputs."),
+            "thumb_output_bytes_total": ("format", "Bytes of thumbnails written, by output format."),
+            "thumb_cascade_tried_total": ("stage", "Images run through a cascade stage."),
+            "thumb_cascade_hits_total": ("stage", "Faces found by a cascade stage."),
+            "thumb_cascade_skipped_total": ("stage", "Images for which a low hit-rate stage was skipped."),
+        },
+        gauges,
+    )
+
+
+@app.route("/enqueue", methods=["POST"])
+def enqueue():
+    """Voir handle_enqueue."""
+    payload, code = (check_path_jobs_client(request.remote_addr)
+                     or handle_enqueue(request.get_json(silent=True) or {}))
+    return jsonify(payload), code
+
+
+@app.route("/enqueue_batch", methods=["POST"])
+def enqueue_batch():
+    """Voir handle_enqueue_batch."""
+    payload, code = (check_path_jobs_client(request.remote_addr)
+                     or handle_enqueue_batch(request.get_json(silent=True) or {}))
+    return jsonify(payload), code
+
+
+@app.route("/status", methods=["GET", "POST"])
+def status():
+    """
+    État de plusieurs sorties en un appel :
+      POST {"job_ids": ["...", "..."], "wait": 20}   ou   GET /status?ids=a,b,c&wait=20
+    Réponse : {"ok": true, "jobs": {"<id>": {"status": "queued|processing|done|failed|unknown",
+                                               "error": "...", "finished_at": ...}}}
+
+    wait (secondes, optionnel, max STATUS_WAIT_MAX) : long-poll, la réponse part dès qu'une des
+    sorties est terminée (ou inconnue), ou à l'expiration du délai.
+    """
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        ids, wait, error = parse_status_query(data.get("job_ids"), data.get("wait", 0))
+    else:
+        ids = [i for i in request.args.get("ids", "").split(",") if i]
+        ids, wait, error = parse_status_query(ids, request.args.get("wait", 0))
+
+    if error is not None:
+        return jsonify({"ok": False, "error": error}), 400
+
+    if wait > 0 and ids:
+        jobs = wait_output_statuses(ids, wait)
+    else:
+        jobs = {oid: output_status(oid) for oid in ids}
+    return jsonify({"ok": True, "jobs": jobs})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Voir metrics_text."""
+    return metrics_text(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+
+
+@app.route("/cascade", methods=["GET"])
+def cascade():
+    """Voir cascade_payload."""
+    return jsonify(cascade_payload())
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Petit endpoint pour vérifier que le serveur tourne."""
+    return jsonify(health_payload())
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Voir ready_payload."""
+    payload, code = ready_payload()
+    return jsonify(payload), code
+
+
+@app.route("/thumbnail", methods=["POST"])
+def thumbnail():
+    """
+    Thumbnail synchrone en mémoire (cf. parse_inline_request) : la requête attend son rendu
+    (au plus INLINE_TIMEOUT secondes) et reçoit l'image encodée.
+    """
+    if (request.content_length or 0) > INLINE_MAX_BYTES:
+        return jsonify({"ok": False, "error": f"Image too large (max {INLINE_MAX_BYTES} bytes)"}), 413
+    job, error = parse_inline_request(request.get_data(), request.args)
+    if job is None:
+        payload, code = error
+        return jsonify(payload), code
+
+    oid = submit_inline_job(job)
+    status = wait_output_statuses([oid], INLINE_TIMEOUT)[oid]
+    data, extra, code = inline_response(job, status)
+    if data is None:
+        return jsonify(extra), code
+    return data, code, extra
 
 
 # -------------------------------------------------
 # Entrée principale
 # -------------------------------------------------
 
+def replay_job_store() -> None:
+    """
+    Ré-enfile les sorties restées dans la file persistante (serveur arrêté ou planté avant de les traiter).
+    """
+    jobs, dropped = _JOB_STORE.replay()
+    for oid in dropped:
+        print(f"[WARN] Dropping output {oid}: interrupted too many times")
+    now = time.time()
+    for job in jobs:
+        for output in job["outputs"]:
+            _pending_jobs.add(output["job_id"])
+        # queue_wait mesure l'attente dans ce serveur, pas la durée de l'arrêt
+        job["enqueued_at"] = now
+        _job_queue.put(job)
+    if jobs:
+        n = sum(len(job["outputs"]) for job in jobs)
+        print(f"[INFO] Replayed {n} outputs ({len(jobs)} jobs) from {_JOB_STORE.path}")
+
+
+def check_fork_support() -> None:
+    global WORKERS
+    if WORKERS > 0 and "fork" not in mp.get_all_start_methods():
+        print("[WARN] --workers requires fork(), falling back to a single worker thread")
+        WORKERS = 0
+
+
+def warm_up_detectors() -> None:
+    """
+    Une détection factice par étape de la cascade, à sa taille de détection : poids, priors,
+    primitives oneDNN et predictor YOLO sont prêts avant le premier vrai job.
+    """
+    img = np.random.default_rng(0).integers(0, 256, (*WARMUP_SHAPE, 3), dtype=np.uint8)
+    for stage in CASCADE:
+        detector = load_detector(stage.name)
+        proxy, _, _ = make_detection_proxy(img, stage_max_side(stage))
+        t0 = time.perf_counter()
+        detector.detect_best_faces_scored([proxy], **stage_options(stage, detector))
+        print(f"[INFO] Warmed up {stage.label} in {time.perf_counter() - t0:.2f}s")
+
+
+def set_startup_error(error: str) -> None:
+    """Premier échec du démarrage : /ready reste à 503 avec cette raison."""
+    global _STARTUP_ERROR
+    print(f"[ERROR] {error}")
+    if _STARTUP_ERROR is None:
+        _STARTUP_ERROR = error
+
+
+def load_models() -> None:
+    """
+    Charge les poids des détecteurs de la cascade, sans inférence. En cas d'échec, les workers
+    démarrent quand même (les jobs échouent avec la raison) et /ready reste à 503 avec l'erreur.
+    """
+    try:
+        t0 = time.monotonic()
+        load_cascade_detectors()
+        _STARTUP_TIMES["models_s"] = round(time.monotonic() - t0, 3)
+    except Exception as e:
+        set_startup_error(f"Model loading failed: {e}")
+
+
+def startup_complete() -> None:
+    _STARTUP_TIMES["ready_s"] = round(time.monotonic() - _STARTUP_T0, 3)
+    if _STARTUP_ERROR is None:
+        _READY.set()
+        print(f"[INFO] Ready in {_STARTUP_TIMES['ready_s']:.2f}s "
+              f"(models {_STARTUP_TIMES['models_s']:.2f}s, warm-up {_STARTUP_TIMES.get('warmup_s', 0):.2f}s)")
+
+
+def startup(warmup: bool = True) -> None:
+    """
+    Thread de démarrage (mode worker thread), lancé une fois le serveur HTTP prêt à recevoir
+    les enqueues : charge et chauffe les détecteurs de la cascade, puis démarre le worker.
+    En mode multi-process, cf. start_workers.
+    """
+    load_models()
+    if warmup and _STARTUP_ERROR is None:
+        try:
+            t0 = time.monotonic()
+            warm_up_detectors()
+            _STARTUP_TIMES["warmup_s"] = round(time.monotonic() - t0, 3)
+        except Exception as e:
+            set_startup_error(f"Warm-up failed: {e}")
+
+    start_workers()
+    startup_complete()
+
+
+def start_workers(warmup: bool = True) -> None:
+    """
+    Démarre le traitement de _job_queue : un worker thread, ou WORKERS process workers
+    (avec WORKER_THREADS threads chacun, 0 = nb de coeurs / WORKERS).
+
+    Process workers : à appeler avant de démarrer le moindre thread (serveur HTTP compris), un fork
+    ne copie que le thread appelant et les verrous tels quels. Le process HTTP ne fait que charger les
+    poids (partagés en copy-on-write, SSD sur CPU cf. detector_options) ; chaque worker se chauffe
+    après le fork, et le serveur est prêt quand tous l'ont fait (cf. WorkerPool._worker_ready).
+    """
+    global WORKER_THREADS, _POOL
+
+    check_fork_support()
+    if WORKERS > 0:
+        WORKER_THREADS = WORKER_THREADS or max(1, (os.cpu_count() or 1) // WORKERS)
+        load_models()
+        _POOL = WorkerPool(WORKERS, WORKER_THREADS, warmup)
+        _POOL.start()
+        # Avant l'arrêt des process daemon par multiprocessing : sinon le thread events les remplacerait
+        atexit.register(_POOL.stop)
+    else:
+        worker_thread = threading.Thread(target=worker_loop, daemon=True)
+        worker_thread.start()
+
+
 def main():
-    worker_thread = threading.Thread(target=worker_loop, daemon=True)
-    worker_thread.start()
+    global BATCH_MAX_JOBS, BATCH_WAIT_MS, DETECT_MAX_SIDE, MAX_DECODE_MPIX, _FACE_CACHE
+    global WORKERS, WORKER_THREADS, _JOB_STORE, STATUS_HISTORY, SSD_BACKEND, SSD_OPTIMIZE
+    global CASCADE, CASCADE_ADAPTIVE, CASCADE_SKIP_BELOW, CASCADE_STATS_PATH, JPEG_PROGRESSIVE, PYRAMID
+    global INLINE_MAX_BYTES, INLINE_TIMEOUT, PATH_JOBS_LOCAL_ONLY
+    global _STARTUP_T0
+    _STARTUP_T0 = time.monotonic()
+
+    parser = argparse.ArgumentParser(description="Serveur de génération de thumbnails centrés sur le visage.")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute HTTP.")
+    parser.add_argument("--port", type=int, default=5001, help="Port d'écoute HTTP.")
+    parser.add_argument("--allow-remote-enqueue", action="store_true",
+                        help="Avec --host non loopback : accepte aussi /enqueue et /enqueue_batch (chemins "
+                             "src / dst du serveur) depuis d'autres machines. Réseau de confiance uniquement.")
+    parser.add_argument("--server", choices=["flask", "aiohttp"], default="flask",
+                        help="Front HTTP : Flask (un thread par requête) ou aiohttp (boucle asyncio, "
+                             "long-polls sans thread ; nécessite `pip install aiohttp`).")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Nombre de process workers (modèles chargés une fois puis partagés). "
+                             "0 = un worker thread dans le process HTTP.")
+    parser.add_argument("--worker-threads", type=int, default=WORKER_THREADS,
+                        help="Threads torch / OpenCV par process worker (0 = nb de coeurs / workers).")
+    parser.add_argument("--batch-max-jobs", type=int, default=BATCH_MAX_JOBS,
+                        help="Nombre max de jobs traités dans un même lot.")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS,
+                        help="Attente max (ms) pour compléter un lot après le premier job.")
+    parser.add_argument("--detect-max-side", type=int, default=DETECT_MAX_SIDE,
+                        help="Plus grand côté de l'image utilisée pour la détection (ex. 640). 0 = pleine résolution.")
+    parser.add_argument("--cascade", default=DEFAULT_CASCADE,
+                        help="Étapes de détection, dans l'ordre : nom[:min_score=S][:max_side=N][:option=V],... "
+                             f"(détecteurs : {', '.join(DETECTORS)} ; cf. cascade.py).")
+    parser.add_argument("--cascade-adaptive", action="store_true",
+                        help="Réordonne les étapes par coût / taux de succès mesurés (latence attendue minimale).")
+    parser.add_argument("--cascade-skip-below", type=float, default=CASCADE_SKIP_BELOW,
+                        help="Saute une étape dont le taux de succès mesuré est sous ce seuil (0 = jamais) ; "
+                             "mesures et décision par bucket de source (format x taille).")
+    parser.add_argument("--cascade-stats", type=Path, default=CASCADE_STATS_PATH,
+                        help="Fichier JSON des statistiques apprises par la cascade (rechargé au démarrage).")
+    parser.add_argument("--no-cascade-stats", action="store_true",
+                        help="Statistiques de la cascade en mémoire uniquement (réapprises à chaque démarrage).")
+    parser.add_argument("--ssd-backend", choices=SSD_BACKENDS, default=SSD_BACKEND,
+                        help="Moteur d'inférence du SSD (torchscript / onnx / int8 : exporter d'abord avec export_ssd.py).")
+    parser.add_argument("--ssd-optimize", nargs="*", choices=SSD_OPTIMIZATIONS, default=list(SSD_OPTIMIZE),
+                        help="Optimisations du réseau SSD fp32 : fold_bn (BatchNorm repliées dans les convolutions), "
+                             "channels_last (mémoire NHWC).")
+    parser.add_argument("--max-decode-mpix", type=float, default=MAX_DECODE_MPIX,
+                        help="Budget par job en mégapixels décodés (JPEG réduits au décodage, "
+                             "autres formats refusés au-delà). 0 = illimité.")
+    parser.add_argument("--jpeg-quality", type=int, default=THUMB_QUALITY[".jpg"],
+                        help="Qualité des thumbnails JPEG (1-100).")
+    parser.add_argument("--webp-quality", type=int, default=THUMB_QUALITY[".webp"],
+                        help="Qualité des thumbnails WebP (1-100 ; 101 = sans perte, défaut d'OpenCV).")
+    parser.add_argument("--avif-quality", type=int, default=THUMB_QUALITY[".avif"],
+                        help="Qualité des thumbnails AVIF (1-100 ; si l'OpenCV local sait écrire l'AVIF).")
+    parser.add_argument("--no-progressive", action="store_true",
+                        help="JPEG baseline au lieu de progressif.")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="Jobs multi-tailles en mode pyramide par défaut : un crop par ratio, chaque taille "
+                             "réduite depuis la précédente (srcset 1x / 2x / 3x).")
+    parser.add_argument("--inline-max-mb", type=float, default=INLINE_MAX_BYTES / 2**20,
+                        help="POST /thumbnail : taille max de l'image source envoyée (Mo).")
+    parser.add_argument("--inline-timeout", type=float, default=INLINE_TIMEOUT,
+                        help="POST /thumbnail : attente max du rendu (s), 504 au-delà.")
+    parser.add_argument("--face-cache", type=Path, default=FACE_CACHE_PATH,
+                        help="Fichier SQLite du cache des détections (clé = hash du contenu de la source).")
+    parser.add_argument("--no-face-cache", action="store_true",
+                        help="Désactive le cache des détections.")
+    parser.add_argument("--job-store", type=Path, default=JOB_STORE_PATH,
+                        help="Fichier SQLite de la file persistante (jobs rejoués au redémarrage).")
+    parser.add_argument("--job-store-sync", choices=["NORMAL", "FULL"], default="NORMAL",
+                        help="NORMAL : survit à un crash du serveur ; FULL : aussi à une coupure de courant (fsync par job).")
+    parser.add_argument("--no-job-store", action="store_true",
+                        help="File uniquement en mémoire (jobs perdus au redémarrage).")
+    parser.add_argument("--status-history", type=int, default=STATUS_HISTORY,
+                        help="Nombre de sorties terminées (done / failed) dont /status garde l'état.")
+    parser.add_argument("--background-every", type=int, default=BACKGROUND_EVERY,
+                        help="Un job background passe après N jobs interactifs servis d'affilée (anti-famine).")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Pas de détection factice au démarrage (le premier job paie la chauffe).")
+    args = parser.parse_args()
+    try:
+        CASCADE = parse_cascade(args.cascade, list(DETECTORS))
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.server == "aiohttp":
+        try:
+            import async_server  # dépendance optionnelle
+        except ImportError as e:
+            print(f"[ERROR] --server aiohttp requires aiohttp: {e} (pip install aiohttp)")
+            sys.exit(1)
+
+    BATCH_MAX_JOBS = max(1, args.batch_max_jobs)
+    BATCH_WAIT_MS = max(0.0, args.batch_wait_ms)
+    DETECT_MAX_SIDE = max(0, args.detect_max_side)
+    MAX_DECODE_MPIX = max(0.0, args.max_decode_mpix)
+    SSD_BACKEND = args.ssd_backend
+    SSD_OPTIMIZE = tuple(args.ssd_optimize)
+    CASCADE_ADAPTIVE = args.cascade_adaptive
+    CASCADE_SKIP_BELOW = max(0.0, args.cascade_skip_below)
+    STATUS_HISTORY = max(1, args.status_history)
+    THUMB_QUALITY.update({".jpg": args.jpeg_quality, ".jpeg": args.jpeg_quality,
+                          ".webp": args.webp_quality, ".avif": args.avif_quality})
+    JPEG_PROGRESSIVE = not args.no_progressive
+    PYRAMID = args.pyramid
+    INLINE_MAX_BYTES = max(1, int(args.inline_max_mb * 2**20))
+    INLINE_TIMEOUT = max(0.1, args.inline_timeout)
+    # Corps de requête le plus gros accepté (Flask ; aiohttp : client_max_size, cf. async_server)
+    app.config["MAX_CONTENT_LENGTH"] = INLINE_MAX_BYTES
+    PATH_JOBS_LOCAL_ONLY = not is_loopback(args.host) and not args.allow_remote_enqueue
+    if PATH_JOBS_LOCAL_ONLY:
+        print(f"[INFO] Listening on {args.host}: /enqueue and /enqueue_batch only accept local clients "
+              f"(see --allow-remote-enqueue)")
+    if not can_encode(".avif"):
+        print("[INFO] This OpenCV build cannot write AVIF: .avif outputs will fail")
+    _job_queue.background_every = max(0, args.background_every)
+    if not args.no_face_cache:
+        _FACE_CACHE = FaceBoxCache(args.face_cache)
+    CASCADE_STATS_PATH = None if args.no_cascade_stats else args.cascade_stats
+    load_cascade_stats()
+    if not args.no_job_store:
+        _JOB_STORE = JobStore(args.job_store, synchronous=args.job_store_sync)
+        replay_job_store()
+
+    WORKERS = max(0, args.workers)
+    WORKER_THREADS = args.worker_threads
+    check_fork_support()
+    if WORKERS > 0:
+        # Fork avant tout thread : poids chargés ici, chauffe dans les workers (le serveur HTTP
+        # répond pendant ce temps)
+        start_workers(not args.no_warmup)
+    else:
+        # Modèles chargés en arrière-plan : le serveur HTTP répond (et accepte les enqueues) tout de suite
+        threading.Thread(target=startup, args=(not args.no_warmup,), name="startup", daemon=True).start()
+    atexit.register(save_cascade_stats)
+    threading.Thread(target=cascade_stats_saver, name="cascade-stats", daemon=True).start()
+
+    if args.server == "aiohttp":
+        if WORKERS == 0:
+            print("[WARN] --server aiohttp without --workers: inference still shares the GIL with the HTTP loop")
+        # Le module courant est passé tel quel (lancé en script, c'est __main__ et non "thumb_server")
+        async_server.run(sys.modules[__name__], host=args.host, port=args.port)
+        return
 
     # Important: debug=False pour éviter le reloader qui relance le process 2x
-    app.run(host="127.0.0.1", port=5001, debug=False)
+    # threaded=True : un long-poll /status en attente ne bloque pas les autres requêtes
+    app.run(host=args.host, port=args.port, debug=False, threaded=True)
 
 
 if __name__ == "__main__":